@@ -1,14 +1,44 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from typing import List
 
+# Defaults applied when ENVIRONMENT=production, unless set explicitly
+PRODUCTION_PROFILE = {
+    "DEBUG": False,
+    "DB_ECHO": False,
+    "LOG_LEVEL": "INFO",
+    "DB_POOL_SIZE": 20,
+    "DB_MAX_OVERFLOW": 10,
+    "DB_POOL_TIMEOUT": 10,
+    "DB_STATEMENT_TIMEOUT_MS": 15000,
+}
+
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str
+    DB_ECHO: bool = False  # Log every SQL statement
+    DB_POOL_SIZE: int = 5  # Connections kept open per engine
+    DB_MAX_OVERFLOW: int = 10  # Extra connections allowed under load
+    DB_POOL_TIMEOUT: int = 30  # Seconds to wait for a connection before failing
+    DB_POOL_RECYCLE: int = 1800  # Reconnect connections older than this many seconds
+    DB_POOL_PRE_PING: bool = True  # Test connections on checkout
+    DB_POOL_WAIT_WARN_MS: int = 100  # Log checkouts that wait longer than this
+    DB_STATEMENT_TIMEOUT_MS: int = 0  # PostgreSQL only, 0 = no limit
+    DATABASE_REPLICA_URLS: str = ""  # Comma-separated read replicas
+    READ_YOUR_WRITES_SECONDS: int = 5  # Reads stay on the primary this long after a user writes
     
     # JWT
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440
+    AUTH_USER_CACHE_TTL_SECONDS: int = 30  # 0 disables the authenticated-user cache
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000  # Decoded tokens, kept until they expire
+    
+    # Passwords
+    BCRYPT_ROUNDS: int = 12  # Stored hashes with another cost are rehashed on login
+    PASSWORD_HASH_WORKERS: int = 0  # bcrypt threads, 0 = one per CPU
+    PASSWORD_HASH_MAX_QUEUE: int = 100  # Waiting hash calls before returning 503
     
     # CORS
     CORS_ORIGINS: str = "http://localhost:5173"
@@ -16,14 +46,94 @@ class Settings(BaseSettings):
     # App
     APP_NAME: str = "Pulse Social Media API"
     APP_VERSION: str = "1.0.0"
+    ENVIRONMENT: str = "development"  # production applies PRODUCTION_PROFILE
     DEBUG: bool = True
+    FAST_JSON_RESPONSES: bool = True  # List endpoints validate once and encode with pydantic-core
+    
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json or text
+    LOG_SAMPLE_RATE: float = 1.0  # Fraction of requests whose DEBUG/INFO records are kept
+    SLOW_QUERY_MS: int = 200  # Log statements slower than this, 0 = off
+    SLOW_QUERY_EXPLAIN: bool = True  # Capture the plan of each slow statement shape
+    SLOW_QUERY_TOP_N: int = 50  # Shapes kept in the in-memory summary
+    SLOW_QUERY_LOG_FILE: str = "logs/slow_queries.log"  # Rotating JSON log, empty = stdout only
+    SLOW_QUERY_LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS: int = 5
+    QUERY_STATS_ENABLED: bool = True  # X-Query-Count / Server-Timing headers and N+1 warnings
+    N_PLUS_ONE_THRESHOLD: int = 5  # Warn when one statement runs this often in a request, 0 = never
+
+    # Metrics
+    METRICS_ENABLED: bool = True  # Request metrics and GET /metrics for Prometheus
+    METRICS_STRIPES: int = 16  # Counter shards; threads update their own shard
+
+    # Profiling
+    PROFILING_ADMIN_TOKEN: str = ""  # X-Profile header value that profiles a request; empty disables
+    PROFILING_SAMPLE_RATE: float = 0.0  # Fraction of requests profiled without the header
+    PROFILING_INTERVAL_MS: float = 1.0  # Stack sampling interval
+    PROFILING_DIR: str = ""  # Defaults to backend/profiles
+    PROFILING_FORMAT: str = "speedscope"  # speedscope or collapsed
+    PROFILING_MAX_FILES: int = 200  # Older profiles are deleted
+    
+    # Delta sync
+    SYNC_SETTLE_SECONDS: int = 5  # Tokens stop short of newer rows, so slower commits with lower ids are not skipped
+    SYNC_CHANGE_RETENTION_DAYS: int = 30  # Older change-log rows are pruned; older tokens get a full resync
+    SYNC_PRUNE_INTERVAL_SECONDS: int = 3600
+
+    # Stories
+    STORY_EXPIRY_ENABLED: bool = True  # Background deletion of expired stories
+    STORY_EXPIRY_BATCH_SIZE: int = 100
+    STORY_EXPIRY_RESCAN_SECONDS: int = 300
+    STORY_PARTITIONING: bool = False  # PostgreSQL only: daily partitions on expiration_time
+    STORY_TRAY_CACHE_TTL_SECONDS: int = 60
+    STORY_TRAY_CACHE_MAX_ENTRIES: int = 10000
+    STORY_VIEW_HLL_PRECISION: int = 11  # 2 KB sketch, ~2.3% error
+    STORY_VIEW_FLUSH_SECONDS: int = 10
+    STORY_VIEWER_LIST_SIZE: int = 100  # Exact viewer list keeps the first N viewers
+    
+    # Images
+    IMAGE_VARIANTS_ENABLED: bool = True  # Generate thumb/medium/full WebP and JPEG variants
+    IMAGE_WORKERS: int = 0  # Variant worker processes, 0 = one per CPU
+    
+    # Media serving
+    MEDIA_CACHE_BYTES: int = 32 * 1024 * 1024  # In-memory cache for small files
+    MEDIA_CACHE_MAX_FILE_BYTES: int = 64 * 1024
+    MEDIA_CACHE_REVALIDATE_SECONDS: float = 2.0  # Cached files are re-checked against the disk this often
+    MEDIA_MAX_AGE_SECONDS: int = 86400  # Cache-Control for files not named by content hash
+    MEDIA_ACCEL_REDIRECT_PREFIX: str = ""  # e.g. /protected-uploads to let nginx send files
+
+    # Compression and conditional GET
+    COMPRESSION_ENABLED: bool = True  # gzip, or brotli when installed, for JSON and text responses
+    COMPRESSION_MIN_SIZE: int = 1024  # Smaller bodies are sent as is
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    ETAGS_ENABLED: bool = True  # Weak ETags and 304s on user, post and hashtag reads
+    ETAG_SIZE_CACHE_ENTRIES: int = 10000  # Body sizes kept per ETag to count bytes saved by 304s
     
     class Config:
         env_file = ".env"
     
+    @model_validator(mode="after")
+    def apply_profile(self) -> "Settings":
+        if self.ENVIRONMENT == "production":
+            for key, value in PRODUCTION_PROFILE.items():
+                if key not in self.model_fields_set:
+                    setattr(self, key, value)
+        return self
+    
     @property
     def cors_origins_list(self) -> List[str]:
         """Convert comma-separated CORS origins to list"""
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
+    
+    @property
+    def replica_urls_list(self) -> List[str]:
+        """Convert comma-separated replica URLs to list"""
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+    
+    @property
+    def story_partitioning_enabled(self) -> bool:
+        """Partitioned story storage needs PostgreSQL declarative partitioning"""
+        return self.STORY_PARTITIONING and self.DATABASE_URL.startswith("postgresql")
 
 settings = Settings()
\ No newline at end of file
@@ -1,29 +1,97 @@
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
+from .utils.db_pool import engine_options, pool_monitor
+from .utils.db_routing import routing_session_class
 
-# Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,  # Test connection before using
-    echo=settings.DEBUG   # Log SQL queries in debug mode
+# Async drivers for each sync database backend
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    """
+    Translate DATABASE_URL to its async driver, e.g.
+    `postgresql://...` -> `postgresql+asyncpg://...`.
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+# Create database engine; pool size, timeouts and echo come from DB_* settings
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+
+# Async engine for endpoints declared with `async def`
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    **engine_options(settings.DATABASE_URL, is_async=True)
 )
 
+# Read replicas from DATABASE_REPLICA_URLS; GET requests read from them (utils/db_routing.py)
+replica_engines = [
+    create_engine(url, **engine_options(url))
+    for url in settings.replica_urls_list
+]
+async_replica_engines = [
+    create_async_engine(async_database_url(url), **engine_options(url, is_async=True))
+    for url in settings.replica_urls_list
+]
+
+# Checkout wait times, in-use counts and overflow events (utils/db_pool.py)
+pool_monitor.register("sync", engine.pool)
+pool_monitor.register("async", async_engine.sync_engine.pool)
+for index, (replica, async_replica) in enumerate(zip(replica_engines, async_replica_engines)):
+    pool_monitor.register(f"replica{index}", replica.pool)
+    pool_monitor.register(f"replica{index}-async", async_replica.sync_engine.pool)
+
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(
+    class_=routing_session_class("SyncRoutingSession", engine, replica_engines),
+    autocommit=False,
+    autoflush=False
+)
+# Objects stay usable after commit; async sessions cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(
+    sync_session_class=routing_session_class(
+        "AsyncRoutingSession",
+        async_engine.sync_engine,
+        [replica.sync_engine for replica in async_replica_engines]
+    ),
+    autoflush=False,
+    expire_on_commit=False
+)
 
 # Base class for models
 Base = declarative_base()
 
+# Only these methods may read from replicas
+READ_ONLY_METHODS = ("GET", "HEAD")
+
 # Dependency to get database session
-def get_db():
+def get_db(request: Request):
     """
     Creates a new database session for each request.
     Automatically closes the session when done.
     """
     db = SessionLocal()
+    db.info["read_only"] = request.method in READ_ONLY_METHODS
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db(request: Request):
+    """
+    Creates a new async database session for each request.
+    Automatically closes the session when done.
+    """
+    async with AsyncSessionLocal() as db:
+        db.info["read_only"] = request.method in READ_ONLY_METHODS
+        yield db
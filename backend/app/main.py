@@ -1,10 +1,25 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from .config import settings
-from .database import engine, Base
+from .database import engine, async_engine, async_replica_engines, Base
+from .utils.story_expiry import story_expiry_scheduler, prepare_story_storage
+from .utils.story_views import story_view_recorder
+from .utils.sync import sync_change_pruner
+from .utils.images import image_pipeline
+from .utils.auth import password_hasher
+from .utils.media_serving import MediaFiles
+from .utils.logging_setup import setup_logging, shutdown_logging, RequestContextMiddleware
+from .utils.query_stats import QueryStatsMiddleware
+from .utils.metrics import MetricsMiddleware, PROMETHEUS_CONTENT_TYPE, registry
+from .utils.profiling import ProfilingMiddleware
+from .utils.compression import CompressionMiddleware
 import os
 
+# Route log records through a background listener thread
+setup_logging()
+
 # Import all routers
 from .routers import (
     auth_router,
@@ -18,20 +33,48 @@ from .routers import (
     stories_router,
     hashtags_router,
     saved_posts_router,
-    uploads_router
+    uploads_router,
+    profiles_router,
+    slow_queries_router
 )
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+prepare_story_storage()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start and stop background workers with the application.
+    """
+    if settings.STORY_EXPIRY_ENABLED:
+        story_expiry_scheduler.start()
+    story_view_recorder.start()
+    sync_change_pruner.start()
+    yield
+    sync_change_pruner.stop()
+    story_view_recorder.stop()
+    story_expiry_scheduler.stop()
+    image_pipeline.shutdown()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+    for replica in async_replica_engines:
+        await replica.dispose()
+    shutdown_logging()
 
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     debug=settings.DEBUG,
-    description="Pulse Social Media Platform API - A modern social networking backend"
+    description="Pulse Social Media Platform API - A modern social networking backend",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+# gzip/brotli response bodies; also notes the bytes sent per ETag for 304 metrics
+app.add_middleware(CompressionMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -39,8 +82,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Query-Count", "Server-Timing", "X-Profile-Id", "ETag"],
 )
 
+# Sampled or X-Profile requests are profiled to PROFILING_DIR
+if settings.PROFILING_ADMIN_TOKEN or settings.PROFILING_SAMPLE_RATE > 0:
+    app.add_middleware(ProfilingMiddleware)
+
+# Query count, database time and N+1 warnings per request
+if settings.QUERY_STATS_ENABLED:
+    app.add_middleware(QueryStatsMiddleware)
+
+# Per-route request counts and latency for /metrics
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Correlation id and log sampling per request (outermost middleware)
+app.add_middleware(RequestContextMiddleware)
+
 # Root endpoint
 @app.get("/")
 def read_root():
@@ -56,6 +115,12 @@ def read_root():
 def health_check():
     return {"status": "healthy", "service": "Pulse API"}
 
+# Prometheus scrape endpoint
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # Include all routers
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(users_router, prefix="/users", tags=["Users"])
@@ -69,11 +134,13 @@ app.include_router(stories_router, prefix="/stories", tags=["Stories"])
 app.include_router(hashtags_router, prefix="/hashtags", tags=["Hashtags"])
 app.include_router(saved_posts_router, prefix="/saved", tags=["Saved Posts"])
 app.include_router(uploads_router, prefix="/upload", tags=["File Uploads"])
+app.include_router(profiles_router, prefix="/debug/profiles", tags=["Debug"])
+app.include_router(slow_queries_router, prefix="/debug/slow-queries", tags=["Debug"])
 
 # Mount static files directory for uploaded images
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+app.mount("/uploads", MediaFiles(directory=UPLOAD_DIR), name="uploads")
 
 if __name__ == "__main__":
     import uvicorn
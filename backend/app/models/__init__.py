@@ -6,9 +6,12 @@ from .follow import Follow
 from .message import Message
 from .notification import Notification
 from .story import Story
+from .story_seen import StorySeen
 from .hashtag import Hashtag
 from .post_hashtag import PostHashtag
 from .saved_post import SavedPost
+from .sync_change import SyncChange
+from .media_file import MediaFile
 
 __all__ = [
     "User",
@@ -19,7 +22,10 @@ __all__ = [
     "Message",
     "Notification",
     "Story",
+    "StorySeen",
     "Hashtag",
     "PostHashtag",
-    "SavedPost"
+    "SavedPost",
+    "SyncChange",
+    "MediaFile"
 ]
\ No newline at end of file
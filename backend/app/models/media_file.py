@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy.sql import func, false
+from ..database import Base
+
+class MediaFile(Base):
+    __tablename__ = "media_files"
+    
+    # SHA-256 of the file content, also its storage key
+    digest = Column(String(64), primary_key=True)
+    extension = Column(String(10), nullable=False)
+    size = Column(Integer, nullable=False)
+    # Number of posts, stories and profiles pointing at this file
+    ref_count = Column(Integer, nullable=False, default=0)
+    # Computed at upload time, copied onto posts, stories and profiles
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    placeholder = Column(Text, nullable=True)  # Tiny base64 WebP data URI
+    # Set once every size and format variant is written, see utils/images.py
+    variants_ready = Column(Boolean, nullable=False, default=False, server_default=false())
+    uploader_id = Column(Integer, ForeignKey("users.user_id", ondelete="SET NULL"), nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_uploaded_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -1,16 +1,32 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, LargeBinary, Boolean
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, false
+from ..config import settings
 from ..database import Base
 
+# PostgreSQL requires the partition key in the primary key of a partitioned table
+PARTITIONED = settings.story_partitioning_enabled
+
 class Story(Base):
     __tablename__ = "stories"
     
     story_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False, index=True)
     media = Column(String(255), nullable=False)
-    expiration_time = Column(DateTime(timezone=True), nullable=False, index=True)
+    media_width = Column(Integer, nullable=True)
+    media_height = Column(Integer, nullable=True)
+    media_placeholder = Column(Text, nullable=True)  # Tiny base64 WebP data URI
+    media_variants_ready = Column(Boolean, nullable=False, default=False, server_default=false())
+    expiration_time = Column(DateTime(timezone=True), nullable=False, index=True, primary_key=PARTITIONED)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    # View tracking, flushed by utils/story_views.py
+    view_sketch = Column(LargeBinary, nullable=True)  # HyperLogLog registers
+    first_viewer_ids = Column(Text, nullable=True)  # Comma-separated, capped
+    
     # Relationships
-    user = relationship("User", back_populates="stories")
\ No newline at end of file
+    user = relationship("User", back_populates="stories")
+    
+    # Daily partitions are created and dropped by utils/story_expiry.py
+    if PARTITIONED:
+        __table_args__ = {"postgresql_partition_by": "RANGE (expiration_time)"}
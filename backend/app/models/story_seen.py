@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from ..database import Base
+
+class StorySeen(Base):
+    __tablename__ = "story_seen"
+    
+    story_seen_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    viewer_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False, index=True)
+    author_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    # Story ids only grow, so everything up to this id from the author has been seen
+    last_seen_story_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    # Relationships
+    viewer = relationship("User", foreign_keys=[viewer_id], back_populates="seen_stories")
+    author = relationship("User", foreign_keys=[author_id], back_populates="story_viewers")
+    
+    # One watermark per viewer and author
+    __table_args__ = (UniqueConstraint('viewer_id', 'author_id', name='unique_story_seen'),)
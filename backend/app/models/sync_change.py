@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from ..database import Base
+
+class SyncChange(Base):
+    __tablename__ = "sync_changes"
+    
+    # Monotonic id used as the change-log half of a sync token
+    change_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False, index=True)
+    entity = Column(String(20), nullable=False)  # notification, message
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String(20), nullable=False)  # read, unread, delete
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    
+    # Relationships
+    user = relationship("User", back_populates="sync_changes")
+    
+    # Sync reads scan one user's changes for one entity after a change_id
+    __table_args__ = (Index('ix_sync_changes_user_entity_change', 'user_id', 'entity', 'change_id'),)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, false
 from ..database import Base
 
 class User(Base):
@@ -15,6 +15,10 @@ class User(Base):
     hashed_password = Column(String(255), nullable=False)
     profile_info = Column(Text, nullable=True)
     profile_picture = Column(String(255), nullable=True)
+    profile_picture_width = Column(Integer, nullable=True)
+    profile_picture_height = Column(Integer, nullable=True)
+    profile_picture_placeholder = Column(Text, nullable=True)  # Tiny base64 WebP data URI
+    profile_picture_variants_ready = Column(Boolean, nullable=False, default=False, server_default=false())
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -29,5 +33,8 @@ class User(Base):
     followers = relationship("Follow", foreign_keys="Follow.followee_id", back_populates="followee", cascade="all, delete-orphan")
     following = relationship("Follow", foreign_keys="Follow.follower_id", back_populates="follower", cascade="all, delete-orphan")
     stories = relationship("Story", back_populates="user", cascade="all, delete-orphan")
+    seen_stories = relationship("StorySeen", foreign_keys="StorySeen.viewer_id", back_populates="viewer", cascade="all, delete-orphan")
+    story_viewers = relationship("StorySeen", foreign_keys="StorySeen.author_id", back_populates="author", cascade="all, delete-orphan")
     notifications = relationship("Notification", back_populates="user", cascade="all, delete-orphan")
-    saved_posts = relationship("SavedPost", back_populates="user", cascade="all, delete-orphan")
\ No newline at end of file
+    saved_posts = relationship("SavedPost", back_populates="user", cascade="all, delete-orphan")
+    sync_changes = relationship("SyncChange", back_populates="user", cascade="all, delete-orphan")
\ No newline at end of file
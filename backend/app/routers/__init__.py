@@ -10,6 +10,8 @@ from .stories import router as stories_router
 from .hashtags import router as hashtags_router
 from .saved_posts import router as saved_posts_router
 from .uploads import router as uploads_router
+from .profiles import router as profiles_router
+from .slow_queries import router as slow_queries_router
 
 __all__ = [
     "auth_router",
@@ -24,4 +26,6 @@ __all__ = [
     "hashtags_router",
     "saved_posts_router",
     "uploads_router",
+    "profiles_router",
+    "slow_queries_router",
 ]
\ No newline at end of file
@@ -1,18 +1,22 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from ..database import get_db
 from ..models import User
 from ..schemas.user import UserCreate, UserLogin, TokenResponse, UserResponse
-from ..utils.auth import verify_password, get_password_hash, create_access_token
+from ..utils.auth import create_access_token, password_hasher
+from ..utils.auth_cache import user_cache
+from ..utils.media_store import add_refs, media_preview
 from ..config import settings
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-@router.post("/register", response_model=TokenResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+def ensure_available(db: Session, user_data: UserCreate) -> None:
     """
-    Register a new user account.
+    Raise 400 if the username or email is already registered.
     """
     # Check if username already exists
     existing_user = db.query(User).filter(User.username == user_data.username).first()
@@ -29,9 +33,8 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
+
+def create_user(db: Session, user_data: UserCreate, hashed_password: str) -> User:
     new_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -39,10 +42,36 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         profile_info=user_data.profile_info,
         profile_picture=user_data.profile_picture
     )
+    add_refs(db, [user_data.profile_picture])
+    (
+        new_user.profile_picture_width,
+        new_user.profile_picture_height,
+        new_user.profile_picture_placeholder,
+        new_user.profile_picture_variants_ready
+    ) = media_preview(db, user_data.profile_picture)
     
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    return new_user
+
+def update_password_hash(db: Session, user: User, hashed_password: str) -> None:
+    user.hashed_password = hashed_password
+    db.commit()
+    db.refresh(user)
+    user_cache.invalidate(user.user_id)
+
+@router.post("/register", response_model=TokenResponse, status_code=status.HTTP_201_CREATED)
+async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+    """
+    Register a new user account.
+    Database work runs in the threadpool and bcrypt on its own pool.
+    """
+    await run_in_threadpool(ensure_available, db, user_data)
+    
+    # Create new user
+    hashed_password = await password_hasher.hash(user_data.password)
+    new_user = await run_in_threadpool(create_user, db, user_data, hashed_password)
     
     # Create access token (sub must be a string per JWT spec)
     access_token = create_access_token(
@@ -57,28 +86,38 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     }
 
 @router.post("/login", response_model=TokenResponse)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, db: Session = Depends(get_db)):
     """
     Authenticate user and return access token.
+    Hashes stored with an outdated bcrypt cost are replaced on success.
     """
     # Find user by username
-    user = db.query(User).filter(User.username == credentials.username).first()
+    user = await run_in_threadpool(
+        lambda: db.query(User).filter(User.username == credentials.username).first()
+    )
 
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await password_hasher.verify_and_update(credentials.password, user.hashed_password)
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    if new_hash:
+        await run_in_threadpool(update_password_hash, db, user, new_hash)
+        logger.debug("Password rehashed", extra={"user_id": user.user_id})
+
     # Create access token (sub must be a string per JWT spec)
     access_token = create_access_token(
         data={"sub": str(user.user_id)},
         expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
 
-    print(f"🎫 LOGIN - Created token for user {user.username} (ID: {user.user_id})")
-    print(f"🎫 LOGIN - Token starts with: {access_token[:50]}...")
+    logger.debug("User logged in", extra={"user_id": user.user_id})
 
     return {
         "access_token": access_token,
@@ -95,7 +134,6 @@ def debug_token(request_body: dict):
     from ..utils.auth import verify_token
 
     token = request_body.get("token", "")
-    print(f"🔍 DEBUG - Testing token: {token[:50] if token else 'NO TOKEN'}...")
 
     if not token:
         return {"valid": False, "error": "No token provided"}
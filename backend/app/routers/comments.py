@@ -5,6 +5,8 @@ from ..database import get_db
 from ..models import Comment, Post, User, Notification
 from ..schemas.comment import CommentCreate, CommentResponse, CommentUpdate
 from ..utils.dependencies import get_current_user
+from ..utils.metrics import events
+from ..utils.responses import json_response
 
 router = APIRouter()
 
@@ -51,6 +53,7 @@ def create_comment(
     db.add(new_comment)
     db.commit()
     db.refresh(new_comment)
+    events.inc(("comment_created",))
     
     # Create notification for post owner (if not commenting on own post)
     if post.user_id != current_user.user_id:
@@ -86,7 +89,7 @@ def get_post_comments(
         Comment.post_id == post_id
     ).order_by(Comment.created_at.asc()).offset(skip).limit(limit).all()
     
-    return [build_comment_response(comment, db) for comment in comments]
+    return json_response(List[CommentResponse], [build_comment_response(comment, db) for comment in comments])
 
 @router.get("/{comment_id}", response_model=CommentResponse)
 def get_comment(comment_id: int, db: Session = Depends(get_db)):
@@ -6,6 +6,8 @@ from ..database import get_db
 from ..models import Follow, User, Notification
 from ..schemas.follow import FollowCreate, FollowResponse
 from ..utils.dependencies import get_current_user
+from ..utils.metrics import events
+from ..utils.story_tray import story_tray_cache
 
 router = APIRouter()
 
@@ -54,6 +56,8 @@ def follow_user(
         db.add(new_follow)
         db.commit()
         db.refresh(new_follow)
+        events.inc(("follow_created",))
+        story_tray_cache.invalidate_viewer(current_user.user_id)
         
         # Create notification for followed user
         notification = Notification(
@@ -102,6 +106,7 @@ def unfollow_user(
     
     db.delete(follow)
     db.commit()
+    story_tray_cache.invalidate_viewer(current_user.user_id)
     return None
 
 @router.get("/followers/{user_id}")
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
@@ -6,17 +7,41 @@ from ..models import Hashtag, PostHashtag, Post, User, Like, Comment
 from ..schemas.hashtag import HashtagResponse
 from ..schemas.post import PostResponse
 from ..utils.dependencies import get_current_user
+from ..utils.etags import conditional_get
+from ..utils.images import media_variants, variant_url
+from ..utils.responses import json_response
 
 router = APIRouter()
 
+def trending_version(limit: int, db: Session) -> tuple:
+    """
+    The response's own inputs, every hashtag with its post count, in one
+    grouped query. Exact, so links changed within the same second (the
+    resolution of updated_at on SQLite) still change the ETag.
+    """
+    counts = db.execute(
+        select(Hashtag.tag_id, Hashtag.tag_name, func.count(PostHashtag.post_id))
+        .outerjoin(PostHashtag, PostHashtag.tag_id == Hashtag.tag_id)
+        .group_by(Hashtag.tag_id, Hashtag.tag_name)
+        .order_by(Hashtag.tag_id)
+    ).all()
+    return ("trending", limit, *map(tuple, counts))
+
 @router.get("/", response_model=List[HashtagResponse])
 def get_trending_hashtags(
+    request: Request,
+    response: Response,
     limit: int = 20,
     db: Session = Depends(get_db)
 ):
     """
     Get trending hashtags (sorted by post count).
+    Answers a matching If-None-Match with 304 before counting posts.
     """
+    not_modified = conditional_get(request, response, lambda: trending_version(limit, db))
+    if not_modified:
+        return not_modified
+
     # Get all hashtags with their post counts
     hashtags = db.query(Hashtag).all()
     
@@ -35,7 +60,7 @@ def get_trending_hashtags(
     # Sort by post count
     hashtag_data.sort(key=lambda x: x["post_count"], reverse=True)
     
-    return hashtag_data[:limit]
+    return json_response(List[HashtagResponse], hashtag_data[:limit], response.headers)
 
 @router.get("/{tag_name}", response_model=HashtagResponse)
 def get_hashtag(tag_name: str, db: Session = Depends(get_db)):
@@ -118,13 +143,19 @@ def get_posts_by_hashtag(
             "updated_at": post.updated_at,
             "username": user.username if user else None,
             "user_profile_picture": user.profile_picture if user else None,
+            "user_profile_picture_thumb": variant_url(user.profile_picture, user.profile_picture_variants_ready, "thumb") if user else None,
+            "user_profile_picture_placeholder": user.profile_picture_placeholder if user else None,
             "likes_count": likes_count,
             "comments_count": comments_count,
             "is_liked": is_liked,
-            "hashtags": hashtag_names
+            "hashtags": hashtag_names,
+            "media_variants": media_variants(post.media, post.media_variants_ready),
+            "media_width": post.media_width,
+            "media_height": post.media_height,
+            "media_placeholder": post.media_placeholder
         })
     
-    return result
+    return json_response(List[PostResponse], result)
 
 @router.get("/search/{query}", response_model=List[HashtagResponse])
 def search_hashtags(
@@ -158,4 +189,4 @@ def search_hashtags(
     # Sort by post count
     result.sort(key=lambda x: x["post_count"], reverse=True)
     
-    return result
\ No newline at end of file
+    return json_response(List[HashtagResponse], result)
\ No newline at end of file
@@ -5,6 +5,7 @@ from ..database import get_db
 from ..models import Like, Post, User, Notification
 from ..schemas.like import LikeCreate, LikeResponse
 from ..utils.dependencies import get_current_user
+from ..utils.metrics import events
 
 router = APIRouter()
 
@@ -46,6 +47,7 @@ def like_post(
         db.add(new_like)
         db.commit()
         db.refresh(new_like)
+        events.inc(("like_created",))
         
         # Create notification for post owner (if not liking own post)
         if post.user_id != current_user.user_id:
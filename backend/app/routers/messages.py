@@ -1,11 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, case, func, select
 from typing import List
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..models import Message, User
 from ..schemas.message import MessageCreate, MessageResponse
-from ..utils.dependencies import get_current_user
+from ..schemas.sync import MessageSyncResponse
+from ..utils.dependencies import get_current_user, get_current_user_async
+from ..utils.metrics import events
+from ..utils.responses import json_response
+from ..utils.sync import (
+    MAX_SYNC_LIMIT,
+    encode_sync_token,
+    decode_sync_token,
+    record_changes,
+    fetch_changes,
+    latest_change_id,
+    page_has_more,
+    settled_position
+)
 
 router = APIRouter()
 
@@ -13,21 +27,36 @@ def build_message_response(message: Message, db: Session) -> dict:
     """
     Helper function to build complete message response with user info.
     """
-    sender = db.query(User).filter(User.user_id == message.sender_id).first()
-    receiver = db.query(User).filter(User.user_id == message.receiver_id).first()
-    
-    return {
-        "message_id": message.message_id,
-        "sender_id": message.sender_id,
-        "receiver_id": message.receiver_id,
-        "content": message.content,
-        "created_at": message.created_at,
-        "is_read": message.is_read,
-        "sender_username": sender.username if sender else None,
-        "sender_profile_picture": sender.profile_picture if sender else None,
-        "receiver_username": receiver.username if receiver else None,
-        "receiver_profile_picture": receiver.profile_picture if receiver else None
-    }
+    return build_message_responses([message], db)[0]
+
+def build_message_responses(messages: List[Message], db: Session) -> List[dict]:
+    """
+    Responses for a page of messages, with senders and receivers loaded
+    in one query instead of two per message.
+    """
+    user_ids = {m.sender_id for m in messages} | {m.receiver_id for m in messages}
+    users = {
+        user.user_id: user
+        for user in db.query(User).filter(User.user_id.in_(user_ids)).all()
+    } if user_ids else {}
+
+    responses = []
+    for message in messages:
+        sender = users.get(message.sender_id)
+        receiver = users.get(message.receiver_id)
+        responses.append({
+            "message_id": message.message_id,
+            "sender_id": message.sender_id,
+            "receiver_id": message.receiver_id,
+            "content": message.content,
+            "created_at": message.created_at,
+            "is_read": message.is_read,
+            "sender_username": sender.username if sender else None,
+            "sender_profile_picture": sender.profile_picture if sender else None,
+            "receiver_username": receiver.username if receiver else None,
+            "receiver_profile_picture": receiver.profile_picture if receiver else None
+        })
+    return responses
 
 @router.post("/", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
 def send_message(
@@ -63,56 +92,68 @@ def send_message(
     db.add(new_message)
     db.commit()
     db.refresh(new_message)
+    events.inc(("message_sent",))
     
     return build_message_response(new_message, db)
 
 @router.get("/conversations")
-def get_conversations(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_conversations(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get list of conversations (unique users the current user has messaged with).
     """
-    # Get all users current user has sent or received messages from
-    sent_to = db.query(Message.receiver_id).filter(
-        Message.sender_id == current_user.user_id
-    ).distinct().all()
-    
-    received_from = db.query(Message.sender_id).filter(
-        Message.receiver_id == current_user.user_id
-    ).distinct().all()
+    # The other participant of each message
+    partner_id = case(
+        (Message.sender_id == current_user.user_id, Message.receiver_id),
+        else_=Message.sender_id
+    )
     
-    # Combine and get unique user IDs
-    user_ids = set([u[0] for u in sent_to] + [u[0] for u in received_from])
+    # Latest message per conversation (ids increase with created_at)
+    latest = (await db.execute(
+        select(partner_id, func.max(Message.message_id)).where(
+            or_(Message.sender_id == current_user.user_id, Message.receiver_id == current_user.user_id)
+        ).group_by(partner_id)
+    )).all()
+    if not latest:
+        return []
     
-    # Get user details
-    users = db.query(User).filter(User.user_id.in_(user_ids)).all()
+    # Get user details and last messages
+    users = {
+        user.user_id: user
+        for user in (await db.execute(
+            select(User).where(User.user_id.in_([row[0] for row in latest]))
+        )).scalars()
+    }
+    last_messages = {
+        message.message_id: message
+        for message in (await db.execute(
+            select(Message).where(Message.message_id.in_([row[1] for row in latest]))
+        )).scalars()
+    }
     
-    conversations = []
-    for user in users:
-        # Get last message with this user
-        last_message = db.query(Message).filter(
-            or_(
-                and_(Message.sender_id == current_user.user_id, Message.receiver_id == user.user_id),
-                and_(Message.sender_id == user.user_id, Message.receiver_id == current_user.user_id)
-            )
-        ).order_by(Message.created_at.desc()).first()
-        
-        # Count unread messages from this user
-        unread_count = db.query(Message).filter(
-            Message.sender_id == user.user_id,
+    # Count unread messages from each user
+    unread_counts = dict((await db.execute(
+        select(Message.sender_id, func.count()).where(
             Message.receiver_id == current_user.user_id,
             Message.is_read == 0
-        ).count()
-        
+        ).group_by(Message.sender_id)
+    )).all())
+    
+    conversations = []
+    for user_id, message_id in latest:
+        user = users.get(user_id)
+        if user is None:
+            continue
+        last_message = last_messages.get(message_id)
         conversations.append({
             "user_id": user.user_id,
             "username": user.username,
             "profile_picture": user.profile_picture,
             "last_message": last_message.content if last_message else None,
             "last_message_time": last_message.created_at if last_message else None,
-            "unread_count": unread_count
+            "unread_count": unread_counts.get(user.user_id, 0)
         })
     
     # Sort by last message time
@@ -138,7 +179,22 @@ def get_conversation_with_user(
             detail="User not found"
         )
     
-    # Get messages
+    # Mark received messages as read
+    unread_ids = [m[0] for m in db.query(Message.message_id).filter(
+        Message.sender_id == user_id,
+        Message.receiver_id == current_user.user_id,
+        Message.is_read == 0
+    ).all()]
+    
+    if unread_ids:
+        db.query(Message).filter(
+            Message.message_id.in_(unread_ids)
+        ).update({"is_read": 1}, synchronize_session=False)
+        # Both sides see the read flag change
+        record_changes(db, [current_user.user_id, user_id], "message", "read", unread_ids)
+        db.commit()
+    
+    # Loaded after the commit, which would otherwise expire and reload each message
     messages = db.query(Message).filter(
         or_(
             and_(Message.sender_id == current_user.user_id, Message.receiver_id == user_id),
@@ -146,15 +202,62 @@ def get_conversation_with_user(
         )
     ).order_by(Message.created_at.asc()).offset(skip).limit(limit).all()
     
-    # Mark received messages as read
-    db.query(Message).filter(
-        Message.sender_id == user_id,
-        Message.receiver_id == current_user.user_id,
-        Message.is_read == 0
-    ).update({"is_read": 1})
-    db.commit()
+    return json_response(List[MessageResponse], build_message_responses(messages, db))
+
+@router.get("/sync", response_model=MessageSyncResponse)
+def sync_messages(
+    since: str = "",
+    limit: int = 100,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get messages sent or received, read or deleted since a sync token.
+    Without a token, returns the newest messages and a starting token.
+    An expired token gets the same snapshot with `reset` set.
+    """
+    limit = max(1, min(limit, MAX_SYNC_LIMIT))
+    token = decode_sync_token(since)
+    query = db.query(Message).filter(
+        or_(
+            Message.sender_id == current_user.user_id,
+            Message.receiver_id == current_user.user_id
+        )
+    )
     
-    return [build_message_response(msg, db) for msg in messages]
+    # Initial sync, or a token older than the change log: snapshot of the
+    # newest rows, changes are already reflected
+    if not since or token.expired:
+        messages = query.order_by(Message.message_id.desc()).limit(limit).all()
+        messages.reverse()
+        first_id = messages[0].message_id if messages else 1
+        last_id = settled_position(messages, "message_id", first_id - 1)
+        return json_response(MessageSyncResponse, {
+            "messages": build_message_responses(messages, db),
+            "changes": [],
+            "next_token": encode_sync_token(
+                last_id, latest_change_id(db, current_user.user_id, "message")
+            ),
+            "has_more": False,
+            "reset": token.expired
+        })
+    
+    messages = query.filter(
+        Message.message_id > token.row_id
+    ).order_by(Message.message_id.asc()).limit(limit).all()
+    changes = fetch_changes(db, current_user.user_id, "message", token.change_id, limit)
+    
+    last_id = settled_position(messages, "message_id", token.row_id)
+    last_change_id = settled_position(changes, "change_id", token.change_id)
+    return json_response(MessageSyncResponse, {
+        "messages": build_message_responses(messages, db),
+        "changes": changes,
+        "next_token": encode_sync_token(last_id, last_change_id),
+        "has_more": (
+            page_has_more(messages, "message_id", last_id, limit)
+            or page_has_more(changes, "change_id", last_change_id, limit)
+        )
+    })
 
 @router.delete("/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_message(
@@ -179,6 +282,7 @@ def delete_message(
             detail="Not authorized to delete this message"
         )
     
+    # The delete is logged for both participants by utils/sync.py
     db.delete(message)
     db.commit()
     return None
@@ -1,34 +1,100 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..models import Notification, User
 from ..schemas.notification import NotificationResponse, NotificationUpdate
-from ..utils.dependencies import get_current_user
+from ..schemas.sync import NotificationSyncResponse
+from ..utils.dependencies import get_current_user, get_current_user_async
+from ..utils.responses import json_response
+from ..utils.sync import (
+    MAX_SYNC_LIMIT,
+    encode_sync_token,
+    decode_sync_token,
+    record_changes,
+    fetch_changes,
+    latest_change_id,
+    page_has_more,
+    settled_position
+)
 
 router = APIRouter()
 
 @router.get("/", response_model=List[NotificationResponse])
-def get_notifications(
+async def get_notifications(
     skip: int = 0,
     limit: int = 50,
     unread_only: bool = False,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get notifications for current user.
+    """
+    query = select(Notification).where(Notification.user_id == current_user.user_id)
+    
+    if unread_only:
+        query = query.where(Notification.is_read == 0)
+    
+    notifications = (await db.execute(
+        query.order_by(Notification.created_at.desc()).offset(skip).limit(limit)
+    )).scalars().all()
+    
+    return json_response(List[NotificationResponse], notifications)
+
+@router.get("/sync", response_model=NotificationSyncResponse)
+def sync_notifications(
+    since: str = "",
+    limit: int = 100,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get notifications for current user.
+    Get notifications created or changed since a sync token.
+    Without a token, returns the newest notifications and a starting token.
+    An expired token gets the same snapshot with `reset` set.
     """
+    limit = max(1, min(limit, MAX_SYNC_LIMIT))
+    token = decode_sync_token(since)
     query = db.query(Notification).filter(Notification.user_id == current_user.user_id)
     
-    if unread_only:
-        query = query.filter(Notification.is_read == 0)
+    # Initial sync, or a token older than the change log: snapshot of the
+    # newest rows, changes are already reflected
+    if not since or token.expired:
+        notifications = query.order_by(
+            Notification.notification_id.desc()
+        ).limit(limit).all()
+        notifications.reverse()
+        first_id = notifications[0].notification_id if notifications else 1
+        last_id = settled_position(notifications, "notification_id", first_id - 1)
+        return json_response(NotificationSyncResponse, {
+            "notifications": notifications,
+            "changes": [],
+            "next_token": encode_sync_token(
+                last_id, latest_change_id(db, current_user.user_id, "notification")
+            ),
+            "has_more": False,
+            "reset": token.expired
+        })
     
-    notifications = query.order_by(
-        Notification.created_at.desc()
-    ).offset(skip).limit(limit).all()
+    notifications = query.filter(
+        Notification.notification_id > token.row_id
+    ).order_by(Notification.notification_id.asc()).limit(limit).all()
+    changes = fetch_changes(db, current_user.user_id, "notification", token.change_id, limit)
     
-    return notifications
+    last_id = settled_position(notifications, "notification_id", token.row_id)
+    last_change_id = settled_position(changes, "change_id", token.change_id)
+    return json_response(NotificationSyncResponse, {
+        "notifications": notifications,
+        "changes": changes,
+        "next_token": encode_sync_token(last_id, last_change_id),
+        "has_more": (
+            page_has_more(notifications, "notification_id", last_id, limit)
+            or page_has_more(changes, "change_id", last_change_id, limit)
+        )
+    })
 
 @router.get("/unread/count")
 def get_unread_count(
@@ -45,6 +111,28 @@ def get_unread_count(
     
     return {"unread_count": count}
 
+@router.put("/mark-all-read", status_code=status.HTTP_200_OK)
+def mark_all_read(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Mark all notifications as read for current user.
+    """
+    unread_ids = [n[0] for n in db.query(Notification.notification_id).filter(
+        Notification.user_id == current_user.user_id,
+        Notification.is_read == 0
+    ).all()]
+    
+    if unread_ids:
+        db.query(Notification).filter(
+            Notification.notification_id.in_(unread_ids)
+        ).update({"is_read": 1}, synchronize_session=False)
+        record_changes(db, [current_user.user_id], "notification", "read", unread_ids)
+        db.commit()
+    
+    return {"message": "All notifications marked as read"}
+
 @router.put("/{notification_id}", response_model=NotificationResponse)
 def mark_notification_read(
     notification_id: int,
@@ -73,25 +161,33 @@ def mark_notification_read(
         )
     
     notification.is_read = notification_data.is_read
+    record_changes(
+        db, [current_user.user_id], "notification",
+        "read" if notification.is_read else "unread", [notification_id]
+    )
     db.commit()
     db.refresh(notification)
     return notification
 
-@router.put("/mark-all-read", status_code=status.HTTP_200_OK)
-def mark_all_read(
+@router.delete("/clear-all", status_code=status.HTTP_204_NO_CONTENT)
+def clear_all_notifications(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Mark all notifications as read for current user.
+    Delete all notifications for current user.
     """
-    db.query(Notification).filter(
-        Notification.user_id == current_user.user_id,
-        Notification.is_read == 0
-    ).update({"is_read": 1})
-    db.commit()
+    notification_ids = [n[0] for n in db.query(Notification.notification_id).filter(
+        Notification.user_id == current_user.user_id
+    ).all()]
     
-    return {"message": "All notifications marked as read"}
+    if notification_ids:
+        db.query(Notification).filter(
+            Notification.notification_id.in_(notification_ids)
+        ).delete(synchronize_session=False)
+        record_changes(db, [current_user.user_id], "notification", "delete", notification_ids)
+        db.commit()
+    return None
 
 @router.delete("/{notification_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_notification(
@@ -119,20 +215,7 @@ def delete_notification(
             detail="Not authorized to delete this notification"
         )
     
+    # The delete is logged by utils/sync.py
     db.delete(notification)
     db.commit()
     return None
-
-@router.delete("/clear-all", status_code=status.HTTP_204_NO_CONTENT)
-def clear_all_notifications(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """
-    Delete all notifications for current user.
-    """
-    db.query(Notification).filter(
-        Notification.user_id == current_user.user_id
-    ).delete()
-    db.commit()
-    return None
\ No newline at end of file
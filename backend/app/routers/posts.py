@@ -1,10 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from collections import defaultdict
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import Select, String, cast, exists, false, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from ..database import get_db
+from typing import Dict, List, Optional
+from ..database import get_db, get_async_db
 from ..models import Post, User, Like, Comment, Hashtag, PostHashtag, SavedPost
 from ..schemas.post import PostCreate, PostResponse, PostUpdate
-from ..utils.dependencies import get_current_user
+from ..utils.dependencies import get_current_user, get_current_user_async
+from ..utils.etags import conditional_get
+from ..utils.images import media_variants, variant_url
+from ..utils.media_store import add_refs, release_refs, media_preview
+from ..utils.metrics import events
+from ..utils.responses import json_response
 
 router = APIRouter()
 
@@ -41,6 +50,17 @@ def build_post_response(post: Post, current_user_id: Optional[int], db: Session)
     ).all()
     hashtag_names = [tag.tag_name for tag in hashtags]
 
+    return post_response_dict(post, user, likes_count, comments_count, is_liked, is_saved, hashtag_names)
+
+def post_response_dict(
+    post: Post,
+    user: Optional[User],
+    likes_count: int,
+    comments_count: int,
+    is_liked: bool,
+    is_saved: bool,
+    hashtag_names: List[str]
+) -> dict:
     return {
         "post_id": post.post_id,
         "user_id": post.user_id,
@@ -50,13 +70,117 @@ def build_post_response(post: Post, current_user_id: Optional[int], db: Session)
         "updated_at": post.updated_at,
         "username": user.username if user else None,
         "user_profile_picture": user.profile_picture if user else None,
+        "user_profile_picture_thumb": variant_url(user.profile_picture, user.profile_picture_variants_ready, "thumb") if user else None,
+        "user_profile_picture_placeholder": user.profile_picture_placeholder if user else None,
         "likes_count": likes_count,
         "comments_count": comments_count,
         "is_liked": is_liked,
         "is_saved": is_saved,
-        "hashtags": hashtag_names
+        "hashtags": hashtag_names,
+        "media_variants": media_variants(post.media, post.media_variants_ready),
+        "media_width": post.media_width,
+        "media_height": post.media_height,
+        "media_placeholder": post.media_placeholder
     }
 
+def post_version(post: Post, current_user_id: Optional[int], db: Session) -> tuple:
+    """
+    What build_post_response reads, in one query: equal versions give
+    equal responses. The hashtags are read as their ids, since tag names
+    never change.
+    """
+    if current_user_id:
+        is_liked = exists().where(Like.post_id == post.post_id, Like.user_id == current_user_id)
+        is_saved = exists().where(SavedPost.post_id == post.post_id, SavedPost.user_id == current_user_id)
+    else:
+        is_liked = is_saved = false()
+    stats = db.execute(
+        select(
+            User.updated_at,
+            User.username,
+            User.profile_picture,
+            select(func.count()).select_from(Like).where(Like.post_id == post.post_id).scalar_subquery(),
+            select(func.count()).select_from(Comment).where(Comment.post_id == post.post_id).scalar_subquery(),
+            is_liked,
+            is_saved,
+            select(func.aggregate_strings(cast(PostHashtag.tag_id, String), ",")).where(
+                PostHashtag.post_id == post.post_id
+            ).scalar_subquery()
+        )
+        .select_from(Post)
+        .outerjoin(User, User.user_id == Post.user_id)
+        .where(Post.post_id == post.post_id)
+    ).one()
+    *stats, tag_ids = stats
+    tag_ids = tuple(sorted(int(tag_id) for tag_id in (tag_ids or "").split(",") if tag_id))
+    # updated_at has second precision on SQLite, so the shown fields are included too
+    return (
+        "post", post.post_id, current_user_id, post.updated_at, post.text, post.media,
+        post.media_variants_ready, *stats, tag_ids
+    )
+
+def post_page_statements(posts: List[Post], current_user_id: Optional[int]) -> Dict[str, Select]:
+    """
+    The statements a page of post responses needs, a fixed number per page
+    instead of several per post. Run by build_post_responses and
+    build_post_responses_async, so both paths send the same queries.
+    """
+    post_ids = [post.post_id for post in posts]
+    statements = {
+        "users": select(User).where(User.user_id.in_({post.user_id for post in posts})),
+        "likes_counts": select(Like.post_id, func.count()).where(Like.post_id.in_(post_ids)).group_by(Like.post_id),
+        "comments_counts": select(Comment.post_id, func.count()).where(
+            Comment.post_id.in_(post_ids)
+        ).group_by(Comment.post_id),
+        "hashtags": select(PostHashtag.post_id, Hashtag.tag_name).join(
+            Hashtag, Hashtag.tag_id == PostHashtag.tag_id
+        ).where(PostHashtag.post_id.in_(post_ids)),
+    }
+    if current_user_id:
+        statements["liked"] = select(Like.post_id).where(Like.user_id == current_user_id, Like.post_id.in_(post_ids))
+        statements["saved"] = select(SavedPost.post_id).where(
+            SavedPost.user_id == current_user_id, SavedPost.post_id.in_(post_ids)
+        )
+    return statements
+
+def post_page_responses(posts: List[Post], rows: Dict[str, list]) -> List[dict]:
+    """Responses for a page of posts from the rows of post_page_statements"""
+    users = {user.user_id: user for (user,) in rows["users"]}
+    likes_counts = dict(rows["likes_counts"])
+    comments_counts = dict(rows["comments_counts"])
+    liked = {post_id for (post_id,) in rows.get("liked", [])}
+    saved = {post_id for (post_id,) in rows.get("saved", [])}
+    hashtags = defaultdict(list)
+    for post_id, tag_name in rows["hashtags"]:
+        hashtags[post_id].append(tag_name)
+
+    return [
+        post_response_dict(
+            post,
+            users.get(post.user_id),
+            likes_counts.get(post.post_id, 0),
+            comments_counts.get(post.post_id, 0),
+            post.post_id in liked,
+            post.post_id in saved,
+            hashtags[post.post_id]
+        )
+        for post in posts
+    ]
+
+def build_post_responses(posts: List[Post], current_user_id: Optional[int], db: Session) -> List[dict]:
+    """Responses for a page of posts on the sync database path"""
+    if not posts:
+        return []
+    statements = post_page_statements(posts, current_user_id)
+    return post_page_responses(posts, {name: db.execute(stmt).all() for name, stmt in statements.items()})
+
+async def build_post_responses_async(posts: List[Post], current_user_id: Optional[int], db: AsyncSession) -> List[dict]:
+    """Responses for a page of posts on the async database path"""
+    if not posts:
+        return []
+    statements = post_page_statements(posts, current_user_id)
+    return post_page_responses(posts, {name: (await db.execute(stmt)).all() for name, stmt in statements.items()})
+
 @router.post("/", response_model=PostResponse, status_code=status.HTTP_201_CREATED)
 def create_post(
     post_data: PostCreate,
@@ -72,9 +196,17 @@ def create_post(
         text=post_data.text,
         media=post_data.media
     )
+    add_refs(db, [post_data.media])
+    (
+        new_post.media_width,
+        new_post.media_height,
+        new_post.media_placeholder,
+        new_post.media_variants_ready
+    ) = media_preview(db, post_data.media)
     db.add(new_post)
     db.commit()
     db.refresh(new_post)
+    events.inc(("post_created",))
     
     # Add hashtags if provided
     if post_data.hashtags:
@@ -101,26 +233,31 @@ def create_post(
     return build_post_response(new_post, current_user.user_id, db)
 
 @router.get("/", response_model=List[PostResponse])
-def get_feed(
+async def get_feed(
     skip: int = 0,
     limit: int = 20,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get posts feed (all posts, ordered by newest first).
     """
-    posts = db.query(Post).order_by(Post.created_at.desc()).offset(skip).limit(limit).all()
-    return [build_post_response(post, current_user.user_id, db) for post in posts]
+    posts = (await db.execute(
+        select(Post).order_by(Post.created_at.desc()).offset(skip).limit(limit)
+    )).scalars().all()
+    return json_response(List[PostResponse], await build_post_responses_async(posts, current_user.user_id, db))
 
 @router.get("/{post_id}", response_model=PostResponse)
 def get_post(
     post_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Get a specific post by ID.
+    Answers a matching If-None-Match with 304 before building the post.
     """
     post = db.query(Post).filter(Post.post_id == post_id).first()
     if not post:
@@ -128,6 +265,9 @@ def get_post(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found"
         )
+    not_modified = conditional_get(request, response, lambda: post_version(post, current_user.user_id, db))
+    if not_modified:
+        return not_modified
     return build_post_response(post, current_user.user_id, db)
 
 @router.put("/{post_id}", response_model=PostResponse)
@@ -157,11 +297,22 @@ def update_post(
     # Update fields
     if post_data.text is not None:
         post.text = post_data.text
-    if post_data.media is not None:
+    if post_data.media is not None and post_data.media != post.media:
+        release_refs(db, [post.media])
+        add_refs(db, [post_data.media])
         post.media = post_data.media
+        (
+            post.media_width,
+            post.media_height,
+            post.media_placeholder,
+            post.media_variants_ready
+        ) = media_preview(db, post_data.media)
     
     # Update hashtags if provided
     if post_data.hashtags is not None:
+        # Tags live in post_hashtags, so mark the post edited for updated_at and its ETag
+        post.updated_at = datetime.now(timezone.utc)
+
         # Remove old hashtags
         db.query(PostHashtag).filter(PostHashtag.post_id == post_id).delete()
         
@@ -208,6 +359,7 @@ def delete_post(
             detail="Not authorized to delete this post"
         )
     
+    release_refs(db, [post.media])
     db.delete(post)
     db.commit()
     return None
@@ -227,4 +379,4 @@ def get_user_posts(
         Post.user_id == user_id
     ).order_by(Post.created_at.desc()).offset(skip).limit(limit).all()
     
-    return [build_post_response(post, current_user.user_id, db) for post in posts]
\ No newline at end of file
+    return json_response(List[PostResponse], build_post_responses(posts, current_user.user_id, db))
\ No newline at end of file
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from typing import List
+from ..utils.profiling import profile_store, require_profiling_admin
+
+router = APIRouter(dependencies=[Depends(require_profiling_admin)])
+
+@router.get("/")
+def list_profiles() -> List[dict]:
+    """
+    List captured request profiles, newest first, with route, duration and query count.
+    """
+    return profile_store.list()
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str):
+    """
+    Download a profile file; open it at https://www.speedscope.app.
+    """
+    path = profile_store.path(profile_id)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return FileResponse(path, filename=path.rsplit("/", 1)[-1])
@@ -5,6 +5,7 @@ from typing import List
 from ..database import get_db
 from ..models import SavedPost, Post, User, Like, Comment, Hashtag, PostHashtag
 from ..utils.dependencies import get_current_user
+from ..utils.images import media_variants, variant_url
 
 router = APIRouter()
 
@@ -43,11 +44,17 @@ def build_post_response(post: Post, current_user_id: int, db: Session) -> dict:
         "updated_at": post.updated_at,
         "username": user.username if user else None,
         "user_profile_picture": user.profile_picture if user else None,
+        "user_profile_picture_thumb": variant_url(user.profile_picture, user.profile_picture_variants_ready, "thumb") if user else None,
+        "user_profile_picture_placeholder": user.profile_picture_placeholder if user else None,
         "likes_count": likes_count,
         "comments_count": comments_count,
         "is_liked": is_liked,
         "is_saved": True,  # Always true since these are saved posts
-        "hashtags": hashtag_names
+        "hashtags": hashtag_names,
+        "media_variants": media_variants(post.media, post.media_variants_ready),
+        "media_width": post.media_width,
+        "media_height": post.media_height,
+        "media_placeholder": post.media_placeholder
     }
 
 
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, status
+from typing import List
+from ..utils.profiling import require_profiling_admin
+from ..utils.slow_queries import slow_query_log
+
+router = APIRouter(dependencies=[Depends(require_profiling_admin)])
+
+@router.get("/")
+def list_slow_queries() -> List[dict]:
+    """
+    Slowest statement shapes by total time, with counts, routes and plans.
+    """
+    return slow_query_log.top()
+
+@router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
+def clear_slow_queries():
+    """
+    Reset the in-memory slow query summary (the log file is kept).
+    """
+    slow_query_log.clear()
+    return None
@@ -1,11 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime, timedelta
 from ..database import get_db
-from ..models import Story, User, Follow
-from ..schemas.story import StoryCreate, StoryResponse
+from ..models import Story, StorySeen, User, Follow
+from ..schemas.story import StoryCreate, StoryResponse, StoryTrayEntry, StoryViewsResponse
 from ..utils.dependencies import get_current_user
+from ..utils.story_expiry import story_expiry_scheduler
+from ..utils.story_tray import build_story_tray, story_tray_cache
+from ..utils.story_views import story_view_recorder
+from ..utils.images import media_variants
+from ..utils.media_store import add_refs, release_refs, media_preview
+from ..utils.responses import json_response
 
 router = APIRouter()
 
@@ -22,7 +30,12 @@ def build_story_response(story: Story, db: Session) -> dict:
         "expiration_time": story.expiration_time,
         "created_at": story.created_at,
         "username": user.username if user else None,
-        "user_profile_picture": user.profile_picture if user else None
+        "user_profile_picture": user.profile_picture if user else None,
+        "profile_picture_placeholder": user.profile_picture_placeholder if user else None,
+        "media_variants": media_variants(story.media, story.media_variants_ready),
+        "media_width": story.media_width,
+        "media_height": story.media_height,
+        "media_placeholder": story.media_placeholder
     }
 
 @router.post("/", response_model=StoryResponse, status_code=status.HTTP_201_CREATED)
@@ -43,9 +56,18 @@ def create_story(
         media=story_data.media,
         expiration_time=expiration_time
     )
+    add_refs(db, [story_data.media])
+    (
+        new_story.media_width,
+        new_story.media_height,
+        new_story.media_placeholder,
+        new_story.media_variants_ready
+    ) = media_preview(db, story_data.media)
     db.add(new_story)
     db.commit()
     db.refresh(new_story)
+    story_expiry_scheduler.schedule(new_story.story_id, new_story.expiration_time)
+    story_tray_cache.author_changed(current_user.user_id)
     
     return build_story_response(new_story, db)
 
@@ -75,7 +97,25 @@ def get_stories(
         Story.expiration_time > current_time
     ).order_by(Story.created_at.desc()).offset(skip).limit(limit).all()
     
-    return [build_story_response(story, db) for story in stories]
+    return json_response(List[StoryResponse], [build_story_response(story, db) for story in stories])
+
+@router.get("/tray", response_model=List[StoryTrayEntry])
+def get_story_tray(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the story tray: one entry per followed author with active stories,
+    including own stories, with an unseen flag per author.
+    """
+    current_time = datetime.utcnow()
+    tray = story_tray_cache.get(current_user.user_id, current_time)
+    if tray is None:
+        # Taken first, so a story posted during the build invalidates this tray
+        snapshot = story_tray_cache.snapshot()
+        tray, author_ids = build_story_tray(current_user.user_id, db, current_time)
+        story_tray_cache.put(current_user.user_id, tray, author_ids, snapshot)
+    return json_response(List[StoryTrayEntry], tray)
 
 @router.get("/user/{user_id}", response_model=List[StoryResponse])
 def get_user_stories(
@@ -100,7 +140,7 @@ def get_user_stories(
         Story.expiration_time > current_time
     ).order_by(Story.created_at.desc()).all()
     
-    return [build_story_response(story, db) for story in stories]
+    return json_response(List[StoryResponse], [build_story_response(story, db) for story in stories])
 
 @router.get("/{story_id}", response_model=StoryResponse)
 def get_story(story_id: int, db: Session = Depends(get_db)):
@@ -123,6 +163,112 @@ def get_story(story_id: int, db: Session = Depends(get_db)):
     
     return build_story_response(story, db)
 
+@router.post("/{story_id}/seen", status_code=status.HTTP_204_NO_CONTENT)
+def mark_story_seen(
+    story_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Mark a story, and every older story from the same author, as seen.
+    """
+    story = db.query(Story).filter(Story.story_id == story_id).first()
+    if not story:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Story not found"
+        )
+    
+    # One upsert, so two first views of an author cannot both insert; the
+    # watermark only moves forward
+    viewer_id = current_user.user_id  # Read before the commit expires it
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    upsert = dialect_insert(StorySeen).values(
+        viewer_id=viewer_id,
+        author_id=story.user_id,
+        last_seen_story_id=story_id
+    )
+    db.execute(upsert.on_conflict_do_update(
+        index_elements=[StorySeen.viewer_id, StorySeen.author_id],
+        set_={"last_seen_story_id": upsert.excluded.last_seen_story_id, "updated_at": func.now()},
+        where=StorySeen.last_seen_story_id < upsert.excluded.last_seen_story_id
+    ))
+    db.commit()
+    
+    story_tray_cache.invalidate_viewer(viewer_id)
+    return None
+
+@router.post("/{story_id}/view", status_code=status.HTTP_204_NO_CONTENT)
+def record_story_view(
+    story_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Record that the current user viewed a story.
+    Views are buffered in memory and flushed to the database periodically.
+    """
+    story = db.query(Story.user_id, Story.expiration_time).filter(
+        Story.story_id == story_id
+    ).first()
+    if not story:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Story not found"
+        )
+    
+    if story.expiration_time < datetime.utcnow():
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Story has expired"
+        )
+    
+    # Owners viewing their own story don't count
+    if story.user_id != current_user.user_id:
+        story_view_recorder.record(story_id, current_user.user_id)
+    return None
+
+@router.get("/{story_id}/views", response_model=StoryViewsResponse)
+def get_story_views(
+    story_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get unique viewer count and first viewers of a story (only by the story owner).
+    """
+    story = db.query(Story).filter(Story.story_id == story_id).first()
+    if not story:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Story not found"
+        )
+    
+    # Check ownership
+    if story.user_id != current_user.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this story's viewers"
+        )
+    
+    unique_viewers, viewer_ids = story_view_recorder.view_stats(story)
+    users = {
+        u.user_id: u for u in db.query(User).filter(User.user_id.in_(viewer_ids)).all()
+    }
+    
+    return {
+        "story_id": story_id,
+        "unique_viewers": unique_viewers,
+        "viewers": [
+            {
+                "user_id": users[v].user_id,
+                "username": users[v].username,
+                "profile_picture": users[v].profile_picture
+            }
+            for v in viewer_ids if v in users
+        ]
+    }
+
 @router.delete("/{story_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_story(
     story_id: int,
@@ -146,8 +292,10 @@ def delete_story(
             detail="Not authorized to delete this story"
         )
     
+    release_refs(db, [story.media])
     db.delete(story)
     db.commit()
+    story_tray_cache.author_changed(current_user.user_id)
     return None
 
 @router.delete("/cleanup/expired", status_code=status.HTTP_200_OK)
@@ -156,7 +304,9 @@ def cleanup_expired_stories(db: Session = Depends(get_db)):
     Delete all expired stories (admin/cleanup endpoint).
     """
     current_time = datetime.utcnow()
-    deleted = db.query(Story).filter(Story.expiration_time < current_time).delete()
+    expired = db.query(Story).filter(Story.expiration_time < current_time)
+    release_refs(db, [row.media for row in expired.with_entities(Story.media).all()])
+    deleted = expired.delete(synchronize_session=False)
     db.commit()
     
     return {"message": f"Deleted {deleted} expired stories"}
\ No newline at end of file
@@ -1,77 +1,281 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
 from sqlalchemy.orm import Session
-from ..database import get_db
-from ..models import User
+from ..database import SessionLocal, get_db
+from ..models import User, MediaFile
 from ..utils.dependencies import get_current_user
+from ..utils.images import UPLOAD_DIR, image_pipeline, media_variants
+from ..utils.media_store import (
+    content_path,
+    content_url,
+    content_name,
+    digest_from_url,
+    store_upload,
+    save_preview,
+    mark_variants_ready,
+    delete_unreferenced
+)
+from ..config import settings
+import functools
+import hashlib
 import os
 import uuid
-from datetime import datetime
+from typing import AsyncIterator, List, NamedTuple, Optional
 
 router = APIRouter()
 
 # Create uploads directory if it doesn't exist
-UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # Allowed file types
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+MULTIPART_OVERHEAD = 64 * 1024  # Boundaries, part headers and small form fields
 
-@router.post("/image")
+# The endpoint parses its own body, so the docs get the form described by hand
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}}
+                }
+            }
+        }
+    }
+}
+
+class ReceivedFile(NamedTuple):
+    filename: str
+    path: str  # Temporary file; the caller moves it into place
+    size: int
+    digest: str  # SHA-256, hex
+
+def file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"File too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB"
+    )
+
+def bad_upload(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+def check_extension(filename: str) -> str:
+    file_ext = os.path.splitext(filename)[1].lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise bad_upload(f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}")
+    return file_ext
+
+def _remove_if_exists(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+async def save_multipart_upload(
+    content_type: str,
+    chunks: AsyncIterator[bytes],
+    directory: str,
+    field: str = "file"
+) -> ReceivedFile:
+    """
+    Parse a multipart/form-data body as it arrives and write its `field`
+    part to a temporary file.
+
+    FastAPI's UploadFile is only handed over after Starlette has spooled the
+    whole body, so the endpoint reads the request stream itself. The file
+    type is checked as soon as the part headers arrive, the size limit is
+    enforced and the SHA-256 digest computed while receiving, and only the
+    chunk just received is held in memory. File writes run in the
+    threadpool so the event loop never blocks on disk. Other fields are
+    ignored.
+
+    Raises:
+        HTTPException 400 for a malformed body, a missing `field` part, a
+        disallowed file type or a file larger than MAX_FILE_SIZE
+    """
+    mime, options = parse_options_header(content_type)
+    if mime != b"multipart/form-data" or not options.get(b"boundary"):
+        raise bad_upload("Expected a multipart/form-data body")
+
+    headers = {}
+    header_field, header_value = bytearray(), bytearray()
+    in_file = False
+    filename: Optional[str] = None
+    pending: List[bytes] = []
+
+    def on_part_begin() -> None:
+        headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.extend(data[start:end])
+
+    def on_header_end() -> None:
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished() -> None:
+        nonlocal in_file, filename
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        if filename is None and disposition.get(b"name") == field.encode() and b"filename" in disposition:
+            in_file = True
+            filename = disposition[b"filename"].decode("utf-8", "replace")
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if in_file:
+            pending.append(bytes(data[start:end]))
+
+    def on_part_end() -> None:
+        nonlocal in_file
+        in_file = False
+
+    parser = MultipartParser(options[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.part")
+    out = await run_in_threadpool(open, tmp_path, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    checked = False
+    try:
+        async for chunk in chunks:
+            try:
+                parser.write(chunk)
+            except MultipartParseError:
+                raise bad_upload("Malformed multipart body")
+            if filename is not None and not checked:
+                check_extension(filename)
+                checked = True
+            if pending:
+                data = b"".join(pending)
+                pending.clear()
+                size += len(data)
+                if size > MAX_FILE_SIZE:
+                    raise file_too_large()
+                digest.update(data)
+                await run_in_threadpool(out.write, data)
+        parser.finalize()
+        if filename is None:
+            raise bad_upload(f"Missing '{field}' file field")
+        await run_in_threadpool(out.close)
+    except BaseException:
+        await run_in_threadpool(out.close)
+        await run_in_threadpool(_remove_if_exists, tmp_path)
+        raise
+    return ReceivedFile(filename, tmp_path, size, digest.hexdigest())
+
+def _record_variants(url: str) -> None:
+    """Runs after the request's session has closed, so it opens its own"""
+    db = SessionLocal()
+    try:
+        mark_variants_ready(db, url)
+    finally:
+        db.close()
+
+@router.post("/image", openapi_extra=UPLOAD_REQUEST_BODY)
 async def upload_image(
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
-    Upload an image file.
+    Upload an image file as the `file` field of a multipart form.
     Returns the URL path to access the uploaded image.
     """
-    # Check file extension
-    file_ext = os.path.splitext(file.filename)[1].lower()
-    if file_ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
-        )
+    # Reject early when the body is already known to be too large
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+        raise file_too_large()
 
-    # Read file content
-    content = await file.read()
+    # Stream to a temporary file, hashing as we go
+    upload = await save_multipart_upload(
+        request.headers.get("content-type", ""), request.stream(), UPLOAD_DIR
+    )
+    file_ext = check_extension(upload.filename)
+    tmp_path, size, digest = upload.path, upload.size, upload.digest
 
-    # Check file size
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB"
+    # Files are stored by content hash, so identical uploads share one file
+    try:
+        media, created = await run_in_threadpool(
+            store_upload, db, tmp_path, digest, file_ext, size, current_user.user_id
         )
+    except BaseException:
+        await run_in_threadpool(_remove_if_exists, tmp_path)
+        raise
 
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_id = str(uuid.uuid4())[:8]
-    filename = f"{current_user.user_id}_{timestamp}_{unique_id}{file_ext}"
+    # Resize in the background; the upload response does not wait for it
+    url = content_url(media.digest, media.extension)
+    path = content_path(media.digest, media.extension)
+    if created and settings.IMAGE_VARIANTS_ENABLED:
+        image_pipeline.submit(path, on_done=functools.partial(_record_variants, url))
 
-    # Save file
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    with open(file_path, "wb") as f:
-        f.write(content)
+    # The placeholder is small and cheap, so it is ready before the upload returns
+    preview = {"width": media.width, "height": media.height, "placeholder": media.placeholder}
+    if media.placeholder is None:
+        preview = await image_pipeline.preview(path) or preview
+        if preview["placeholder"] is not None:
+            await run_in_threadpool(save_preview, db, media.digest, preview)
 
     # Return the URL path (relative to static files)
     return {
         "success": True,
-        "filename": filename,
-        "url": f"/uploads/{filename}"
+        "filename": content_name(media.digest, media.extension),
+        "url": url,
+        "variants": media_variants(url, media.variants_ready),
+        "width": preview["width"],
+        "height": preview["height"],
+        "placeholder": preview["placeholder"]
     }
 
-@router.delete("/image/{filename}")
+@router.delete("/image/{filename:path}")
 async def delete_image(
     filename: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
     Delete an uploaded image.
-    Only the user who uploaded it can delete it.
+    Only the user who uploaded it can delete it, and only while no post,
+    story or profile uses it.
     """
-    # Check if filename starts with user's ID
-    if not filename.startswith(f"{current_user.user_id}_"):
+    digest = digest_from_url(f"/uploads/{filename}")
+    if digest is not None:
+        media = db.query(MediaFile).filter(MediaFile.digest == digest).first()
+        if not media:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="File not found"
+            )
+        if media.uploader_id != current_user.user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to delete this file"
+            )
+        if not await run_in_threadpool(delete_unreferenced, db, digest):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="File is still in use"
+            )
+        return {"success": True, "message": "File deleted"}
+
+    # Files uploaded before content addressing: {user_id}_{timestamp}_{uuid}{ext}
+    if "/" in filename or not filename.startswith(f"{current_user.user_id}_"):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to delete this file"
@@ -79,11 +283,12 @@ async def delete_image(
 
     file_path = os.path.join(UPLOAD_DIR, filename)
 
-    if not os.path.exists(file_path):
+    try:
+        await run_in_threadpool(os.remove, file_path)
+    except FileNotFoundError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="File not found"
         )
 
-    os.remove(file_path)
     return {"success": True, "message": "File deleted"}
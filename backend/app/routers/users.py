@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import exists, false, func, select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..database import get_db
-from ..models import User, Follow, Post
+from ..models import User, Follow, Post, Story
 from ..schemas.user import UserResponse, UserUpdate
 from ..utils.dependencies import get_current_user, get_current_user_optional
-from ..utils.auth import get_password_hash
+from ..utils.auth import password_hasher
+from ..utils.auth_cache import user_cache
+from ..utils.media_store import add_refs, release_refs, media_preview
+from ..utils.etags import conditional_get
 
 router = APIRouter()
 
@@ -32,6 +37,7 @@ def build_user_response(user: User, current_user_id: Optional[int], db: Session)
         "email": user.email,
         "profile_info": user.profile_info,
         "profile_picture": user.profile_picture,
+        "profile_picture_placeholder": user.profile_picture_placeholder,
         "created_at": user.created_at,
         "posts_count": posts_count,
         "followers_count": followers_count,
@@ -39,6 +45,27 @@ def build_user_response(user: User, current_user_id: Optional[int], db: Session)
         "is_following": is_following
     }
 
+def user_version(user: User, current_user_id: Optional[int], db: Session) -> tuple:
+    """
+    What build_user_response reads, with the stats in one query: equal
+    versions give equal responses.
+    """
+    if current_user_id and current_user_id != user.user_id:
+        is_following = exists().where(Follow.follower_id == current_user_id, Follow.followee_id == user.user_id)
+    else:
+        is_following = false()
+    stats = db.execute(select(
+        select(func.count()).select_from(Follow).where(Follow.followee_id == user.user_id).scalar_subquery(),
+        select(func.count()).select_from(Follow).where(Follow.follower_id == user.user_id).scalar_subquery(),
+        select(func.count()).select_from(Post).where(Post.user_id == user.user_id).scalar_subquery(),
+        is_following
+    )).one()
+    # updated_at has second precision on SQLite, so the shown fields are included too
+    return (
+        "user", user.user_id, current_user_id, user.updated_at, user.username, user.email,
+        user.profile_info, user.profile_picture, *stats
+    )
+
 @router.get("/me", response_model=UserResponse)
 def get_current_user_profile(current_user: User = Depends(get_current_user)):
     """
@@ -59,14 +86,14 @@ def get_user_by_username(username: str, db: Session = Depends(get_db)):
         )
     return user
 
-@router.put("/me", response_model=UserResponse)
-def update_current_user(
+def apply_user_update(
     user_data: UserUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+    hashed_password: Optional[str],
+    current_user: User,
+    db: Session
+) -> User:
     """
-    Update current user's profile.
+    Apply a profile update; the new password is hashed by the caller.
     """
     # Update username if provided
     if user_data.username:
@@ -97,15 +124,37 @@ def update_current_user(
     # Update other fields
     if user_data.profile_info is not None:
         current_user.profile_info = user_data.profile_info
-    if user_data.profile_picture is not None:
+    if user_data.profile_picture is not None and user_data.profile_picture != current_user.profile_picture:
+        release_refs(db, [current_user.profile_picture])
+        add_refs(db, [user_data.profile_picture])
         current_user.profile_picture = user_data.profile_picture
-    if user_data.password:
-        current_user.hashed_password = get_password_hash(user_data.password)
+        (
+            current_user.profile_picture_width,
+            current_user.profile_picture_height,
+            current_user.profile_picture_placeholder,
+            current_user.profile_picture_variants_ready
+        ) = media_preview(db, user_data.profile_picture)
+    if hashed_password:
+        current_user.hashed_password = hashed_password
     
     db.commit()
+    user_cache.invalidate(current_user.user_id)
     db.refresh(current_user)
     return current_user
 
+@router.put("/me", response_model=UserResponse)
+async def update_current_user(
+    user_data: UserUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Update current user's profile.
+    A new password is hashed on the bcrypt pool, not in the threadpool.
+    """
+    hashed_password = await password_hasher.hash(user_data.password) if user_data.password else None
+    return await run_in_threadpool(apply_user_update, user_data, hashed_password, current_user, db)
+
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
 def delete_current_user(
     current_user: User = Depends(get_current_user),
@@ -114,8 +163,16 @@ def delete_current_user(
     """
     Delete current user's account.
     """
+    # Posts and stories are deleted with the account, so release their media too
+    media = [p[0] for p in db.query(Post.media).filter(Post.user_id == current_user.user_id).all()]
+    media += [s[0] for s in db.query(Story.media).filter(Story.user_id == current_user.user_id).all()]
+    media.append(current_user.profile_picture)
+    release_refs(db, media)
+    
+    user_id = current_user.user_id
     db.delete(current_user)
     db.commit()
+    user_cache.invalidate(user_id)
     return None
 
 @router.get("/{user_id}/stats")
@@ -168,11 +225,14 @@ def search_users(
 @router.get("/{user_id}")
 def get_user_by_id(
     user_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
     Get user profile by user ID with follow status.
+    Answers a matching If-None-Match with 304 before building the profile.
     """
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
@@ -182,4 +242,7 @@ def get_user_by_id(
         )
 
     current_user_id = current_user.user_id if current_user else None
+    not_modified = conditional_get(request, response, lambda: user_version(user, current_user_id, db))
+    if not_modified:
+        return not_modified
     return build_user_response(user, current_user_id, db)
\ No newline at end of file
@@ -56,6 +56,9 @@ from .notification import (
 from .story import (
     StoryCreate,
     StoryResponse,
+    StoryTrayEntry,
+    StoryViewer,
+    StoryViewsResponse,
     StoryDeleteResponse
 )
 
@@ -65,6 +68,12 @@ from .hashtag import (
     HashtagSearchResponse
 )
 
+from .sync import (
+    SyncChangeResponse,
+    NotificationSyncResponse,
+    MessageSyncResponse
+)
+
 __all__ = [
     # User
     "UserCreate",
@@ -113,10 +122,18 @@ __all__ = [
     # Story
     "StoryCreate",
     "StoryResponse",
+    "StoryTrayEntry",
+    "StoryViewer",
+    "StoryViewsResponse",
     "StoryDeleteResponse",
     
     # Hashtag
     "HashtagResponse",
     "TrendingHashtagResponse",
     "HashtagSearchResponse",
+    
+    # Sync
+    "SyncChangeResponse",
+    "NotificationSyncResponse",
+    "MessageSyncResponse",
 ]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 # ============================================
@@ -20,6 +20,7 @@ class PostUpdate(BaseModel):
     """Schema for updating a post"""
     text: Optional[str] = Field(None, min_length=1, max_length=5000)
     media: Optional[str] = None
+    hashtags: Optional[List[str]] = None  # Replaces the post's hashtags when set
 
 class PostResponse(PostBase):
     """Schema for post response"""
@@ -27,6 +28,8 @@ class PostResponse(PostBase):
     user_id: int
     username: str  # From join with User table
     user_profile_picture: Optional[str] = None
+    user_profile_picture_thumb: Optional[str] = None  # Small WebP avatar
+    user_profile_picture_placeholder: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -39,6 +42,14 @@ class PostResponse(PostBase):
     # Hashtags
     hashtags: List[str] = []
 
+    # Sized media variants: {"thumb"|"medium"|"full": {"webp"|"jpg": url}}
+    media_variants: Optional[Dict[str, Dict[str, str]]] = None
+
+    # Known at upload time, so clients can reserve space and show a preview
+    media_width: Optional[int] = None
+    media_height: Optional[int] = None
+    media_placeholder: Optional[str] = None  # Tiny base64 WebP data URI
+
     class Config:
         from_attributes = True
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List, Dict
 from datetime import datetime
 
 # ============================================
@@ -20,13 +20,41 @@ class StoryResponse(StoryBase):
     user_id: int
     username: str  # From join with User table
     profile_picture: Optional[str] = None
+    profile_picture_placeholder: Optional[str] = None
     created_at: datetime
     expiration_time: datetime
     is_expired: bool = False  # Computed field
+    media_variants: Optional[Dict[str, Dict[str, str]]] = None  # Sized media variants
+    media_width: Optional[int] = None
+    media_height: Optional[int] = None
+    media_placeholder: Optional[str] = None  # Tiny base64 WebP data URI
     
     class Config:
         from_attributes = True
 
+class StoryTrayEntry(BaseModel):
+    """Schema for one author in the story tray"""
+    user_id: int
+    username: str
+    profile_picture: Optional[str] = None
+    profile_picture_thumb: Optional[str] = None  # Small WebP avatar
+    profile_picture_placeholder: Optional[str] = None
+    story_ids: List[int]  # Active stories, oldest first
+    has_unseen: bool = False  # Whether any story is newer than the seen watermark
+    latest_story_at: datetime
+
+class StoryViewer(BaseModel):
+    """Schema for a story viewer"""
+    user_id: int
+    username: str
+    profile_picture: Optional[str] = None
+
+class StoryViewsResponse(BaseModel):
+    """Schema for story view stats (owner only)"""
+    story_id: int
+    unique_viewers: int  # Exact up to the viewer list size, estimated above it
+    viewers: List[StoryViewer] = []  # First viewers, in viewing order
+
 class StoryDeleteResponse(BaseModel):
     """Schema for story deletion response"""
     success: bool
@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+from typing import List
+from .notification import NotificationResponse
+from .message import MessageResponse
+
+# ============================================
+# SYNC SCHEMAS
+# ============================================
+
+class SyncChangeResponse(BaseModel):
+    """Schema for a read-flag or delete change on an already synced row"""
+    change_id: int
+    entity_id: int
+    action: str  # read, unread, delete
+    
+    class Config:
+        from_attributes = True
+
+class SyncResponseBase(BaseModel):
+    """Base schema for delta sync responses"""
+    changes: List[SyncChangeResponse] = []
+    next_token: str  # Pass back as `since` on the next sync
+    has_more: bool = False  # More rows are waiting; sync again right away
+    reset: bool = False  # The token expired; replace local state with this snapshot
+
+class NotificationSyncResponse(SyncResponseBase):
+    """Schema for notification delta sync"""
+    notifications: List[NotificationResponse] = []
+
+class MessageSyncResponse(SyncResponseBase):
+    """Schema for message delta sync"""
+    messages: List[MessageResponse] = []
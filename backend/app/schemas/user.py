@@ -35,6 +35,7 @@ class UserResponse(UserBase):
     user_id: int
     profile_info: Optional[str] = None
     profile_picture: Optional[str] = None
+    profile_picture_placeholder: Optional[str] = None  # Tiny base64 WebP data URI
     created_at: datetime
     
     # Stats (will be added from queries)
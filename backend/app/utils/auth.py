@@ -1,15 +1,21 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional, Tuple
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from ..config import settings
+from .auth_cache import token_cache
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context; hashes with a different cost are flagged by needs_update
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
-# Debug: Print SECRET_KEY on module load (first 10 chars only for security)
-print(f"🔑 AUTH MODULE LOADED - SECRET_KEY starts with: {settings.SECRET_KEY[:10]}...")
-print(f"🔑 ALGORITHM: {settings.ALGORITHM}")
+logger = logging.getLogger(__name__)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -23,6 +29,99 @@ def get_password_hash(password: str) -> str:
     """
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated, bounded thread pool.
+
+    bcrypt releases the GIL, so threads give real parallelism, and keeping
+    them apart from the anyio threadpool means a burst of logins cannot
+    starve other sync endpoints. When more than `max_queue` calls are
+    waiting, new ones are rejected with 503 instead of queueing without bound.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.PASSWORD_HASH_WORKERS,
+        max_queue: int = settings.PASSWORD_HASH_MAX_QUEUE
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.pending = 0  # Submitted and not finished, including running
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            return self._executor
+
+    async def _run(self, fn: Callable, *args):
+        with self._lock:
+            if self.pending - self.active >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many login attempts in progress, please retry",
+                    headers={"Retry-After": "1"}
+                )
+            self.pending += 1
+        submitted = time.perf_counter()
+
+        def task():
+            waited = time.perf_counter() - submitted
+            with self._lock:
+                self.active += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.pending -= 1
+                    self.completed += 1
+
+        return await asyncio.wrap_future(self._get_executor().submit(task))
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password.
+
+        Returns:
+            (whether it matches, a new hash if the stored one uses an outdated cost)
+        """
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.pending - self.active,
+                "active": self.active,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+# Shared hasher, shut down by the app lifespan in main.py
+password_hasher = PasswordHasher()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """
     Create a JWT access token.
@@ -43,46 +142,35 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
     to_encode.update({"exp": expire})
 
-    print(f"")
-    print(f"=" * 60)
-    print(f"🎫 CREATING ACCESS TOKEN")
-    print(f"=" * 60)
-    print(f"🎫 Payload: {to_encode}")
-    print(f"🎫 SECRET_KEY starts with: {settings.SECRET_KEY[:15]}...")
-    print(f"🎫 ALGORITHM: {settings.ALGORITHM}")
-
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-
-    print(f"🎫 Token created (first 80 chars): {encoded_jwt[:80]}...")
-    print(f"🎫 Token length: {len(encoded_jwt)}")
-
+    logger.debug("Access token created", extra={"user_id": data.get("sub"), "expires_at": expire.isoformat()})
     return encoded_jwt
 
 def verify_token(token: str) -> Optional[dict]:
     """
     Verify and decode a JWT token.
 
+    Decoded payloads are memoized until the token expires, so repeat
+    requests with the same token skip signature verification.
+
     Args:
         token: JWT token string
 
     Returns:
         Decoded token payload or None if invalid
     """
+    cached = token_cache.get(token)
+    if cached is not None:
+        return dict(cached)
+
     try:
-        print(f"🔐 Verifying token: {token[:50] if token else 'NO TOKEN'}...")
-        print(f"🔐 Using SECRET_KEY starting with: {settings.SECRET_KEY[:10]}...")
-        print(f"🔐 Using ALGORITHM: {settings.ALGORITHM}")
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        print(f"✅ Token valid! User ID: {payload.get('sub')}")
-        print(f"✅ Full payload: {payload}")
+        if isinstance(payload.get("exp"), (int, float)):
+            token_cache.put(token, dict(payload), payload["exp"])
         return payload
     except JWTError as e:
-        print(f"❌ Token verification failed: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.debug("Token verification failed: %s: %s", type(e).__name__, e)
         return None
-    except Exception as e:
-        print(f"❌ Unexpected error in verify_token: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.debug("Unexpected error in verify_token", exc_info=True)
         return None
\ No newline at end of file
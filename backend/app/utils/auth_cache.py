@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from ..config import settings
+from ..models.user import User
+
+class ExpiringLRUCache:
+    """
+    Thread-safe LRU cache whose entries each carry an expiry time.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any, expires_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+class UserCache:
+    """
+    Column values of recently authenticated users, keyed by user id.
+
+    A hit is turned back into a User attached to the request's session
+    without a SELECT, so endpoints can still update or delete it and lazy
+    load its relationships. Entries are dropped when the user updates or
+    deletes their account here, and expire after `ttl_seconds` to bound
+    staleness from changes made by other workers.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = settings.AUTH_USER_CACHE_TTL_SECONDS,
+        max_entries: int = settings.AUTH_USER_CACHE_MAX_ENTRIES
+    ):
+        self.ttl_seconds = ttl_seconds
+        self._cache = ExpiringLRUCache(max_entries if ttl_seconds > 0 else 0)
+        self._columns = [attr.key for attr in inspect(User).column_attrs]
+
+    def _remember(self, user: User) -> None:
+        self._cache.put(
+            user.user_id,
+            {key: getattr(user, key) for key in self._columns},
+            time.time() + self.ttl_seconds
+        )
+
+    @staticmethod
+    def _detached(values: Dict[str, Any]) -> User:
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    def load(self, db: Session, user_id: int) -> Optional[User]:
+        values: Optional[Dict[str, Any]] = self._cache.get(user_id)
+        if values is None:
+            user = db.query(User).filter(User.user_id == user_id).first()
+            if user is not None:
+                self._remember(user)
+            return user
+        return db.merge(self._detached(values), load=False)
+
+    async def load_async(self, db: AsyncSession, user_id: int) -> Optional[User]:
+        values: Optional[Dict[str, Any]] = self._cache.get(user_id)
+        if values is None:
+            user = await db.get(User, user_id)
+            if user is not None:
+                self._remember(user)
+            return user
+        return await db.merge(self._detached(values), load=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self._cache.pop(user_id)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+# Shared caches, invalidated by routers/users.py
+user_cache = UserCache()
+token_cache = ExpiringLRUCache(settings.AUTH_TOKEN_CACHE_MAX_ENTRIES)
@@ -0,0 +1,106 @@
+import gzip
+from functools import lru_cache
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..config import settings
+from .etags import sent_sizes
+from .metrics import compression_bytes
+
+try:
+    import brotli
+except ImportError:  # Optional; responses fall back to gzip
+    brotli = None
+
+# Preferred first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+# Images and video are already compressed
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+@lru_cache(maxsize=256)
+def accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """Best of ENCODINGS the Accept-Encoding header allows, or None"""
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip()] = weight
+    for encoding in ENCODINGS:
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+def is_compressible(status: int, headers: Headers) -> bool:
+    if status in (204, 206, 304) or "content-encoding" in headers:
+        return False
+    return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+class CompressionMiddleware:
+    """
+    Compress JSON and text bodies of at least COMPRESSION_MIN_SIZE bytes
+    with brotli or gzip, whichever the client accepts (brotli only when the
+    package is installed).
+
+    Only complete bodies sent in one message are compressed; streamed
+    responses such as large media files pass through. The body bytes sent
+    with each ETag are recorded for the 304 bandwidth metrics, also when
+    COMPRESSION_ENABLED is off.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = settings.COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = None
+        if settings.COMPRESSION_ENABLED:
+            encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        held: Optional[Message] = None
+        etag = None
+        sent = 0
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal held, etag, sent
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                etag = headers.get("etag")
+                if encoding is not None and is_compressible(message["status"], headers):
+                    # Held until the body shows whether it is complete and large enough
+                    held = message
+                    return
+            elif message["type"] == "http.response.body":
+                if held is not None:
+                    start, held = held, None
+                    body = message.get("body", b"")
+                    if not message.get("more_body", False) and len(body) >= self.minimum_size:
+                        compressed = compress(body, encoding)
+                        if len(compressed) < len(body):
+                            compression_bytes.inc((encoding, "in"), len(body))
+                            compression_bytes.inc((encoding, "out"), len(compressed))
+                            headers = MutableHeaders(raw=start["headers"])
+                            headers["Content-Encoding"] = encoding
+                            headers["Content-Length"] = str(len(compressed))
+                            headers.add_vary_header("Accept-Encoding")
+                            message = {**message, "body": compressed}
+                    await send(start)
+                sent += len(message.get("body", b""))
+                if etag is not None and not message.get("more_body", False):
+                    sent_sizes.record(etag, sent)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
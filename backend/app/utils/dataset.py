@@ -0,0 +1,331 @@
+import csv
+import io
+import itertools
+import random
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models import Comment, Follow, Hashtag, Like, Message, Post, PostHashtag, Story, User
+from .auth import get_password_hash
+from .story_expiry import ensure_story_partitions
+
+# Every generated user logs in with this password
+DATASET_PASSWORD = "pulse-dataset"
+
+WORDS = (
+    "sunny morning coffee city walk weekend trip beach mountain music night friends food "
+    "project launch team code book movie game photo art design fitness run street sunset"
+).split()
+
+@dataclass
+class DatasetConfig:
+    """Sizes and skew of a generated dataset; averages are per user, post or thread"""
+    users: int = 1000
+    follows_per_user: float = 30
+    posts_per_user: float = 10
+    likes_per_post: float = 8
+    comments_per_post: float = 2
+    threads_per_user: float = 2
+    messages_per_thread: float = 6
+    hashtags: int = 2000
+    hashtags_per_post: float = 1.5
+    story_users: float = 0.2  # Fraction of users with stories
+    expired_story_ratio: float = 0.5
+    days: int = 90  # Posts, follows and messages spread over this many days
+    follower_skew: float = 1.0  # Zipf exponent of user popularity
+    hashtag_skew: float = 1.1  # Zipf exponent of hashtag usage
+    seed: int = 42
+    batch_size: int = 5000
+
+class ZipfSampler:
+    """
+    Draw indexes 0..n-1 with probability proportional to 1 / (rank ** s).
+
+    Ranks are assigned to indexes through a seeded permutation, so the most
+    popular user is not simply user 1.
+    """
+
+    def __init__(self, n: int, s: float, rng: random.Random, shuffle: bool = True):
+        order = list(range(n))
+        if shuffle:
+            rng.shuffle(order)
+        self.weights = [0.0] * n
+        for rank, index in enumerate(order, start=1):
+            self.weights[index] = 1 / rank ** s
+        self.cumulative = list(itertools.accumulate(self.weights))
+        self.total = self.cumulative[-1] if n else 0.0
+        self.mean = self.total / n if n else 0.0
+        self.rng = rng
+
+    def draw(self) -> int:
+        return min(bisect_left(self.cumulative, self.rng.random() * self.total), len(self.cumulative) - 1)
+
+    def distinct(self, k: int, exclude: int = -1) -> List[int]:
+        """Up to k distinct indexes; gives up after a few collisions in a row"""
+        picked = set()
+        misses = 0
+        while len(picked) < k and misses < 20:
+            index = self.draw()
+            if index == exclude or index in picked:
+                misses += 1
+                continue
+            picked.add(index)
+            misses = 0
+        return list(picked)
+
+def poisson_count(rng: random.Random, mean: float) -> int:
+    """Integer with the given mean: floor plus a Bernoulli remainder"""
+    whole = int(mean)
+    return whole + (1 if rng.random() < mean - whole else 0)
+
+def geometric_count(rng: random.Random, mean: float) -> int:
+    """Heavy-ish tailed count >= 1 with the given mean"""
+    if mean <= 1:
+        return 1
+    count = 1
+    while rng.random() < 1 - 1 / mean:
+        count += 1
+    return count
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+class BulkWriter:
+    """
+    Buffer rows per table and write them in batches.
+
+    PostgreSQL with psycopg2 uses COPY; other databases use executemany
+    through SQLAlchemy's insertmanyvalues. Each batch is committed.
+    """
+
+    def __init__(self, conn: Connection, batch_size: int):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.use_copy = conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+        self.buffers: Dict[Any, List[dict]] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, model, row: dict) -> None:
+        buffer = self.buffers.setdefault(model.__table__, [])
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(model.__table__)
+
+    def flush(self, table=None) -> None:
+        for current in ([table] if table is not None else list(self.buffers)):
+            rows = self.buffers.get(current)
+            if not rows:
+                continue
+            if self.use_copy:
+                self._copy(current, rows)
+            else:
+                self.conn.execute(current.insert(), rows)
+            self.conn.commit()
+            self.counts[current.name] = self.counts.get(current.name, 0) + len(rows)
+            self.buffers[current] = []
+
+    def _copy(self, table, rows: List[dict]) -> None:
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["" if row[column] is None else row[column] for column in columns])
+        buffer.seek(0)
+        cursor = self.conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        finally:
+            cursor.close()
+
+def _next_id(conn: Connection, column) -> int:
+    return (conn.execute(select(func.max(column))).scalar() or 0) + 1
+
+def _reset_sequences(conn: Connection) -> None:
+    # Explicit ids bypass PostgreSQL sequences; move them past the new rows
+    if conn.dialect.name != "postgresql":
+        return
+    for model, column in ((User, "user_id"), (Post, "post_id"), (Comment, "comment_id"), (Like, "like_id"),
+                          (Follow, "follow_id"), (Message, "message_id"), (Hashtag, "tag_id"),
+                          (PostHashtag, "post_hashtag_id"), (Story, "story_id")):
+        table = model.__tablename__
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+            f"COALESCE((SELECT MAX({column}) FROM {table}), 1))"
+        ))
+    conn.commit()
+
+def generate_dataset(
+    engine: Engine,
+    config: DatasetConfig,
+    progress: Optional[Callable[[str, Dict[str, int]], None]] = None
+) -> Dict[str, int]:
+    """
+    Insert a synthetic social graph and return the row count per table.
+
+    Popularity follows a Zipf distribution: a few users get most followers,
+    and their posts most likes and comments. Hashtag usage is Zipfian too.
+    Rows are generated as a stream with explicit ids, so memory stays
+    proportional to the number of users. The same config and seed always
+    produce the same graph, with timestamps relative to the time of the
+    run; rows are added after any existing data.
+    """
+    rng = random.Random(config.seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=config.days)
+    span = (now - start).total_seconds()
+
+    def moment(after: datetime = start) -> datetime:
+        return after + timedelta(seconds=rng.random() * (now - after).total_seconds())
+
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        if settings.story_partitioning_enabled:
+            with Session(bind=conn) as db:
+                ensure_story_partitions(db, now - timedelta(days=1))
+            conn.commit()
+
+        writer = BulkWriter(conn, config.batch_size)
+        first_user = _next_id(conn, User.user_id)
+        ids = {
+            "post": _next_id(conn, Post.post_id),
+            "comment": _next_id(conn, Comment.comment_id),
+            "like": _next_id(conn, Like.like_id),
+            "follow": _next_id(conn, Follow.follow_id),
+            "message": _next_id(conn, Message.message_id),
+            "tag": _next_id(conn, Hashtag.tag_id),
+            "post_hashtag": _next_id(conn, PostHashtag.post_hashtag_id),
+            "story": _next_id(conn, Story.story_id),
+        }
+
+        def next_id(kind: str) -> int:
+            value = ids[kind]
+            ids[kind] += 1
+            return value
+
+        def report(stage: str) -> None:
+            if progress is not None:
+                progress(stage, dict(writer.counts))
+
+        popularity = ZipfSampler(config.users, config.follower_skew, rng)
+        activity = ZipfSampler(config.users, config.follower_skew * 0.8, rng)
+        tags = ZipfSampler(config.hashtags, config.hashtag_skew, rng, shuffle=False)
+        joined = [start + timedelta(seconds=rng.random() * span * 0.5) for _ in range(config.users)]
+
+        # Users
+        password_hash = get_password_hash(DATASET_PASSWORD)
+        for index in range(config.users):
+            user_id = first_user + index
+            writer.add(User, {
+                "user_id": user_id,
+                "username": f"user{user_id}",
+                "email": f"user{user_id}@example.com",
+                "hashed_password": password_hash,
+                "profile_info": sentence(rng, rng.randint(3, 10)),
+                "created_at": joined[index],
+            })
+        writer.flush()
+        report("users")
+
+        # Hashtags, most used first
+        first_tag = ids["tag"]
+        for index in range(config.hashtags):
+            writer.add(Hashtag, {"tag_id": next_id("tag"), "tag_name": f"{rng.choice(WORDS)}{first_tag + index}"})
+        writer.flush()
+        report("hashtags")
+
+        # Follows: out-degree by activity, targets by popularity
+        for index in range(config.users):
+            count = poisson_count(rng, config.follows_per_user * activity.weights[index] / activity.mean)
+            for followee in popularity.distinct(min(count, config.users - 1), exclude=index):
+                writer.add(Follow, {
+                    "follow_id": next_id("follow"),
+                    "follower_id": first_user + index,
+                    "followee_id": first_user + followee,
+                    "created_at": moment(max(joined[index], joined[followee])),
+                })
+        writer.flush()
+        report("follows")
+
+        # Posts with hashtags, likes and comments skewed towards popular authors
+        total_posts = int(config.users * config.posts_per_user)
+        for _ in range(total_posts):
+            author = activity.draw()
+            post_id = next_id("post")
+            created_at = moment(joined[author])
+            writer.add(Post, {
+                "post_id": post_id,
+                "user_id": first_user + author,
+                "text": sentence(rng, rng.randint(4, 20)),
+                "created_at": created_at,
+            })
+            for tag in {tags.draw() for _ in range(poisson_count(rng, config.hashtags_per_post))}:
+                writer.add(PostHashtag, {
+                    "post_hashtag_id": next_id("post_hashtag"), "post_id": post_id, "tag_id": first_tag + tag
+                })
+
+            reach = popularity.weights[author] / popularity.mean
+            likes = min(poisson_count(rng, config.likes_per_post * reach), config.users)
+            for liker in activity.distinct(likes):
+                writer.add(Like, {
+                    "like_id": next_id("like"), "post_id": post_id,
+                    "user_id": first_user + liker, "created_at": moment(created_at),
+                })
+            for _ in range(poisson_count(rng, config.comments_per_post * reach)):
+                writer.add(Comment, {
+                    "comment_id": next_id("comment"), "post_id": post_id,
+                    "user_id": first_user + activity.draw(), "text": sentence(rng, rng.randint(2, 12)),
+                    "created_at": moment(created_at),
+                })
+        writer.flush()
+        report("posts")
+
+        # Message threads between active users and people they are likely to follow
+        for _ in range(int(config.users * config.threads_per_user)):
+            sender = activity.draw()
+            partner = popularity.draw()
+            if partner == sender:
+                continue
+            sent_at = moment(max(joined[sender], joined[partner]))
+            for position in range(geometric_count(rng, config.messages_per_thread)):
+                sent_at = min(now, sent_at + timedelta(seconds=rng.expovariate(1 / 600)))
+                from_sender = position % 2 == 0 or rng.random() < 0.3
+                writer.add(Message, {
+                    "message_id": next_id("message"),
+                    "sender_id": first_user + (sender if from_sender else partner),
+                    "receiver_id": first_user + (partner if from_sender else sender),
+                    "content": sentence(rng, rng.randint(1, 15)),
+                    "created_at": sent_at,
+                    "is_read": 1 if now - sent_at > timedelta(hours=1) else 0,
+                })
+        writer.flush()
+        report("messages")
+
+        # Stories: active ones expire within 24 hours, expired ones expired today
+        for index in range(config.users):
+            if rng.random() >= config.story_users:
+                continue
+            for _ in range(geometric_count(rng, 2)):
+                if rng.random() < config.expired_story_ratio:
+                    expiration = now - timedelta(seconds=rng.random() * 12 * 3600)
+                else:
+                    expiration = now + timedelta(seconds=rng.random() * 24 * 3600)
+                writer.add(Story, {
+                    "story_id": next_id("story"),
+                    "user_id": first_user + index,
+                    "media": f"/uploads/dataset_story_{rng.randint(1, 50)}.jpg",
+                    "expiration_time": expiration,
+                    "created_at": expiration - timedelta(hours=24),
+                })
+        writer.flush()
+        report("stories")
+
+        _reset_sequences(conn)
+        return dict(writer.counts)
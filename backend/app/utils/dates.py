@@ -0,0 +1,11 @@
+from datetime import datetime, timezone
+
+def utcnow() -> datetime:
+    """Naive UTC now, matching how the routers write timestamps"""
+    return datetime.utcnow()
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Normalize timezone-aware datetimes (PostgreSQL) to naive UTC"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the checkout wait histogram
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+
+class PoolMonitor:
+    """
+    Collects connection pool metrics and passes events to subscribers.
+
+    Events are dicts with an `event` key: "wait" (every checkout, with
+    `seconds`), "overflow" (a connection opened beyond pool_size) and
+    "timeout" (no connection within pool_timeout).
+    """
+
+    def __init__(self, slow_wait_seconds: float = settings.DB_POOL_WAIT_WARN_MS / 1000):
+        self.slow_wait_seconds = slow_wait_seconds
+        self._pools: Dict[str, QueuePool] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._subscribers: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, name: str, pool: QueuePool) -> None:
+        if not isinstance(pool, QueuePool):
+            return
+        if isinstance(pool, _InstrumentedPoolMixin):
+            pool.monitor_name = name
+        with self._lock:
+            self._pools[name] = pool
+            self._stats.setdefault(name, {
+                "checkouts": 0,
+                "wait_seconds_total": 0.0,
+                "wait_seconds_max": 0.0,
+                "wait_buckets": [0] * len(WAIT_BUCKETS),
+                "overflow_events": 0,
+                "timeouts": 0,
+            })
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """Call `callback(event)` for every pool event, e.g. to export metrics"""
+        self._subscribers.append(callback)
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Pool event subscriber failed")
+
+    def record_wait(self, name: str, seconds: float, overflow: bool) -> None:
+        with self._lock:
+            stats = self._stats[name]
+            stats["checkouts"] += 1
+            stats["wait_seconds_total"] += seconds
+            stats["wait_seconds_max"] = max(stats["wait_seconds_max"], seconds)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    stats["wait_buckets"][i] += 1
+                    break
+            if overflow:
+                stats["overflow_events"] += 1
+        if seconds >= self.slow_wait_seconds:
+            logger.warning("Slow database connection checkout", extra={
+                "pool": name, "wait_ms": round(seconds * 1000, 1)
+            })
+        self._emit({"event": "wait", "pool": name, "seconds": seconds})
+        if overflow:
+            self._emit({"event": "overflow", "pool": name})
+
+    def record_timeout(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._stats[name]["timeouts"] += 1
+        logger.error("Database connection pool exhausted", extra={
+            "pool": name, "wait_ms": round(seconds * 1000, 1)
+        })
+        self._emit({"event": "timeout", "pool": name, "seconds": seconds})
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot per pool, including the current in-use and overflow counts"""
+        with self._lock:
+            snapshot = {}
+            for name, pool in self._pools.items():
+                stats = dict(self._stats[name], wait_buckets=list(self._stats[name]["wait_buckets"]))
+                stats.update({
+                    "size": pool.size(),
+                    "in_use": pool.checkedout(),
+                    "idle": pool.checkedin(),
+                    "overflow": max(0, pool.overflow()),
+                })
+                snapshot[name] = stats
+            return snapshot
+
+# Shared monitor for the engines in database.py
+pool_monitor = PoolMonitor()
+
+class _InstrumentedPoolMixin:
+    """Times every checkout; `monitor_name` is set by PoolMonitor.register"""
+
+    monitor_name = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        overflow_before = self.overflow()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_monitor.record_timeout(self.monitor_name, time.perf_counter() - start)
+            raise
+        # overflow() grows when a connection beyond pool_size is opened
+        opened_overflow = self.overflow() > max(0, overflow_before)
+        pool_monitor.record_wait(self.monitor_name, time.perf_counter() - start, opened_overflow)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool_monitor.register(self.monitor_name, pool)
+        return pool
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    monitor_name = "async"
+
+def engine_options(url: str, is_async: bool = False) -> Dict[str, Any]:
+    """
+    create_engine keyword arguments from the DB_* settings.
+
+    In-memory SQLite keeps a single shared connection, so pool sizing does
+    not apply to it.
+    """
+    parsed = make_url(url)
+    options: Dict[str, Any] = {
+        "echo": settings.DB_ECHO,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        options["poolclass"] = StaticPool
+        options["connect_args"] = {"check_same_thread": False}
+        return options
+
+    options.update({
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    })
+
+    # PostgreSQL cancels statements running longer than this on the server
+    if settings.DB_STATEMENT_TIMEOUT_MS and parsed.get_backend_name() == "postgresql":
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
@@ -0,0 +1,82 @@
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Type
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from ..config import settings
+
+class ReadYourWritesTracker:
+    """
+    Remembers which users wrote recently, so their reads go to the primary
+    until replicas have caught up.
+
+    Kept per process; run behind sticky sessions, or with a window longer
+    than the worst replica lag, when several workers serve the same user.
+    """
+
+    def __init__(self, window_seconds: float = settings.READ_YOUR_WRITES_SECONDS):
+        self.window_seconds = window_seconds
+        self._until: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._next_prune = 0.0
+
+    def mark(self, user_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._until[user_id] = now + self.window_seconds
+            # Only users who wrote within the window are kept
+            if now >= self._next_prune:
+                self._until = {u: t for u, t in self._until.items() if t > now}
+                self._next_prune = now + self.window_seconds
+
+    def recent(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        return self._until.get(user_id, 0.0) > time.monotonic()
+
+# Shared tracker, fed by RoutingSession commits
+recent_writes = ReadYourWritesTracker()
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to a replica and everything else to the primary.
+
+    A session only reads from replicas when `info["read_only"]` is set (by
+    get_db for GET/HEAD requests), nothing has been flushed in it yet, and
+    the user in `info["user_id"]` has not written in the last
+    READ_YOUR_WRITES_SECONDS. Sessions opened outside requests, such as
+    background workers, always use the primary.
+    """
+
+    primary: Engine
+    replicas: List[Engine] = []
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not self.replicas or self._flushing or not self.use_replica():
+            return self.primary
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return self.primary
+        return random.choice(self.replicas)
+
+    def use_replica(self) -> bool:
+        info = self.info
+        if not info.get("read_only") or info.get("wrote"):
+            return False
+        return not recent_writes.recent(info.get("user_id"))
+
+@event.listens_for(RoutingSession, "after_flush")
+def _remember_write(session: Session, flush_context) -> None:
+    # Later reads in this session must see what it just wrote
+    session.info["wrote"] = True
+
+@event.listens_for(RoutingSession, "after_commit")
+def _mark_recent_write(session: Session) -> None:
+    if session.info.get("wrote") and session.info.get("user_id") is not None:
+        recent_writes.mark(session.info["user_id"])
+
+def routing_session_class(name: str, primary: Engine, replicas: List[Engine]) -> Type[RoutingSession]:
+    """RoutingSession bound to a primary and replica engines (sync engines of async ones too)"""
+    return type(name, (RoutingSession,), {"primary": primary, "replicas": list(replicas)})
@@ -1,10 +1,15 @@
+import logging
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..models.user import User
 from .auth import verify_token
+from .auth_cache import user_cache
+
+logger = logging.getLogger(__name__)
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -33,35 +38,60 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    print(f"")
-    print(f"=" * 60)
-    print(f"🔒 GET_CURRENT_USER CALLED")
-    print(f"=" * 60)
-    print(f"🔒 Token received (first 80 chars): {token[:80] if token else 'NO TOKEN'}...")
-    print(f"🔒 Token length: {len(token) if token else 0}")
-
     # Verify token
     payload = verify_token(token)
     if payload is None:
-        print("❌ Token verification failed in get_current_user")
+        logger.debug("Authentication failed: invalid token")
         raise credentials_exception
 
     # Get user_id from token
     user_id: str = payload.get("sub")
     if user_id is None:
-        print("❌ No 'sub' claim in token payload")
+        logger.debug("Authentication failed: no 'sub' claim in token")
         raise credentials_exception
 
-    # Get user from database
-    user = db.query(User).filter(User.user_id == int(user_id)).first()
+    # Reads stay on the primary for a while after this user writes
+    db.info["user_id"] = int(user_id)
+
+    # Get user from the cache or database
+    user = user_cache.load(db, int(user_id))
     if user is None:
-        print(f"❌ User with ID {user_id} not found in database")
+        logger.debug("Authentication failed: user not found", extra={"user_id": user_id})
         raise credentials_exception
 
-    print(f"✅ User authenticated: {user.username} (ID: {user.user_id})")
+    logger.debug("User authenticated", extra={"user_id": user.user_id})
     return user
 
 
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """
+    Async variant of get_current_user for `async def` endpoints.
+
+    Runs on the event loop instead of taking a threadpool slot.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    payload = verify_token(token)
+    if payload is None or payload.get("sub") is None:
+        logger.debug("Authentication failed: invalid token")
+        raise credentials_exception
+
+    db.info["user_id"] = int(payload["sub"])
+    user = await user_cache.load_async(db, int(payload["sub"]))
+    if user is None:
+        logger.debug("Authentication failed: user not found", extra={"user_id": payload["sub"]})
+        raise credentials_exception
+
+    logger.debug("User authenticated", extra={"user_id": user.user_id})
+    return user
+
 def get_current_user_optional(
     token: Optional[str] = Depends(oauth2_scheme_optional),
     db: Session = Depends(get_db)
@@ -90,6 +120,8 @@ def get_current_user_optional(
     if user_id is None:
         return None
 
-    # Get user from database
-    user = db.query(User).filter(User.user_id == int(user_id)).first()
-    return user
\ No newline at end of file
+    # Reads stay on the primary for a while after this user writes
+    db.info["user_id"] = int(user_id)
+
+    # Get user from the cache or database
+    return user_cache.load(db, int(user_id))
\ No newline at end of file
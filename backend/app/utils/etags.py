@@ -0,0 +1,69 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+from fastapi import Request, Response
+from ..config import settings
+from .media_serving import etag_matches
+from .metrics import not_modified_bytes, not_modified_responses, route_label
+
+# Responses depend on the viewer (is_following, is_liked), so only the
+# client may keep them, and it revalidates before each use
+API_CACHE_CONTROL = "private, no-cache"
+
+def weak_etag(version: tuple) -> str:
+    """
+    Weak ETag of a response built from `version`.
+
+    `version` holds every value the response is built from, such as row
+    `updated_at`s, counts and the viewer's flags, so equal versions mean
+    equal responses and the tag is known before the response is built.
+    """
+    digest = hashlib.blake2b(repr(version).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+class SentSizes:
+    """
+    LRU map of ETag to the body bytes last sent with it, so a 304 can
+    count the bytes it saved. Filled by CompressionMiddleware.
+    """
+
+    def __init__(self, max_entries: int = settings.ETAG_SIZE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, etag: str, size: int) -> None:
+        with self._lock:
+            self._sizes[etag] = size
+            self._sizes.move_to_end(etag)
+            while len(self._sizes) > self.max_entries:
+                self._sizes.popitem(last=False)
+
+    def get(self, etag: str) -> int:
+        with self._lock:
+            return self._sizes.get(etag, 0)
+
+# Shared sizes, recorded by utils/compression.py
+sent_sizes = SentSizes()
+
+def conditional_get(request: Request, response: Response, version: Callable[[], tuple]) -> Optional[Response]:
+    """
+    304 Not Modified if the request's If-None-Match holds the ETag of
+    `version()`, else None after setting ETag and Cache-Control on
+    `response`, the endpoint's `response: Response` parameter.
+
+    Called before the response is built, so a 304 skips the queries and
+    the serialization of the body.
+    """
+    if not settings.ETAGS_ENABLED:
+        return None
+    etag = weak_etag(version())
+    headers = {"ETag": etag, "Cache-Control": API_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag.removeprefix("W/")):
+        route = route_label(request.scope)
+        not_modified_responses.inc((route,))
+        not_modified_bytes.inc((route,), sent_sizes.get(etag))
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,222 @@
+import asyncio
+import base64
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from ..config import settings
+from .media_serving import media_cache
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
+VARIANT_DIR = os.path.join(UPLOAD_DIR, "variants")
+UPLOAD_URL_PREFIX = "/uploads/"
+VARIANT_URL_PREFIX = "/uploads/variants/"
+
+# Longest side in pixels for each variant; images are never upscaled
+VARIANT_SIZES = {
+    "thumb": 160,
+    "medium": 640,
+    "full": 1440,
+}
+VARIANT_FORMATS = ("webp", "jpg")
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+# Longest side of the inline placeholder; ~200-400 bytes as a base64 WebP data URI
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 40
+
+def variant_name(filename: str, size: str, fmt: str) -> str:
+    """
+    Name of a variant file relative to VARIANT_DIR, e.g.
+    `2_20251218_0b6813a1_thumb.webp` or `ab/cd/abcd...ef_thumb.webp`.
+    """
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}_{size}.{fmt}"
+
+def media_variants(url: Optional[str], ready: bool) -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    URLs of the sized variants of an uploaded image.
+
+    `ready` is the `variants_ready` flag of the upload's MediaFile, copied
+    onto the post, story or profile that uses it. Variants are generated in
+    the background after upload, so this returns None until they exist,
+    when IMAGE_VARIANTS_ENABLED is off, and for media that did not come
+    from /upload/image.
+
+    Returns:
+        {"thumb": {"webp": url, "jpg": url}, "medium": {...}, "full": {...}}
+    """
+    if not ready or not settings.IMAGE_VARIANTS_ENABLED:
+        return None
+    if not url or not url.startswith(UPLOAD_URL_PREFIX) or url.startswith(VARIANT_URL_PREFIX):
+        return None
+    filename = url[len(UPLOAD_URL_PREFIX):]
+    return {
+        size: {fmt: VARIANT_URL_PREFIX + variant_name(filename, size, fmt) for fmt in VARIANT_FORMATS}
+        for size in VARIANT_SIZES
+    }
+
+def variant_url(url: Optional[str], ready: bool, size: str, fmt: str = "webp") -> Optional[str]:
+    """URL of one variant of an uploaded image, or None"""
+    variants = media_variants(url, ready)
+    return variants[size][fmt] if variants else None
+
+def upload_name(path: str) -> str:
+    """Path of a file relative to UPLOAD_DIR, or its basename if outside it"""
+    relative = os.path.relpath(path, UPLOAD_DIR)
+    if relative.startswith(os.pardir):
+        return os.path.basename(path)
+    return relative.replace(os.sep, "/")
+
+def generate_variants(path: str, output_dir: str = VARIANT_DIR) -> List[str]:
+    """
+    Write every size and format variant of an image.
+
+    Variants mirror the file's location under UPLOAD_DIR, so sharded
+    uploads get sharded variants.
+
+    Runs inside a worker process; Pillow is imported here so the web
+    process does not pay for it unless variants are generated in-process.
+
+    Returns:
+        Paths of the written variant files
+    """
+    from PIL import Image, ImageOps
+
+    filename = upload_name(path)
+    os.makedirs(os.path.dirname(os.path.join(output_dir, filename)), exist_ok=True)
+    written = []
+
+    with Image.open(path) as source:
+        # First frame only for animated GIF/WebP; honour camera orientation
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+        for size, max_side in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((max_side, max_side), Image.LANCZOS)
+            for fmt in VARIANT_FORMATS:
+                out_path = os.path.join(output_dir, *variant_name(filename, size, fmt).split("/"))
+                tmp_path = f"{out_path}.part"
+                if fmt == "webp":
+                    resized.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+                else:
+                    # JPEG has no alpha channel; flatten onto white
+                    if resized.mode == "RGBA":
+                        flat = Image.new("RGB", resized.size, (255, 255, 255))
+                        flat.paste(resized, mask=resized.getchannel("A"))
+                    else:
+                        flat = resized
+                    flat.save(tmp_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                os.replace(tmp_path, out_path)
+                written.append(out_path)
+    return written
+
+def image_preview(path: str) -> Dict[str, Any]:
+    """
+    Compute the displayed dimensions and a tiny inline placeholder of an image.
+
+    Runs inside a worker process. JPEGs are decoded at reduced scale
+    (`draft`), so this is much cheaper than generating variants.
+
+    Returns:
+        {"width": int, "height": int, "placeholder": "data:image/webp;base64,..."}
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as source:
+        width, height = source.size
+        # EXIF orientations 5-8 rotate by 90 degrees
+        if source.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            width, height = height, width
+        source.draft("RGB", (PLACEHOLDER_SIZE * 8, PLACEHOLDER_SIZE * 8))
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BILINEAR)
+
+        buffer = io.BytesIO()
+        image.save(buffer, "WEBP", quality=PLACEHOLDER_QUALITY)
+    encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return {"width": width, "height": height, "placeholder": f"data:image/webp;base64,{encoded}"}
+
+def remove_variants(filename: str) -> None:
+    """Delete the variants of an upload, given its name relative to UPLOAD_DIR"""
+    for size in VARIANT_SIZES:
+        for fmt in VARIANT_FORMATS:
+            name = variant_name(filename, size, fmt)
+            media_cache.evict("variants/" + name)
+            try:
+                os.remove(os.path.join(VARIANT_DIR, *name.split("/")))
+            except FileNotFoundError:
+                pass
+
+class ImagePipeline:
+    """
+    Process pool that generates image variants and placeholders after upload.
+
+    Resizing and encoding are CPU-bound, so they run in separate processes
+    instead of the threadpool, where they would hold the GIL.
+    """
+
+    def __init__(self, workers: int = settings.IMAGE_WORKERS):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def submit(self, path: str, on_done: Optional[Callable[[], None]] = None) -> "asyncio.Future[List[str]]":
+        """
+        Queue variant generation for an uploaded file.
+
+        `on_done` runs in the default thread pool once every variant is
+        written, to record that on the upload's row. Errors are logged;
+        callers may await the returned future or ignore it.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), generate_variants, path)
+        future.add_done_callback(lambda f: self._finished(path, f, on_done))
+        return future
+
+    async def preview(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        Compute dimensions and placeholder of an uploaded file in the pool.
+
+        Returns None if the file cannot be decoded as an image.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_executor(), image_preview, path)
+        except Exception as exc:
+            logger.error("Computing placeholder for %s failed: %s", path, exc)
+            return None
+
+    @staticmethod
+    def _finished(path: str, future: "asyncio.Future", on_done: Optional[Callable[[], None]]) -> None:
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.error("Generating variants for %s failed: %s", path, future.exception())
+        elif on_done is not None:
+            recorded = asyncio.get_running_loop().run_in_executor(None, on_done)
+            recorded.add_done_callback(lambda f: ImagePipeline._log_failure(path, f))
+
+    @staticmethod
+    def _log_failure(path: str, future: "asyncio.Future") -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Recording variants of %s failed: %s", path, future.exception())
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+# Shared pipeline, shut down by the app lifespan in main.py
+image_pipeline = ImagePipeline()
@@ -0,0 +1,209 @@
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import IO, List, Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..config import settings
+
+logger = logging.getLogger("app.request")
+
+# Records of this logger also go to SLOW_QUERY_LOG_FILE (utils/slow_queries.py)
+SLOW_QUERY_LOGGER = "app.slow_queries"
+
+# Set per request by RequestContextMiddleware; copied into threadpool workers
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+log_sampled_var: ContextVar[bool] = ContextVar("log_sampled", default=True)
+request_scope_var: ContextVar[Optional[Scope]] = ContextVar("request_scope", default=None)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+REQUEST_ID_HEADER = "x-request-id"
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[logging.Handler] = None
+_file_handler: Optional[logging.Handler] = None
+_sample_rate: float = settings.LOG_SAMPLE_RATE
+
+class RequestContextFilter(logging.Filter):
+    """
+    Tag records with the current request id and apply request sampling.
+
+    Records below WARNING are kept only for sampled requests, so a sampled
+    request keeps all of its log lines instead of a random subset.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return record.levelno >= logging.WARNING or log_sampled_var.get()
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including fields passed with `extra=`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps records structured.
+
+    The stock handler formats the whole line in the calling thread; this
+    one only resolves the message and traceback, which may reference
+    objects that change later, and leaves formatting to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def setup_logging(
+    level: str = settings.LOG_LEVEL,
+    fmt: str = settings.LOG_FORMAT,
+    sample_rate: float = settings.LOG_SAMPLE_RATE,
+    stream: Optional[IO[str]] = None,
+    queued: bool = True,
+    slow_query_file: str = settings.SLOW_QUERY_LOG_FILE
+) -> None:
+    """
+    Configure the root logger.
+
+    Records are put on an in-memory queue by the thread that logs them and
+    written by a single listener thread, so request threads never block on
+    stdout. `queued=False` writes directly, for comparison in benchmarks.
+    Slow query records are also written to a rotating JSON file when
+    `slow_query_file` is set.
+    """
+    global _listener, _handler, _file_handler, _sample_rate
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JSONFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    outputs: List[logging.Handler] = [output]
+
+    if slow_query_file:
+        os.makedirs(os.path.dirname(os.path.abspath(slow_query_file)), exist_ok=True)
+        slow_queries = RotatingFileHandler(
+            slow_query_file,
+            maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUPS
+        )
+        slow_queries.setFormatter(JSONFormatter())
+        slow_queries.addFilter(logging.Filter(SLOW_QUERY_LOGGER))
+        outputs.append(slow_queries)
+
+    root = logging.getLogger()
+    if queued:
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        _handler = StructuredQueueHandler(log_queue)
+        _listener = QueueListener(log_queue, *outputs, respect_handler_level=True)
+        _listener.start()
+    else:
+        _handler = output
+        if len(outputs) > 1:
+            _file_handler = outputs[1]
+            _file_handler.addFilter(RequestContextFilter())
+            root.addHandler(_file_handler)
+    _handler.addFilter(RequestContextFilter())
+    _sample_rate = sample_rate
+
+    root.setLevel(level.upper())
+    root.addHandler(_handler)
+
+def shutdown_logging() -> None:
+    """Flush queued records and remove the handler installed by setup_logging"""
+    global _listener, _handler, _file_handler
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    for handler in (_handler, _file_handler):
+        if handler is not None:
+            logging.getLogger().removeHandler(handler)
+            handler.close()
+    _handler = _file_handler = None
+
+class RequestContextMiddleware:
+    """
+    Assign every request a correlation id and a log sampling decision.
+
+    The id is taken from the X-Request-ID header when it is well-formed,
+    otherwise generated, and echoed in the response. The request's scope is
+    kept in `request_scope_var` for code that reports the route it serves.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        id_token = request_id_var.set(request_id)
+        scope_token = request_scope_var.set(scope)
+        sampled_token = log_sampled_var.set(_sample_rate >= 1 or random.random() < _sample_rate)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [
+                    *message.get("headers", []), (REQUEST_ID_HEADER.encode(), request_id.encode())
+                ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Request finished", extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 2)
+                })
+            log_sampled_var.reset(sampled_token)
+            request_scope_var.reset(scope_token)
+            request_id_var.reset(id_token)
@@ -0,0 +1,195 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+from ..config import settings
+
+# ab/cd/<sha256><ext> and variants/ab/cd/<sha256>_<size>.<fmt>
+CONTENT_NAME_PATTERN = re.compile(r"^(?:variants/)?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:_[a-z]+)?\.[a-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def content_etag(name: str) -> Optional[str]:
+    """
+    Strong ETag for a content-addressed file, taken from its name.
+
+    The name contains the content hash, so the ETag is known without
+    touching the file. Returns None for other files.
+    """
+    if CONTENT_NAME_PATTERN.match(name):
+        return f'"{name.rsplit("/", 1)[-1]}"'
+    return None
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+class CachedFile(NamedTuple):
+    content: bytes
+    headers: dict
+    path: str
+    mtime_ns: int
+    checked_at: float  # time.monotonic() of the last stat
+
+class MediaCache:
+    """
+    LRU cache of small media files (avatars, thumbnails) with a byte budget.
+
+    Each process has its own cache and files may be deleted or replaced by
+    another process, so a hit older than revalidate_seconds stats the file
+    again and is dropped if it is gone or its mtime or size changed.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = settings.MEDIA_CACHE_BYTES,
+        max_file_bytes: int = settings.MEDIA_CACHE_MAX_FILE_BYTES,
+        revalidate_seconds: float = settings.MEDIA_CACHE_REVALIDATE_SECONDS
+    ):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[CachedFile]:
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is not None and time.monotonic() - entry.checked_at >= self.revalidate_seconds:
+            entry = self._revalidate(name, entry)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if name in self._entries:
+                self._entries.move_to_end(name)
+            self.hits += 1
+            return entry
+
+    def _revalidate(self, name: str, entry: CachedFile) -> Optional[CachedFile]:
+        try:
+            stat_result = os.stat(entry.path)
+        except FileNotFoundError:
+            stat_result = None
+        if stat_result is None or (stat_result.st_mtime_ns, stat_result.st_size) != (entry.mtime_ns, len(entry.content)):
+            self.evict(name, entry)
+            return None
+        checked = entry._replace(checked_at=time.monotonic())
+        with self._lock:
+            if self._entries.get(name) is entry:
+                self._entries[name] = checked
+        return checked
+
+    def put(self, name: str, content: bytes, headers: dict, path: str, mtime_ns: int) -> None:
+        if len(content) > self.max_file_bytes or len(content) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old is not None:
+                self.size -= len(old.content)
+            self._entries[name] = CachedFile(content, headers, path, mtime_ns, time.monotonic())
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.content)
+
+    def evict(self, name: str, entry: Optional[CachedFile] = None) -> None:
+        """Drop a file from the cache; with `entry`, only if that is still the cached one"""
+        with self._lock:
+            if entry is not None and self._entries.get(name) is not entry:
+                return
+            entry = self._entries.pop(name, None)
+            if entry is not None:
+                self.size -= len(entry.content)
+
+# Shared cache, evicted by utils/media_store.py when files are deleted
+media_cache = MediaCache()
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+class MediaFiles(StaticFiles):
+    """
+    StaticFiles for /uploads with caching headers suited to uploaded media.
+
+    - Content-addressed files get a strong ETag from their hash and
+      `Cache-Control: immutable`; a matching If-None-Match is answered with
+      304 before the file is even looked up.
+    - Small files are served from an in-memory LRU cache.
+    - Range requests are handled by Starlette's FileResponse.
+    - With MEDIA_ACCEL_REDIRECT_PREFIX set, the body is left to the reverse
+      proxy (nginx X-Accel-Redirect), which sends the file with sendfile().
+    """
+
+    def __init__(self, *args, cache: MediaCache = media_cache, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+
+    def cache_headers(self, name: str) -> dict:
+        etag = content_etag(name)
+        if etag:
+            return {"etag": etag, "cache-control": IMMUTABLE_CACHE_CONTROL}
+        return {"cache-control": f"public, max-age={settings.MEDIA_MAX_AGE_SECONDS}"}
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        name = path.replace(os.sep, "/")
+        request_headers = Headers(scope=scope)
+        headers = self.cache_headers(name)
+
+        if scope["method"] in ("GET", "HEAD"):
+            # Content-addressed files never change, so the name alone decides
+            if "etag" in headers and etag_matches(request_headers.get("if-none-match"), headers["etag"]):
+                return Response(status_code=304, headers=headers)
+
+            if "range" not in request_headers:
+                cached = self.cache.get(name)
+                if cached is not None:
+                    content, cached_headers = cached.content, cached.headers
+                    if etag_matches(request_headers.get("if-none-match"), cached_headers.get("etag", "")):
+                        return Response(status_code=304, headers=headers)
+                    return Response(content, headers=cached_headers)
+
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse) or response.status_code != 200:
+            return response
+
+        if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+            accel_headers = {
+                **headers,
+                "content-type": response.headers["content-type"],
+                "x-accel-redirect": f"{settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{name}"
+            }
+            return Response(headers=accel_headers)
+
+        stat_result = response.stat_result
+        size = stat_result.st_size if stat_result else None
+        if "range" not in request_headers and size is not None and size <= self.cache.max_file_bytes:
+            content = await anyio.to_thread.run_sync(_read_file, response.path)
+            cached_headers = {
+                key: value for key, value in response.headers.items()
+                if key in ("content-type", "etag", "last-modified", "cache-control", "accept-ranges")
+            }
+            self.cache.put(name, content, cached_headers, response.path, stat_result.st_mtime_ns)
+            return Response(content, headers=cached_headers)
+        return response
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, headers=self.cache_headers(relative)
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return Response(status_code=304, headers=self.cache_headers(relative))
+        return response
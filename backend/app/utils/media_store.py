@@ -0,0 +1,280 @@
+import os
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..models.media_file import MediaFile
+from ..models.post import Post
+from ..models.story import Story
+from ..models.user import User
+from .images import UPLOAD_DIR, UPLOAD_URL_PREFIX, remove_variants
+from .media_serving import media_cache
+from .dates import to_naive_utc
+
+# Unreferenced files younger than this are kept: they were just uploaded
+# and are about to be attached to a post, story or profile
+ORPHAN_GRACE_PERIOD = timedelta(hours=1)
+
+# /uploads/ab/cd/<sha256><ext>
+CONTENT_URL_PATTERN = re.compile(r"^/uploads/([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})(\.[a-z0-9]+)$")
+
+def content_name(digest: str, extension: str) -> str:
+    """
+    Storage name relative to UPLOAD_DIR.
+
+    Two levels of two-hex-character shards give 65,536 directories, so
+    no directory grows past a few hundred entries even with millions of files.
+    """
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+def content_path(digest: str, extension: str) -> str:
+    return os.path.join(UPLOAD_DIR, *content_name(digest, extension).split("/"))
+
+def content_url(digest: str, extension: str) -> str:
+    return UPLOAD_URL_PREFIX + content_name(digest, extension)
+
+def digest_from_url(url: Optional[str]) -> Optional[str]:
+    """Content digest of a content-addressed media URL, or None for other URLs"""
+    if not url:
+        return None
+    match = CONTENT_URL_PATTERN.match(url)
+    if match and match.group(3).startswith(match.group(1) + match.group(2)):
+        return match.group(3)
+    return None
+
+# ============================================
+# STORAGE
+# ============================================
+
+def store_upload(
+    db: Session,
+    tmp_path: str,
+    digest: str,
+    extension: str,
+    size: int,
+    uploader_id: int
+) -> Tuple[MediaFile, bool]:
+    """
+    Move a fully written temporary upload into content-addressed storage.
+
+    If the same content is already stored, the temporary file is discarded
+    and the existing file is reused. The row is committed before the file is
+    moved into place, so a release that is deleting the previous copy sees
+    the row and keeps the file (see _remove_files).
+
+    Returns:
+        (MediaFile, whether a new file was stored)
+    """
+    media = db.query(MediaFile).filter(MediaFile.digest == digest).with_for_update().first()
+    if media is not None and os.path.exists(content_path(media.digest, media.extension)):
+        os.remove(tmp_path)
+        # Restart the grace period so the sweep doesn't reclaim it before it is attached
+        media.last_uploaded_at = datetime.utcnow()
+        db.commit()
+        return media, False
+
+    if media is None:
+        media = MediaFile(
+            digest=digest,
+            extension=extension,
+            size=size,
+            ref_count=0,
+            uploader_id=uploader_id
+        )
+        db.add(media)
+        try:
+            db.flush()
+        except IntegrityError:
+            # A concurrent upload of the same content inserted the row first;
+            # its file is in place once it commits, so this becomes a dedupe
+            db.rollback()
+            return store_upload(db, tmp_path, digest, extension, size, uploader_id)
+    else:
+        # Row survived but the file is gone; store it again
+        media.last_uploaded_at = datetime.utcnow()
+        media.variants_ready = False
+    db.commit()
+
+    path = content_path(media.digest, media.extension)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+    return media, True
+
+def save_preview(db: Session, digest: str, preview: Dict[str, Any]) -> None:
+    """Store the dimensions and placeholder computed for an upload"""
+    db.query(MediaFile).filter(MediaFile.digest == digest).update(
+        {
+            MediaFile.width: preview["width"],
+            MediaFile.height: preview["height"],
+            MediaFile.placeholder: preview["placeholder"]
+        },
+        synchronize_session=False
+    )
+    db.commit()
+
+def media_preview(db: Session, url: Optional[str]) -> Tuple[Optional[int], Optional[int], Optional[str], bool]:
+    """
+    (width, height, placeholder, variants_ready) of an uploaded file, copied
+    onto the post, story or profile that uses it so responses need no extra
+    query.
+
+    Call after add_refs: its row lock makes a concurrent mark_variants_ready
+    wait for the caller's commit, so the flag cannot be missed.
+
+    Returns Nones and False for URLs that are not content-addressed uploads.
+    """
+    digest = digest_from_url(url)
+    if digest is None:
+        return None, None, None, False
+    row = db.query(MediaFile.width, MediaFile.height, MediaFile.placeholder, MediaFile.variants_ready).filter(
+        MediaFile.digest == digest
+    ).first()
+    return (row.width, row.height, row.placeholder, row.variants_ready) if row else (None, None, None, False)
+
+def mark_variants_ready(db: Session, url: str) -> None:
+    """
+    Record that every variant of an upload is written, on its MediaFile row
+    and on the posts, stories and profiles that already use it, so their
+    responses start advertising the variant URLs.
+
+    Legacy flat uploads have no MediaFile row; only their copies are updated.
+    """
+    digest = digest_from_url(url)
+    if digest is not None:
+        # Updated first: its row lock waits for posts being created with this
+        # file (add_refs holds it), so their copies below are not missed
+        db.query(MediaFile).filter(MediaFile.digest == digest).update(
+            {MediaFile.variants_ready: True}, synchronize_session=False
+        )
+    for column, flag in (
+        (Post.media, Post.media_variants_ready),
+        (Story.media, Story.media_variants_ready),
+        (User.profile_picture, User.profile_picture_variants_ready),
+    ):
+        db.query(column.class_).filter(column == url, flag.is_(False)).update(
+            {flag: True}, synchronize_session=False
+        )
+    db.commit()
+
+# ============================================
+# REFERENCE COUNTING
+# ============================================
+
+def _pending_removals(db: Session) -> List[str]:
+    return db.info.setdefault("media_pending_removal", [])
+
+def _remove_files(db: Session, name: str) -> None:
+    """
+    Delete a released file and its variants, unless the same content was
+    uploaded again after the release committed.
+
+    The file is moved aside before the check: an upload committing after
+    the check moves its copy into place afterwards, and one committing
+    before it is seen and the identical content is put back.
+    """
+    path = os.path.join(UPLOAD_DIR, *name.split("/"))
+    removing = f"{path}.removing"
+    try:
+        os.replace(path, removing)
+    except FileNotFoundError:
+        removing = None
+
+    digest = digest_from_url(UPLOAD_URL_PREFIX + name)
+    if db.query(MediaFile.digest).filter(MediaFile.digest == digest).first() is not None:
+        if removing is not None:
+            os.replace(removing, path)
+        return
+
+    if removing is not None:
+        os.remove(removing)
+    media_cache.evict(name)
+    remove_variants(name)
+
+@event.listens_for(Session, "after_commit")
+def _remove_released_files(session: Session) -> None:
+    """Delete files only once the transaction that released them has committed"""
+    names = session.info.pop("media_pending_removal", [])
+    if not names:
+        return
+    # The committed session cannot run queries here, so re-check on a new one
+    with Session(bind=session.get_bind()) as check:
+        for name in names:
+            _remove_files(check, name)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_released_files(session: Session) -> None:
+    session.info.pop("media_pending_removal", None)
+
+def add_refs(db: Session, urls: Iterable[Optional[str]]) -> None:
+    """
+    Count new references to media URLs (posts, stories, profile pictures).
+
+    URLs that are not content-addressed uploads are ignored. Changes are
+    committed by the caller together with the rows that hold the references.
+    """
+    counts = Counter(d for d in map(digest_from_url, urls) if d)
+    for digest, count in counts.items():
+        db.query(MediaFile).filter(MediaFile.digest == digest).update(
+            {MediaFile.ref_count: MediaFile.ref_count + count}, synchronize_session=False
+        )
+
+def release_refs(db: Session, urls: Iterable[Optional[str]]) -> None:
+    """
+    Drop references to media URLs.
+
+    Files whose count reaches zero are deleted after the caller commits,
+    unless they were uploaded again within ORPHAN_GRACE_PERIOD.
+    """
+    counts = Counter(d for d in map(digest_from_url, urls) if d)
+    if not counts:
+        return
+
+    cutoff = datetime.utcnow() - ORPHAN_GRACE_PERIOD
+    media_files = db.query(MediaFile).filter(
+        MediaFile.digest.in_(list(counts))
+    ).with_for_update().all()
+    for media in media_files:
+        media.ref_count = max(0, media.ref_count - counts[media.digest])
+        uploaded_at = media.last_uploaded_at
+        if media.ref_count == 0 and (uploaded_at is None or to_naive_utc(uploaded_at) < cutoff):
+            db.delete(media)
+            _pending_removals(db).append(content_name(media.digest, media.extension))
+
+def delete_unreferenced(db: Session, digest: str) -> bool:
+    """
+    Delete a stored file if nothing references it.
+
+    Returns:
+        False if the file is still referenced
+    """
+    media = db.query(MediaFile).filter(MediaFile.digest == digest).with_for_update().first()
+    if media is None:
+        return True
+    if media.ref_count > 0:
+        db.rollback()
+        return False
+    db.delete(media)
+    _pending_removals(db).append(content_name(media.digest, media.extension))
+    db.commit()
+    return True
+
+def reclaim_orphans(db: Session, older_than: timedelta = ORPHAN_GRACE_PERIOD) -> int:
+    """
+    Delete uploads that were never attached to anything.
+
+    Returns:
+        Number of files reclaimed
+    """
+    cutoff = datetime.utcnow() - older_than
+    orphans = db.query(MediaFile).filter(
+        MediaFile.ref_count <= 0,
+        MediaFile.last_uploaded_at < cutoff
+    ).with_for_update().all()
+    for media in orphans:
+        db.delete(media)
+        _pending_removals(db).append(content_name(media.digest, media.extension))
+    db.commit()
+    return len(orphans)
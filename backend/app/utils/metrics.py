@@ -0,0 +1,288 @@
+import bisect
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+import anyio.to_thread
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..config import settings
+from .auth import password_hasher
+from .db_pool import WAIT_BUCKETS, pool_monitor
+from .media_serving import media_cache
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (seconds) of the request latency histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+Labels = Tuple[str, ...]
+# (labels, value) pairs under one metric name, with an optional name suffix
+Sample = Tuple[str, Dict[str, str], float]
+
+_stripe_ids = itertools.count()
+_thread_stripe = threading.local()
+
+def _stripe_index(stripes: int) -> int:
+    """Stripe owned by the calling thread, assigned round-robin on first use"""
+    index = getattr(_thread_stripe, "index", None)
+    if index is None:
+        index = _thread_stripe.index = next(_stripe_ids)
+    return index % stripes
+
+class _StripedMetric:
+    """
+    Values split into per-thread stripes, each with its own lock.
+
+    A thread only ever touches its own stripe, so the lock is uncontended on
+    the hot path; stripes are merged when the metrics are scraped.
+    """
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, help_text: str, label_names: Labels = (), stripes: int = settings.METRICS_STRIPES):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._stripes = [({}, threading.Lock()) for _ in range(max(1, stripes))]
+
+    def _stripe(self):
+        return self._stripes[_stripe_index(len(self._stripes))]
+
+    def _labels(self, values: Labels) -> Dict[str, str]:
+        return dict(zip(self.label_names, values))
+
+class Counter(_StripedMetric):
+    metric_type = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        values, lock = self._stripe()
+        with lock:
+            values[labels] = values.get(labels, 0.0) + amount
+
+    def totals(self) -> Dict[Labels, float]:
+        merged: Dict[Labels, float] = {}
+        for values, lock in self._stripes:
+            with lock:
+                for labels, value in values.items():
+                    merged[labels] = merged.get(labels, 0.0) + value
+        return merged
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in sorted(self.totals().items()):
+            yield "", self._labels(labels), value
+
+class Gauge(Counter):
+    """Counter that may go down, e.g. requests in flight"""
+
+    metric_type = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self.inc(labels, -amount)
+
+class Histogram(_StripedMetric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Labels = (), buckets=LATENCY_BUCKETS, **kwargs):
+        super().__init__(name, help_text, label_names, **kwargs)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        values, lock = self._stripe()
+        with lock:
+            # Per-bucket counts, then sum and count
+            entry = values.get(labels)
+            if entry is None:
+                entry = values[labels] = [0.0] * (len(self.buckets) + 2)
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self) -> Iterable[Sample]:
+        merged: Dict[Labels, List[float]] = {}
+        for values, lock in self._stripes:
+            with lock:
+                for labels, entry in values.items():
+                    total = merged.setdefault(labels, [0.0] * len(entry))
+                    for i, value in enumerate(entry):
+                        total[i] += value
+        for labels, entry in sorted(merged.items()):
+            yield from histogram_samples(self._labels(labels), self.buckets, entry[:-2], entry[-2], entry[-1])
+
+def histogram_samples(labels: Dict[str, str], buckets, counts, total: float, count: float) -> Iterable[Sample]:
+    """Cumulative `_bucket` samples plus `_sum` and `_count` from per-bucket counts"""
+    cumulative = 0.0
+    for bound, bucket_count in zip(buckets, counts):
+        cumulative += bucket_count
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        yield "_bucket", {**labels, "le": le}, cumulative
+    yield "_sum", labels, total
+    yield "_count", labels, count
+
+class MetricsRegistry:
+    """
+    Metrics updated by the app plus collectors read at scrape time.
+
+    Collectors return `(name, type, help, samples)` tuples for values that
+    already live elsewhere, such as pool and cache statistics.
+    """
+
+    def __init__(self):
+        self._metrics: List[_StripedMetric] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Iterable[Sample]]]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Iterable[Sample]]]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        families = [(m.name, m.metric_type, m.help_text, m.samples()) for m in self._metrics]
+        for collector in self._collectors:
+            families.extend(collector())
+        lines = []
+        for name, metric_type, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+# Shared registry, served by GET /metrics in main.py
+registry = MetricsRegistry()
+
+http_requests = registry.register(Counter(
+    "pulse_http_requests_total", "HTTP requests by route template and status",
+    ("method", "route", "status")
+))
+http_latency = registry.register(Histogram(
+    "pulse_http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route")
+))
+http_in_flight = registry.register(Gauge(
+    "pulse_http_requests_in_flight", "HTTP requests being served"
+))
+# Business events; rate() gives posts, likes and messages per second
+events = registry.register(Counter(
+    "pulse_events_total", "Created posts, likes, comments, follows and messages",
+    ("event",)
+))
+
+# Bandwidth: bytes before and after compression, and bodies replaced by a 304
+compression_bytes = registry.register(Counter(
+    "pulse_http_compression_bytes_total", "Response body bytes before (in) and after (out) compression",
+    ("encoding", "stage")
+))
+not_modified_responses = registry.register(Counter(
+    "pulse_http_not_modified_total", "304 responses to If-None-Match by route template",
+    ("route",)
+))
+not_modified_bytes = registry.register(Counter(
+    "pulse_http_not_modified_bytes_saved_total", "Body bytes not sent because of 304 responses",
+    ("route",)
+))
+
+def _threadpool_metrics():
+    # Threads serving sync endpoints and dependencies
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    yield ("pulse_threadpool_threads_busy", "gauge", "anyio worker threads in use",
+           [("", {}, limiter.borrowed_tokens)])
+    yield ("pulse_threadpool_threads_limit", "gauge", "anyio worker thread limit",
+           [("", {}, limiter.total_tokens)])
+    yield ("pulse_threadpool_tasks_waiting", "gauge", "Tasks waiting for an anyio worker thread",
+           [("", {}, limiter.statistics().tasks_waiting)])
+
+def _db_pool_metrics():
+    pools = pool_monitor.stats()
+    for key, metric_type, help_text in (
+        ("in_use", "gauge", "Connections checked out"),
+        ("idle", "gauge", "Connections idle in the pool"),
+        ("overflow", "gauge", "Connections open beyond pool_size"),
+        ("overflow_events", "counter", "Connections opened beyond pool_size"),
+        ("timeouts", "counter", "Checkouts that timed out"),
+    ):
+        suffix = "_total" if metric_type == "counter" else ""
+        yield (f"pulse_db_pool_{key}{suffix}", metric_type, help_text,
+               [("", {"pool": name}, stats[key]) for name, stats in pools.items()])
+    yield ("pulse_db_pool_wait_seconds", "histogram", "Connection checkout wait", [
+        sample
+        for name, stats in pools.items()
+        for sample in histogram_samples(
+            {"pool": name}, WAIT_BUCKETS, stats["wait_buckets"], stats["wait_seconds_total"], stats["checkouts"]
+        )
+    ])
+
+def _password_hasher_metrics():
+    stats = password_hasher.stats()
+    yield ("pulse_password_hash_queue_depth", "gauge", "bcrypt calls waiting for a worker",
+           [("", {}, stats["queue_depth"])])
+    yield ("pulse_password_hash_active", "gauge", "bcrypt calls running",
+           [("", {}, stats["active"])])
+    yield ("pulse_password_hash_completed_total", "counter", "bcrypt calls completed",
+           [("", {}, stats["completed"])])
+    yield ("pulse_password_hash_rejected_total", "counter", "bcrypt calls rejected with 503",
+           [("", {}, stats["rejected"])])
+
+def _media_cache_metrics():
+    yield ("pulse_media_cache_hits_total", "counter", "Media served from memory",
+           [("", {}, media_cache.hits)])
+    yield ("pulse_media_cache_misses_total", "counter", "Media read from disk",
+           [("", {}, media_cache.misses)])
+    yield ("pulse_media_cache_bytes", "gauge", "Bytes held by the media cache",
+           [("", {}, media_cache.size)])
+
+for _collector in (_threadpool_metrics, _db_pool_metrics, _password_hasher_metrics, _media_cache_metrics):
+    registry.add_collector(_collector)
+
+def route_label(scope: Scope) -> str:
+    """Route template such as /posts/{post_id}, so paths with ids share a series"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mounts (e.g. /uploads) set root_path to their prefix
+    return scope.get("root_path") or "unmatched"
+
+class MetricsMiddleware:
+    """
+    Record request count, latency and in-flight requests per route template.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_flight.dec()
+            route = route_label(scope)
+            http_latency.observe(time.perf_counter() - start, (scope["method"], route))
+            http_requests.inc((scope["method"], route, str(status_code)))
@@ -0,0 +1,275 @@
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..config import settings
+from .metrics import route_label
+from .query_stats import APP_DIR, query_stats_var
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# Default location of profile files, next to the app package
+PROFILE_DIR = os.path.join(os.path.dirname(APP_DIR), "profiles")
+META_SUFFIX = ".meta.json"
+# <UTC time>-<8 hex>, as generated by ProfilingMiddleware
+PROFILE_ID_PATTERN = re.compile(r"^\d{14}-[0-9a-f]{8}$")
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(APP_DIR):
+        filename = os.path.relpath(filename, os.path.dirname(APP_DIR))
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+class StackSampler:
+    """
+    Sample the stacks of all threads running app code on a background thread.
+
+    Stacks without an app frame (idle workers, the event loop waiting for
+    I/O, the log listener) are skipped, so the result shows where request
+    code spends CPU and blocking time. Samples are kept as collapsed stacks,
+    outermost frame first.
+    """
+
+    def __init__(self, interval: float = settings.PROFILING_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                in_app = False
+                while frame is not None:
+                    in_app = in_app or frame.f_code.co_filename.startswith(APP_DIR)
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if not in_app:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[tuple(reversed(stack))] += 1
+
+def collapsed(samples: Counter) -> str:
+    """Brendan Gregg's collapsed format, readable by speedscope and flamegraph.pl"""
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in samples.most_common())
+
+def speedscope(samples: Counter, name: str, interval: float) -> dict:
+    """A speedscope "sampled" profile; weights are milliseconds"""
+    frames: List[dict] = []
+    frame_index: Dict[str, int] = {}
+    stacks, weights = [], []
+    for stack, count in samples.most_common():
+        indexes = []
+        for label in stack:
+            if label not in frame_index:
+                frame_index[label] = len(frames)
+                frames.append({"name": label})
+            indexes.append(frame_index[label])
+        stacks.append(indexes)
+        weights.append(round(count * interval * 1000, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": stacks,
+            "weights": weights,
+        }],
+        "exporter": "pulse",
+    }
+
+class ProfileStore:
+    """
+    Profile files in a local directory, each with a `<id>.meta.json` sidecar
+    holding its index entry.
+
+    The directory is the index, so every worker process lists the profiles
+    written by all of them, and the newest `max_profiles` are kept on disk
+    whichever process wrote them.
+    """
+
+    def __init__(
+        self,
+        directory: str = settings.PROFILING_DIR or PROFILE_DIR,
+        max_profiles: int = settings.PROFILING_MAX_FILES,
+        fmt: str = settings.PROFILING_FORMAT
+    ):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.fmt = fmt
+
+    def save(self, entry: dict, samples: Counter, interval: float) -> dict:
+        os.makedirs(self.directory, exist_ok=True)
+        if self.fmt == "collapsed":
+            filename = f"{entry['profile_id']}.collapsed"
+            content = collapsed(samples)
+        else:
+            filename = f"{entry['profile_id']}.speedscope.json"
+            content = json.dumps(speedscope(samples, f"{entry['method']} {entry['route']}", interval))
+        with open(os.path.join(self.directory, filename), "w") as f:
+            f.write(content)
+
+        entry = {**entry, "file": filename, "samples": sum(samples.values())}
+        # Written last and renamed into place, so listings never see a partial entry
+        meta_path = self._meta_path(entry["profile_id"])
+        with open(f"{meta_path}.part", "w") as f:
+            json.dump(entry, f)
+        os.replace(f"{meta_path}.part", meta_path)
+
+        for old in self._entries()[self.max_profiles:]:
+            self._remove(old)
+        return entry
+
+    def _meta_path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}{META_SUFFIX}")
+
+    def _read(self, profile_id: str) -> Optional[dict]:
+        try:
+            with open(self._meta_path(profile_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            # Removed by another process, or not a profile
+            return None
+
+    def _entries(self) -> List[dict]:
+        """Index entries on disk, newest first; profile ids start with their time"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        ids = sorted((name[:-len(META_SUFFIX)] for name in names if name.endswith(META_SUFFIX)), reverse=True)
+        return [entry for entry in map(self._read, ids) if entry is not None]
+
+    def _remove(self, entry: dict) -> None:
+        for path in (self._meta_path(entry["profile_id"]), os.path.join(self.directory, entry["file"])):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def list(self) -> List[dict]:
+        return self._entries()[:self.max_profiles]
+
+    def path(self, profile_id: str) -> Optional[str]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        entry = self._read(profile_id)
+        if entry is None:
+            return None
+        return os.path.join(self.directory, os.path.basename(entry["file"]))
+
+# Shared store, listed by routers/profiles.py
+profile_store = ProfileStore()
+
+def admin_token_matches(token: Optional[str]) -> bool:
+    expected = settings.PROFILING_ADMIN_TOKEN
+    return bool(expected and token and hmac.compare_digest(token.encode(), expected.encode()))
+
+def require_profiling_admin(x_profile_token: Optional[str] = Header(None)) -> None:
+    """Dependency guarding the profile index; hidden unless a token is configured"""
+    if not settings.PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not admin_token_matches(x_profile_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token")
+
+class ProfilingMiddleware:
+    """
+    Profile a request when it carries `X-Profile: <PROFILING_ADMIN_TOKEN>`
+    or is picked by PROFILING_SAMPLE_RATE.
+
+    One request is profiled at a time per process; others that ask while a
+    profile is running are served normally. Requests served concurrently by
+    the same process can still appear in the samples.
+    """
+
+    def __init__(self, app: ASGIApp, store: ProfileStore = profile_store):
+        self.app = app
+        self.store = store
+        self._busy = threading.Lock()
+
+    def _wanted(self, scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return admin_token_matches(value.decode("latin-1"))
+        rate = settings.PROFILING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._wanted(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{datetime.utcnow():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        status_code = 500
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [
+                    *message.get("headers", []), (PROFILE_ID_HEADER, profile_id.encode())
+                ]}
+            await send(message)
+
+        sampler = StackSampler()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            duration = time.perf_counter() - start
+            self._busy.release()
+            stats = query_stats_var.get()
+            try:
+                entry = await run_in_threadpool(self.store.save, {
+                    "profile_id": profile_id,
+                    "created_at": datetime.utcnow().isoformat(),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route_label(scope),
+                    "status": status_code,
+                    "duration_ms": round(duration * 1000, 2),
+                    "query_count": stats.count if stats is not None else None,
+                }, sampler.samples, sampler.interval)
+                logger.info("Request profiled", extra=entry)
+            except OSError:
+                logger.exception("Could not write profile")
@@ -0,0 +1,138 @@
+import logging
+import os
+import re
+import sys
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..config import settings
+
+logger = logging.getLogger("app.queries")
+
+# Directory of the app package; call sites are reported relative to its parent
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SELF = os.path.abspath(__file__)
+
+# Expanded IN lists render one placeholder per value; collapse them so
+# `IN (?, ?)` and `IN (?, ?, ?)` count as the same statement
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%s|\$\d+|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+# Call sites kept per repeated statement
+MAX_CALL_SITES = 3
+
+def statement_shape(statement: str) -> str:
+    """Statement text with whitespace and placeholder lists normalized"""
+    return _PLACEHOLDER_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+def _call_site() -> Optional[str]:
+    """Innermost app frame outside this module, as `path:line in function`"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename != _SELF:
+            path = os.path.relpath(filename, os.path.dirname(APP_DIR))
+            return f"{path}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+class RequestQueryStats:
+    """Queries executed while serving one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Dict[str, int] = {}
+        self.call_sites: Dict[str, List[str]] = {}
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        shape = statement_shape(statement)
+        seen = self.shapes.get(shape, 0) + 1
+        self.shapes[shape] = seen
+        # Walking the stack is only worth it once a statement repeats
+        if seen > 1:
+            sites = self.call_sites.setdefault(shape, [])
+            if len(sites) < MAX_CALL_SITES:
+                site = _call_site()
+                if site is not None and site not in sites:
+                    sites.append(site)
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Statements executed at least `threshold` times"""
+        return {shape: n for shape, n in self.shapes.items() if n >= threshold}
+
+# Set per request by QueryStatsMiddleware; shared with threadpool workers
+query_stats_var: ContextVar[Optional[RequestQueryStats]] = ContextVar("query_stats", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if query_stats_var.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    stats = query_stats_var.get()
+    starts = conn.info.get("query_start")
+    if stats is not None and starts:
+        stats.record(statement, time.perf_counter() - starts.pop())
+
+@event.listens_for(Engine, "handle_error")
+def _discard_timer(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start"):
+        connection.info["query_start"].pop()
+
+class QueryStatsMiddleware:
+    """
+    Count SQL queries and database time per request.
+
+    Adds `X-Query-Count` and a `Server-Timing: db` entry to every response,
+    and logs a warning when one statement runs N_PLUS_ONE_THRESHOLD or more
+    times in a single request, with the code that issued it.
+    """
+
+    def __init__(self, app: ASGIApp, threshold: int = settings.N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = query_stats_var.set(stats)
+
+        async def send_with_query_stats(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [
+                    *message.get("headers", []),
+                    (b"x-query-count", str(stats.count).encode()),
+                    (b"server-timing", f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries"'.encode()),
+                ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_query_stats)
+        finally:
+            query_stats_var.reset(token)
+            if self.threshold > 0:
+                self._report(scope, stats)
+
+    def _report(self, scope: Scope, stats: RequestQueryStats) -> None:
+        endpoint = scope.get("endpoint")
+        for shape, count in stats.repeated(self.threshold).items():
+            logger.warning("Possible N+1 query", extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "endpoint": getattr(endpoint, "__qualname__", None),
+                "executions": count,
+                "statement": shape,
+                "call_sites": stats.call_sites.get(shape, []),
+                "request_queries": stats.count,
+            })
@@ -0,0 +1,34 @@
+from functools import lru_cache
+from typing import Any, Mapping, Optional
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from ..config import settings
+
+@lru_cache(maxsize=None)
+def type_adapter(response_type: Any) -> TypeAdapter:
+    """One adapter per response type; building one compiles its validator and serializer"""
+    return TypeAdapter(response_type)
+
+def json_response(response_type: Any, content: Any, headers: Optional[Mapping[str, str]] = None) -> Any:
+    """
+    `content` validated once against `response_type` and encoded to JSON
+    bytes by pydantic-core.
+
+    Returning a Response makes FastAPI skip its own response_model pass, so
+    list endpoints validate and encode each object once instead of
+    validating, converting to JSON-able dicts and encoding. The route's
+    response_model still documents the schema. With FAST_JSON_RESPONSES
+    off, `content` is returned as is and FastAPI handles it.
+
+    FastAPI only copies the headers of a `response: Response` parameter
+    onto responses it builds itself, so endpoints that set any pass them
+    as `headers`.
+    """
+    if not settings.FAST_JSON_RESPONSES:
+        return content
+    adapter = type_adapter(response_type)
+    return Response(
+        adapter.dump_json(adapter.validate_python(content), by_alias=True),
+        headers=headers,
+        media_type="application/json"
+    )
@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from ..config import settings
+from .logging_setup import SLOW_QUERY_LOGGER, request_scope_var
+from .metrics import route_label
+from .query_stats import statement_shape
+
+logger = logging.getLogger(SLOW_QUERY_LOGGER)
+
+# Statements whose plan can be explained without running them
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+def explain_prefix(dialect_name: str) -> Optional[str]:
+    if dialect_name == "postgresql":
+        return "EXPLAIN "
+    if dialect_name == "sqlite":
+        return "EXPLAIN QUERY PLAN "
+    return None
+
+def explain(conn, statement: str, parameters) -> Optional[List[str]]:
+    """
+    Plan of `statement` with the parameters it just ran with, one line per
+    plan node. Uses a raw cursor on the same connection, so it sees the
+    same transaction and does not re-enter the execution events.
+
+    On PostgreSQL a failed statement aborts the whole transaction, so the
+    EXPLAIN runs in a savepoint that is rolled back if it fails and the
+    request's own statements carry on.
+    """
+    prefix = explain_prefix(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    savepoint = conn.dialect.name == "postgresql" and not getattr(
+        conn.connection.dbapi_connection, "autocommit", False
+    )
+    cursor = conn.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            # PostgreSQL returns one text column; SQLite ends each row with the detail
+            plan = [str(row[-1]) for row in cursor.fetchall()]
+        except Exception as exc:
+            if savepoint:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            return [f"EXPLAIN failed: {exc}"]
+        if savepoint:
+            cursor.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        return plan
+    finally:
+        cursor.close()
+
+class SlowQueryLog:
+    """
+    Statements slower than `threshold_ms`, aggregated by shape.
+
+    Each slow execution is logged to the `app.slow_queries` logger (and so
+    to SLOW_QUERY_LOG_FILE) with its duration, route and plan. The plan is
+    captured the first time a shape is slow. `top()` returns the shapes
+    with the most total slow time.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = settings.SLOW_QUERY_MS,
+        top_n: int = settings.SLOW_QUERY_TOP_N,
+        capture_plans: bool = settings.SLOW_QUERY_EXPLAIN
+    ):
+        self.threshold_ms = threshold_ms
+        self.top_n = top_n
+        self.capture_plans = capture_plans
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, conn, statement: str, parameters, duration_ms: float, executemany: bool) -> None:
+        shape = statement_shape(statement)
+        scope = request_scope_var.get()
+        route = f"{scope['method']} {route_label(scope)}" if scope is not None else "background"
+
+        with self._lock:
+            entry = self._entries.get(shape)
+            needs_plan = self.capture_plans and not executemany and (entry is None or entry["plan"] is None)
+
+        # EXPLAIN runs outside the lock; two threads may both explain a new shape
+        plan = explain(conn, statement, parameters) if needs_plan else None
+
+        with self._lock:
+            entry = self._entries.setdefault(shape, {
+                "statement": shape,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "routes": {},
+                "plan": None,
+            })
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_seen"] = datetime.utcnow().isoformat()
+            entry["routes"][route] = entry["routes"].get(route, 0) + 1
+            if plan is not None and entry["plan"] is None:
+                entry["plan"] = plan
+            plan = entry["plan"]
+            self._trim()
+
+        logger.warning("Slow query", extra={
+            "duration_ms": round(duration_ms, 2),
+            "route": route,
+            "statement": shape,
+            "plan": plan,
+        })
+
+    def _trim(self) -> None:
+        # Keep twice top_n so shapes can climb into the top before being dropped
+        if len(self._entries) > self.top_n * 2:
+            keep = sorted(self._entries.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:self.top_n]
+            self._entries = dict(keep)
+
+    def top(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda entry: entry["total_ms"], reverse=True)
+            return [
+                {**entry, "total_ms": round(entry["total_ms"], 2), "max_ms": round(entry["max_ms"], 2), "routes": dict(entry["routes"])}
+                for entry in entries[:self.top_n]
+            ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+# Shared log, listed by routers/slow_queries.py
+slow_query_log = SlowQueryLog()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if slow_query_log.threshold_ms > 0:
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _check_duration(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("slow_query_start")
+    if not starts:
+        return
+    duration_ms = (time.perf_counter() - starts.pop()) * 1000
+    if duration_ms >= slow_query_log.threshold_ms:
+        try:
+            slow_query_log.record(conn, statement, parameters, duration_ms, executemany)
+        except Exception:
+            logger.exception("Could not record slow query")
+
+@event.listens_for(Engine, "handle_error")
+def _discard_timer(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("slow_query_start"):
+        connection.info["slow_query_start"].pop()
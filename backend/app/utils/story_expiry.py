@@ -0,0 +1,258 @@
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal
+from ..models.story import Story
+from .dates import utcnow, to_naive_utc
+from .media_store import release_refs
+
+logger = logging.getLogger(__name__)
+
+# Partitions are created this many days ahead (stories live at most 48 hours)
+PARTITION_DAYS_AHEAD = 3
+PARTITION_PREFIX = "stories_p"
+
+def delete_stories_batch(db: Session, story_ids: List[int], now: datetime) -> int:
+    """
+    Delete the given stories if they have expired.
+
+    Stories that were extended or already deleted are skipped.
+
+    Returns:
+        Number of deleted rows
+    """
+    if not story_ids:
+        return 0
+    expired = db.query(Story).filter(
+        Story.story_id.in_(story_ids),
+        Story.expiration_time <= now
+    )
+    release_refs(db, [row.media for row in expired.with_entities(Story.media).all()])
+    deleted = expired.delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+# ============================================
+# PARTITION MAINTENANCE (PostgreSQL only)
+# ============================================
+
+def _partition_name(day: datetime) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+def ensure_story_partitions(db: Session, now: Optional[datetime] = None) -> None:
+    """
+    Create daily partitions of the stories table from today up to
+    PARTITION_DAYS_AHEAD days ahead.
+    """
+    today = (now or utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    for offset in range(PARTITION_DAYS_AHEAD + 1):
+        start = today + timedelta(days=offset)
+        end = start + timedelta(days=1)
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {_partition_name(start)} PARTITION OF stories "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        ))
+    db.commit()
+
+def drop_expired_story_partitions(db: Session, now: Optional[datetime] = None) -> List[str]:
+    """
+    Drop daily partitions whose whole range has expired.
+
+    Returns:
+        Names of the dropped partitions
+    """
+    today = (now or utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    partitions = db.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+        "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+        "WHERE parent.relname = 'stories'"
+    )).scalars().all()
+
+    dropped = []
+    for name in partitions:
+        try:
+            day = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d")
+        except ValueError:
+            continue
+        # Partition covers [day, day + 1); everything in it expired before today
+        if day + timedelta(days=1) <= today:
+            release_refs(db, db.execute(text(f"SELECT media FROM {name}")).scalars().all())
+            db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    db.commit()
+    return dropped
+
+# ============================================
+# SCHEDULER
+# ============================================
+
+class StoryExpiryScheduler:
+    """
+    Background thread that deletes stories as they expire.
+
+    Upcoming expirations are kept in a min-heap of (expiration_time, story_id).
+    The thread sleeps until the earliest one is due and deletes due stories in
+    batches. The database is rescanned periodically to pick up stories created
+    by other workers; stories already overdue then, such as after downtime,
+    are deleted directly in batches instead of going through the heap. With partitioned storage, expired partitions are dropped
+    instead of deleting rows.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.STORY_EXPIRY_BATCH_SIZE,
+        rescan_seconds: int = settings.STORY_EXPIRY_RESCAN_SECONDS,
+        partitioned: bool = settings.story_partitioning_enabled
+    ):
+        self.batch_size = batch_size
+        self.rescan_seconds = rescan_seconds
+        self.partitioned = partitioned
+        self._heap: List[Tuple[datetime, int]] = []
+        self._scheduled = set()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._next_rescan = utcnow()
+
+    def schedule(self, story_id: int, expiration_time: datetime) -> None:
+        """
+        Register a story so it is deleted once it expires.
+        """
+        if self.partitioned:
+            return
+        expiration_time = to_naive_utc(expiration_time)
+        with self._condition:
+            if story_id in self._scheduled:
+                return
+            self._scheduled.add(story_id)
+            heapq.heappush(self._heap, (expiration_time, story_id))
+            # Wake the thread if this story is now the earliest one
+            if self._heap[0][1] == story_id:
+                self._condition.notify()
+
+    def schedule_many(self, stories: Iterable[Tuple[int, datetime]]) -> None:
+        for story_id, expiration_time in stories:
+            self.schedule(story_id, expiration_time)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="story-expiry", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def pending(self) -> int:
+        """Number of stories waiting in the heap"""
+        with self._condition:
+            return len(self._heap)
+
+    def _rescan(self, db: Session, now: datetime) -> None:
+        """
+        Load stories expiring before the next rescan, or maintain partitions.
+        """
+        if self.partitioned:
+            ensure_story_partitions(db, now)
+            dropped = drop_expired_story_partitions(db, now)
+            if dropped:
+                logger.info("Dropped expired story partitions: %s", ", ".join(dropped))
+            return
+
+        # Stories that expired while no worker was running are deleted here in
+        # batches rather than loaded into the heap all at once
+        self.delete_overdue(db, now)
+
+        horizon = now + timedelta(seconds=self.rescan_seconds)
+        upcoming = db.query(Story.story_id, Story.expiration_time).filter(
+            Story.expiration_time > now,
+            Story.expiration_time <= horizon
+        ).order_by(Story.expiration_time.asc()).all()
+        self.schedule_many(upcoming)
+
+    def delete_overdue(self, db: Session, now: datetime) -> int:
+        """
+        Delete every story that expired by `now`, batch_size rows per
+        transaction.
+
+        Returns:
+            Number of deleted rows
+        """
+        total = 0
+        while not self._stopping:
+            story_ids = [row[0] for row in db.query(Story.story_id).filter(
+                Story.expiration_time <= now
+            ).order_by(Story.expiration_time.asc()).limit(self.batch_size).all()]
+            if not story_ids:
+                break
+            total += delete_stories_batch(db, story_ids, now)
+            if len(story_ids) < self.batch_size:
+                break
+        if total:
+            logger.info("Deleted %d overdue stories", total)
+        return total
+
+    def _pop_due(self, now: datetime) -> List[int]:
+        """Pop up to batch_size due story ids (caller holds the lock)"""
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            _, story_id = heapq.heappop(self._heap)
+            self._scheduled.discard(story_id)
+            due.append(story_id)
+        return due
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if self._stopping:
+                    return
+                now = utcnow()
+                due = self._pop_due(now)
+                rescan = now >= self._next_rescan
+                if not due and not rescan:
+                    wake_at = self._next_rescan
+                    if self._heap and self._heap[0][0] < wake_at:
+                        wake_at = self._heap[0][0]
+                    self._condition.wait((wake_at - now).total_seconds())
+                    continue
+
+            db = SessionLocal()
+            try:
+                if rescan:
+                    self._next_rescan = now + timedelta(seconds=self.rescan_seconds)
+                    self._rescan(db, now)
+                if due:
+                    deleted = delete_stories_batch(db, due, now)
+                    logger.debug("Deleted %d expired stories", deleted)
+            except Exception:
+                db.rollback()
+                logger.exception("Story expiry pass failed")
+            finally:
+                db.close()
+
+# Shared scheduler, started and stopped by the app lifespan in main.py
+story_expiry_scheduler = StoryExpiryScheduler()
+
+def prepare_story_storage() -> None:
+    """
+    Create the partitions needed before the first story insert.
+    """
+    if not settings.story_partitioning_enabled:
+        return
+    db = SessionLocal()
+    try:
+        ensure_story_partitions(db)
+    finally:
+        db.close()
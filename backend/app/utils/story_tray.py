@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..models import Story, StorySeen, User, Follow
+from .dates import to_naive_utc
+from .images import variant_url
+
+def build_story_tray(viewer_id: int, db: Session, now: datetime) -> Tuple[List[dict], List[int]]:
+    """
+    Build the story tray for a viewer with a constant number of queries.
+
+    Returns:
+        (tray entries, ids of the authors the tray was built from)
+    """
+    # Query 1: followed authors (plus the viewer's own stories)
+    author_ids = [f[0] for f in db.query(Follow.followee_id).filter(
+        Follow.follower_id == viewer_id
+    ).all()]
+    author_ids.append(viewer_id)
+
+    # Query 2: active stories of those authors with author info
+    rows = db.query(
+        Story.story_id, Story.user_id, Story.created_at, Story.expiration_time,
+        User.username, User.profile_picture, User.profile_picture_placeholder,
+        User.profile_picture_variants_ready
+    ).join(User, User.user_id == Story.user_id).filter(
+        Story.user_id.in_(author_ids),
+        Story.expiration_time > now
+    ).order_by(Story.user_id, Story.story_id.asc()).all()
+
+    # Query 3: the viewer's seen watermarks
+    watermarks = dict(db.query(StorySeen.author_id, StorySeen.last_seen_story_id).filter(
+        StorySeen.viewer_id == viewer_id
+    ).all())
+
+    entries: Dict[int, dict] = {}
+    for story_id, user_id, created_at, expiration_time, username, profile_picture, placeholder, ready in rows:
+        entry = entries.get(user_id)
+        if entry is None:
+            entry = entries[user_id] = {
+                "user_id": user_id,
+                "username": username,
+                "profile_picture": profile_picture,
+                "profile_picture_thumb": variant_url(profile_picture, ready, "thumb"),
+                "profile_picture_placeholder": placeholder,
+                "story_ids": [],
+                "has_unseen": False,
+                "latest_story_at": created_at,
+                "expires_at": to_naive_utc(expiration_time)
+            }
+        entry["story_ids"].append(story_id)
+        entry["latest_story_at"] = max(entry["latest_story_at"], created_at)
+        entry["expires_at"] = min(entry["expires_at"], to_naive_utc(expiration_time))
+        if story_id > watermarks.get(user_id, 0):
+            entry["has_unseen"] = True
+
+    # Own stories first, then authors with unseen stories, newest first
+    tray = sorted(
+        entries.values(),
+        key=lambda e: (e["user_id"] != viewer_id, not e["has_unseen"], -e["latest_story_at"].timestamp())
+    )
+    return tray, author_ids
+
+class TraySnapshot(NamedTuple):
+    """Taken before a tray is built; changes after it invalidate the tray"""
+    clock: int
+    started_at: float
+
+class StoryTrayCache:
+    """
+    Per-viewer cache of built story trays.
+
+    An entry is reused until one of its authors posts or deletes a story,
+    the viewer follows, unfollows or marks a story seen, its earliest story
+    expires, or the TTL passes. Changes are stamped with a counter, and an
+    entry is stale once any of its authors or its viewer changed after the
+    snapshot taken before it was built, so a change made while the tray was
+    being built is not lost. The TTL bounds staleness from writes handled
+    by other workers.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = settings.STORY_TRAY_CACHE_TTL_SECONDS,
+        max_entries: int = settings.STORY_TRAY_CACHE_MAX_ENTRIES
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # ("author" | "viewer", user id) -> (clock, monotonic time), oldest first
+        self._changes: "OrderedDict[Tuple[str, int], Tuple[int, float]]" = OrderedDict()
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> TraySnapshot:
+        with self._lock:
+            return TraySnapshot(self._clock, time.monotonic())
+
+    def _changed_since(self, key: Tuple[str, int], clock: int) -> bool:
+        change = self._changes.get(key)
+        return change is not None and change[0] > clock
+
+    def _record_change(self, key: Tuple[str, int]) -> None:
+        # Called with the lock held
+        now = time.monotonic()
+        self._clock += 1
+        self._changes[key] = (self._clock, now)
+        self._changes.move_to_end(key)
+        # A change older than the TTL can only concern entries that have expired
+        while self._changes:
+            _, (_, changed_at) = next(iter(self._changes.items()))
+            if now - changed_at <= self.ttl_seconds:
+                break
+            self._changes.popitem(last=False)
+
+    def get(self, viewer_id: int, now: datetime) -> Optional[List[dict]]:
+        with self._lock:
+            cached = self._entries.get(viewer_id)
+            if cached is None:
+                return None
+            tray, author_ids, snapshot, expires_at = cached
+            if (
+                time.monotonic() - snapshot.started_at > self.ttl_seconds
+                or (expires_at is not None and expires_at <= now)
+                or self._changed_since(("viewer", viewer_id), snapshot.clock)
+                or any(self._changed_since(("author", a), snapshot.clock) for a in author_ids)
+            ):
+                del self._entries[viewer_id]
+                return None
+            self._entries.move_to_end(viewer_id)
+            return tray
+
+    def put(self, viewer_id: int, tray: List[dict], author_ids: List[int], snapshot: TraySnapshot) -> None:
+        """Cache a tray built after `snapshot` was taken"""
+        expires_at = min((e["expires_at"] for e in tray), default=None)
+        with self._lock:
+            self._entries[viewer_id] = (tray, author_ids, snapshot, expires_at)
+            self._entries.move_to_end(viewer_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def author_changed(self, author_id: int) -> None:
+        """Invalidate every tray that includes this author"""
+        with self._lock:
+            self._record_change(("author", author_id))
+
+    def invalidate_viewer(self, viewer_id: int) -> None:
+        with self._lock:
+            self._entries.pop(viewer_id, None)
+            self._record_change(("viewer", viewer_id))
+
+# Shared cache used by the stories and follows routers
+story_tray_cache = StoryTrayCache()
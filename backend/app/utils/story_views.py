@@ -0,0 +1,153 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from ..config import settings
+from ..database import SessionLocal
+from ..models.story import Story
+from .hyperloglog import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+def parse_viewer_ids(value: Optional[str]) -> List[int]:
+    """Parse the comma-separated Story.first_viewer_ids column"""
+    return [int(v) for v in value.split(",")] if value else []
+
+def load_view_sketch(story: Story, precision: int) -> HyperLogLog:
+    """
+    Load the persisted sketch of a story.
+
+    Sketches written with a different precision start over empty.
+    """
+    if story.view_sketch:
+        sketch = HyperLogLog.from_bytes(story.view_sketch)
+        if sketch.precision == precision:
+            return sketch
+    return HyperLogLog(precision)
+
+class StoryViewRecorder:
+    """
+    Buffers story views in memory and flushes them to the stories table.
+
+    Each story with pending views holds one HyperLogLog sketch and at most
+    `viewer_list_size` viewer ids, so memory per story is fixed. A
+    background thread merges pending sketches into Story.view_sketch every
+    `flush_seconds`.
+    """
+
+    def __init__(
+        self,
+        precision: int = settings.STORY_VIEW_HLL_PRECISION,
+        viewer_list_size: int = settings.STORY_VIEWER_LIST_SIZE,
+        flush_seconds: int = settings.STORY_VIEW_FLUSH_SECONDS
+    ):
+        self.precision = precision
+        self.viewer_list_size = viewer_list_size
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[int, Tuple[HyperLogLog, List[int]]] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, story_id: int, viewer_id: int) -> None:
+        with self._lock:
+            entry = self._pending.get(story_id)
+            if entry is None:
+                entry = self._pending[story_id] = (HyperLogLog(self.precision), [])
+            sketch, viewers = entry
+            sketch.add(viewer_id)
+            if len(viewers) < self.viewer_list_size and viewer_id not in viewers:
+                viewers.append(viewer_id)
+
+    def _merge_viewers(self, first: List[int], new: List[int]) -> List[int]:
+        seen = set(first)
+        for viewer_id in new:
+            if len(first) >= self.viewer_list_size:
+                break
+            if viewer_id not in seen:
+                seen.add(viewer_id)
+                first.append(viewer_id)
+        return first
+
+    def flush(self) -> int:
+        """
+        Write pending views to the database.
+
+        Returns:
+            Number of stories updated
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        db = SessionLocal()
+        try:
+            # Lock the rows so concurrent flushes from other workers don't drop views
+            stories = db.query(Story).filter(
+                Story.story_id.in_(list(pending))
+            ).with_for_update().all()
+            for story in stories:
+                new_sketch, new_viewers = pending[story.story_id]
+                sketch = load_view_sketch(story, self.precision)
+                sketch.merge(new_sketch)
+                story.view_sketch = sketch.to_bytes()
+                viewers = self._merge_viewers(parse_viewer_ids(story.first_viewer_ids), new_viewers)
+                story.first_viewer_ids = ",".join(str(v) for v in viewers)
+            db.commit()
+            return len(stories)
+        except Exception:
+            db.rollback()
+            logger.exception("Story view flush failed")
+            # Put the views back so the next flush retries them
+            with self._lock:
+                for story_id, (sketch, viewers) in pending.items():
+                    entry = self._pending.get(story_id)
+                    if entry is None:
+                        self._pending[story_id] = (sketch, viewers)
+                    else:
+                        entry[0].merge(sketch)
+                        self._merge_viewers(entry[1], viewers)
+            return 0
+        finally:
+            db.close()
+
+    def view_stats(self, story: Story) -> Tuple[int, List[int]]:
+        """
+        Get (unique viewer count, first viewer ids) for a story, including
+        views not flushed yet.
+
+        The count is exact while fewer than `viewer_list_size` viewers have
+        been seen, and a HyperLogLog estimate after that.
+        """
+        sketch = load_view_sketch(story, self.precision)
+        viewers = parse_viewer_ids(story.first_viewer_ids)
+        with self._lock:
+            entry = self._pending.get(story.story_id)
+            if entry is not None:
+                sketch.merge(entry[0])
+                viewers = self._merge_viewers(viewers, entry[1])
+
+        if len(viewers) < self.viewer_list_size:
+            return len(viewers), viewers
+        return max(sketch.count(), len(viewers)), viewers
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.flush_seconds):
+            self.flush()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="story-views", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+# Shared recorder, started and stopped by the app lifespan in main.py
+story_view_recorder = StoryViewRecorder()
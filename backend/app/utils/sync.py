@@ -0,0 +1,227 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+from fastapi import HTTPException, status
+from sqlalchemy import event, func, insert
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal
+from ..models.message import Message
+from ..models.notification import Notification
+from ..models.sync_change import SyncChange
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on rows returned by a single sync call
+MAX_SYNC_LIMIT = 500
+
+class SyncToken(NamedTuple):
+    row_id: int  # Highest notification_id / message_id the client has seen
+    change_id: int  # Highest SyncChange.change_id the client has seen
+    expired: bool  # Changes after it may have been pruned; the client must resync
+
+def encode_sync_token(row_id: int, change_id: int) -> str:
+    """
+    Encode the two high-water marks of a sync cursor and when it was issued.
+
+    Args:
+        row_id: Highest notification_id / message_id the client has seen
+        change_id: Highest SyncChange.change_id the client has seen
+
+    Returns:
+        Opaque token string to pass back as `since`
+    """
+    return f"{row_id}.{change_id}.{int(time.time())}"
+
+def decode_sync_token(token: str) -> SyncToken:
+    """
+    Decode a sync token.
+
+    An empty token means "from the beginning". A token older than the
+    change-log retention is expired: changes it has not seen may have been
+    pruned. Tokens from before issue times were added count as expired.
+
+    Raises:
+        HTTPException 400 if the token is malformed
+    """
+    if not token:
+        return SyncToken(0, 0, False)
+
+    try:
+        parts = [int(part) for part in token.split(".")]
+    except ValueError:
+        parts = []
+    if len(parts) == 2:
+        parts.append(0)
+    if len(parts) != 3 or min(parts) < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid sync token"
+        )
+
+    row_id, change_id, issued_at = parts
+    # Everything older than the retention is pruned; the token has only
+    # seen what settled before it was issued
+    valid_for = settings.SYNC_CHANGE_RETENTION_DAYS * 86400 - settings.SYNC_SETTLE_SECONDS
+    return SyncToken(row_id, change_id, issued_at < time.time() - valid_for)
+
+def settle_cutoff() -> datetime:
+    """Rows created after this may still have uncommitted neighbours with lower ids"""
+    return datetime.now(timezone.utc) - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite returns naive UTC timestamps
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def settled_position(rows: Sequence, id_attr: str, since: int) -> int:
+    """
+    How far a token may advance over `rows` (oldest first): up to the row
+    before the first one created within SYNC_SETTLE_SECONDS.
+
+    Ids are assigned on insert but rows appear on commit, so a slower
+    transaction can commit a row below an id a client has already passed.
+    Recent rows are returned again until they settle; clients apply rows
+    and changes by id, so the repeats are harmless.
+    """
+    cutoff = settle_cutoff()
+    position = since
+    for row in rows:
+        if row.created_at is None or _as_utc(row.created_at) > cutoff:
+            break
+        position = getattr(row, id_attr)
+    return position
+
+def change_rows(user_ids: Iterable[int], entity: str, action: str, entity_ids: Iterable[int]) -> List[dict]:
+    """SyncChange rows for record_changes, one per user and entity"""
+    entity_ids = list(entity_ids)
+    return [
+        {"user_id": user_id, "entity": entity, "entity_id": entity_id, "action": action}
+        for user_id in set(user_ids)
+        for entity_id in entity_ids
+    ]
+
+def record_changes(
+    db: Session,
+    user_ids: Iterable[int],
+    entity: str,
+    action: str,
+    entity_ids: Iterable[int]
+) -> None:
+    """
+    Add change-log rows so other devices of `user_ids` pick up the change.
+
+    The rows go out as one executemany INSERT in the caller's transaction,
+    so marking a whole conversation read costs one statement; the caller
+    commits them together with the change they describe.
+    """
+    insert_changes(db, change_rows(user_ids, entity, action, entity_ids))
+
+def insert_changes(db: Session, rows: List[dict]) -> None:
+    if rows:
+        db.execute(insert(SyncChange), rows)
+
+def page_has_more(rows: Sequence, id_attr: str, position: int, limit: int) -> bool:
+    """A full page the token advanced all the way through; rows held back to settle wait for the next poll"""
+    return len(rows) == limit and position == getattr(rows[-1], id_attr)
+
+def fetch_changes(
+    db: Session,
+    user_id: int,
+    entity: str,
+    since_change_id: int,
+    limit: int
+) -> List[SyncChange]:
+    """
+    Get change-log rows for a user and entity after a change_id, oldest first.
+    """
+    return db.query(SyncChange).filter(
+        SyncChange.user_id == user_id,
+        SyncChange.entity == entity,
+        SyncChange.change_id > since_change_id
+    ).order_by(SyncChange.change_id.asc()).limit(limit).all()
+
+def latest_change_id(db: Session, user_id: int, entity: str) -> int:
+    """
+    Get the newest settled change_id for a user and entity (see
+    settled_position), or 0 if there is none.
+    """
+    cutoff = settle_cutoff()
+    settled, pending = db.query(
+        func.max(SyncChange.change_id).filter(SyncChange.created_at <= cutoff),
+        func.min(SyncChange.change_id).filter(SyncChange.created_at > cutoff)
+    ).filter(
+        SyncChange.user_id == user_id,
+        SyncChange.entity == entity
+    ).one()
+    if pending is not None:
+        return min(settled or 0, pending - 1)
+    return settled or 0
+
+@event.listens_for(Session, "before_flush")
+def _record_deletes(session: Session, flush_context, instances) -> None:
+    """
+    Log deleted messages and notifications, including ones removed by an
+    ORM cascade such as DELETE /users/me. Bulk query deletes bypass this
+    and record their changes themselves.
+    """
+    deleted_users = {obj.user_id for obj in session.deleted if isinstance(obj, User)}
+    rows = []
+    for obj in list(session.deleted):
+        if isinstance(obj, Message):
+            user_ids = {obj.sender_id, obj.receiver_id} - deleted_users
+            rows += change_rows(user_ids, "message", "delete", [obj.message_id])
+        elif isinstance(obj, Notification) and obj.user_id not in deleted_users:
+            rows += change_rows([obj.user_id], "notification", "delete", [obj.notification_id])
+    insert_changes(session, rows)
+
+class SyncChangePruner:
+    """
+    Deletes change-log rows older than SYNC_CHANGE_RETENTION_DAYS every
+    `interval_seconds`. Tokens that old are expired, so nothing reads them.
+    """
+
+    def __init__(self, interval_seconds: int = settings.SYNC_PRUNE_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def prune(self) -> int:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.SYNC_CHANGE_RETENTION_DAYS)
+        db = SessionLocal()
+        try:
+            deleted = db.query(SyncChange).filter(
+                SyncChange.created_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Pruning sync changes failed")
+            return 0
+        finally:
+            db.close()
+        if deleted:
+            logger.info("Pruned %d sync changes", deleted)
+        return deleted
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval_seconds):
+            self.prune()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="sync-prune", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+# Shared pruner, started and stopped by the app lifespan in main.py
+sync_change_pruner = SyncChangePruner()
@@ -0,0 +1,77 @@
+"""
+Generate thumb/medium/full WebP and JPEG variants for uploads that don't have them yet,
+and flag the uploads and the posts, stories and profiles using them as having variants.
+
+Usage:
+    python backfill_variants.py [--workers N] [--force]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from app.database import SessionLocal
+from app.routers.uploads import ALLOWED_EXTENSIONS
+from app.utils.media_store import mark_variants_ready
+from app.utils.images import (
+    UPLOAD_DIR,
+    UPLOAD_URL_PREFIX,
+    VARIANT_DIR,
+    VARIANT_SIZES,
+    VARIANT_FORMATS,
+    variant_name,
+    upload_name,
+    generate_variants
+)
+
+def needs_variants(path: str) -> bool:
+    name = upload_name(path)
+    return not all(
+        os.path.exists(os.path.join(VARIANT_DIR, *variant_name(name, size, fmt).split("/")))
+        for size in VARIANT_SIZES
+        for fmt in VARIANT_FORMATS
+    )
+
+def find_uploads():
+    """Original uploads, both flat legacy files and content-addressed shards"""
+    for root, dirs, files in os.walk(UPLOAD_DIR):
+        if root == UPLOAD_DIR and "variants" in dirs:
+            dirs.remove("variants")
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in ALLOWED_EXTENSIONS:
+                yield os.path.join(root, name)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--force", action="store_true", help="Regenerate existing variants")
+    args = parser.parse_args()
+
+    files = [path for path in find_uploads() if args.force or needs_variants(path)]
+    print(f"🖼️  {len(files)} images to process with {args.workers} workers")
+
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(generate_variants, path): path for path in files}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ {os.path.basename(futures[future])}: {e}")
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Processed {len(files) - failed} images in {elapsed:.1f}s ({failed} failed)")
+
+    # Also flags files whose variants predate the flag
+    ready = [path for path in find_uploads() if not needs_variants(path)]
+    db = SessionLocal()
+    try:
+        for path in ready:
+            mark_variants_ready(db, UPLOAD_URL_PREFIX + upload_name(path))
+    finally:
+        db.close()
+    print(f"🏷️  Flagged {len(ready)} images as having variants")
+
+if __name__ == "__main__":
+    main()
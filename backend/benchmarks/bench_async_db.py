@@ -0,0 +1,116 @@
+"""
+Compare feed throughput and latency on the sync and async database paths.
+
+`sync` serves the feed from a `def` endpoint with a Session, `async` is
+the app's `GET /posts/`. Both build responses from the same batched
+statements (post_page_statements), so the difference is the database I/O
+model alone. Requests go through an in-process ASGI transport, so the sync
+path is limited by the anyio threadpool exactly as under uvicorn.
+
+Usage:
+    python -m benchmarks.bench_async_db [--requests 2000] [--concurrency 200] [--posts 200]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from typing import List
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, get_db
+from app.main import app
+from app.models import Post, User
+from app.routers.posts import build_post_responses
+from app.utils.dependencies import get_current_user
+
+def sync_feed(
+    skip: int = 0,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    posts = db.query(Post).order_by(Post.created_at.desc()).offset(skip).limit(limit).all()
+    return build_post_responses(posts, current_user.user_id, db)
+
+bench_app = FastAPI()
+bench_app.add_api_route("/sync/posts/", sync_feed)
+bench_app.mount("/", app)
+
+def seed(posts: int) -> int:
+    """Create a user with `posts` posts; returns the user id"""
+    db = SessionLocal()
+    try:
+        name = f"bench_{uuid.uuid4().hex[:12]}"
+        user = User(username=name, email=f"{name}@example.com", hashed_password="!")
+        db.add(user)
+        db.flush()
+        db.add_all(Post(user_id=user.user_id, text=f"Benchmark post {i}") for i in range(posts))
+        db.commit()
+        return user.user_id
+    finally:
+        db.close()
+
+def percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+async def run(client: httpx.AsyncClient, path: str, headers: dict, requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "errors": errors
+    }
+
+async def main_async(args) -> None:
+    from app.utils.auth import create_access_token
+
+    user_id = seed(args.posts)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+    results = []
+    transport = httpx.ASGITransport(app=bench_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for mode, path in (("sync", "/sync/posts/"), ("async", "/posts/")):
+            await run(client, path, headers, min(100, args.requests), args.concurrency)
+            result = {
+                "mode": mode,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                **await run(client, path, headers, args.requests, args.concurrency)
+            }
+            results.append(result)
+            print(f"{mode:>6}: {result['requests_per_second']:8.1f} req/s, "
+                  f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, errors {result['errors']}")
+
+    print(json.dumps({"benchmark": "async_db", "results": results}, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async database path benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=200, help="Posts to seed for the feed")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
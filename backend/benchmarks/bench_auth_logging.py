@@ -0,0 +1,81 @@
+"""
+Benchmark authenticated request throughput under different logging setups.
+
+`sync-debug` writes every auth debug record on the request thread, the
+way the old print tracing did; the `queue-*` modes go through the
+QueueHandler/QueueListener pipeline used by the app.
+
+Usage:
+    python -m benchmarks.bench_auth_logging [--requests 2000] [--concurrency 8] [--output FILE]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+from app.main import app
+from app.utils.logging_setup import setup_logging, shutdown_logging
+
+MODES = {
+    "sync-debug": {"level": "DEBUG", "queued": False, "sample_rate": 1.0},
+    "queue-debug": {"level": "DEBUG", "queued": True, "sample_rate": 1.0},
+    "queue-debug-sampled": {"level": "DEBUG", "queued": True, "sample_rate": 0.1},
+    "queue-info": {"level": "INFO", "queued": True, "sample_rate": 1.0},
+}
+
+def register(client: TestClient) -> dict:
+    name = f"bench_{uuid.uuid4().hex[:12]}"
+    response = client.post("/auth/register", json={
+        "username": name,
+        "email": f"{name}@example.com",
+        "password": "benchmark"
+    })
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def run(client: TestClient, headers: dict, requests: int, concurrency: int) -> float:
+    def request(_):
+        client.get("/users/me", headers=headers).raise_for_status()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(request, range(requests)))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Auth logging throughput benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="Log file to write to (default: a temporary file)")
+    args = parser.parse_args()
+
+    results = []
+    with TestClient(app) as client, tempfile.TemporaryDirectory() as directory:
+        headers = register(client)
+        log_path = args.output or os.path.join(directory, "bench.log")
+
+        for mode, options in MODES.items():
+            with open(log_path, "w") as stream:
+                setup_logging(stream=stream, **options)
+                # Warm up caches and connections before timing
+                run(client, headers, min(100, args.requests), args.concurrency)
+                elapsed = run(client, headers, args.requests, args.concurrency)
+                shutdown_logging()
+            results.append({
+                "mode": mode,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "seconds": round(elapsed, 3),
+                "requests_per_second": round(args.requests / elapsed, 1),
+                "log_bytes": os.path.getsize(log_path)
+            })
+            print(f"{mode:>20}: {args.requests / elapsed:8.1f} req/s")
+
+    setup_logging()
+    print(json.dumps({"benchmark": "auth_logging", "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
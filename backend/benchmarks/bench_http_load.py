@@ -0,0 +1,372 @@
+"""
+End-to-end HTTP load test of the API with scripted user journeys.
+
+Starts the app under uvicorn on a fresh SQLite database (or targets a
+running server with --url), seeds users, posts, hashtags and follows over
+HTTP (or, with --dataset-users, fills the database with generate_dataset.py
+and logs in as generated users), then lets --concurrency virtual users run weighted journeys for
+--duration seconds: register, login, feed scroll, like, comment, follow,
+direct messages and explore. Reports throughput and p50/p95/p99 per
+endpoint as JSON, tagged with the git commit so runs can be compared.
+
+Usage:
+    python -m benchmarks.bench_http_load [--concurrency 50] [--duration 30] [--users 50]
+        [--url http://localhost:8000] [--workers 1] [--seed 1] [--output load.json]
+        [--dataset-users 10000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = "benchmark-password"
+# Password of users created by generate_dataset.py (app/utils/dataset.py)
+DATASET_PASSWORD = "pulse-dataset"
+HASHTAGS = ["pulse", "travel", "food", "music", "art", "tech", "fitness", "photo", "nature", "books",
+            "coffee", "code", "design", "gaming", "movies", "style", "pets", "sunset", "weekend", "news"]
+
+class Recorder:
+    """Latencies and errors per endpoint label"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.journeys: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, label: str, method: str, url: str,
+                      expected=(200,), **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.latencies[label].append((time.perf_counter() - start) * 1000)
+            self.errors[label] += 1
+            return None
+        self.latencies[label].append((time.perf_counter() - start) * 1000)
+        if response.status_code not in expected:
+            self.errors[label] += 1
+        return response
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for label, values in sorted(self.latencies.items()):
+            endpoints[label] = {
+                "requests": len(values),
+                "errors": self.errors[label],
+                "requests_per_second": round(len(values) / elapsed, 2),
+                "p50_ms": round(statistics.median(values), 2),
+                "p95_ms": round(percentile(values, 0.95), 2),
+                "p99_ms": round(percentile(values, 0.99), 2),
+            }
+        every = [value for values in self.latencies.values() for value in values]
+        return {
+            "total": {
+                "requests": len(every),
+                "errors": sum(self.errors.values()),
+                "requests_per_second": round(len(every) / elapsed, 2),
+                "p50_ms": round(statistics.median(every), 2) if every else None,
+                "p95_ms": round(percentile(every, 0.95), 2) if every else None,
+                "p99_ms": round(percentile(every, 0.99), 2) if every else None,
+            },
+            "journeys": dict(self.journeys),
+            "endpoints": endpoints,
+        }
+
+def percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, rng: random.Random,
+                 username: str, user_id: int, token: str, user_ids: List[int]):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.username = username
+        self.user_id = user_id
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.user_ids = user_ids
+        self.seen_posts: List[int] = []
+
+    async def call(self, label: str, method: str, url: str, expected=(200,), **kwargs) -> Optional[httpx.Response]:
+        kwargs.setdefault("headers", self.headers)
+        return await self.recorder.request(self.client, label, method, url, expected, **kwargs)
+
+    def other_user(self) -> int:
+        user_id = self.rng.choice(self.user_ids)
+        return user_id if user_id != self.user_id else self.rng.choice(self.user_ids)
+
+    async def feed(self) -> List[dict]:
+        response = await self.call("GET /posts/", "GET", "/posts/", params={"skip": 0, "limit": 20})
+        posts = response.json() if response is not None and response.status_code == 200 else []
+        self.seen_posts = [post["post_id"] for post in posts] or self.seen_posts
+        return posts
+
+    async def journey_login(self) -> None:
+        await self.recorder.request(self.client, "POST /auth/login", "POST", "/auth/login",
+                                    json={"username": self.username, "password": PASSWORD})
+
+    async def journey_register(self) -> None:
+        name = f"load_{uuid.uuid4().hex[:10]}"
+        await self.recorder.request(self.client, "POST /auth/register", "POST", "/auth/register", (201,),
+                                    json={"username": name, "email": f"{name}@example.com", "password": PASSWORD})
+
+    async def journey_feed_scroll(self) -> None:
+        await self.feed()
+        for skip in (20, 40):
+            await self.call("GET /posts/", "GET", "/posts/", params={"skip": skip, "limit": 20})
+
+    async def journey_like(self) -> None:
+        if not self.seen_posts:
+            await self.feed()
+        if self.seen_posts:
+            # 400 means the post was already liked by this user
+            await self.call("POST /likes/", "POST", "/likes/", (201, 400),
+                            json={"post_id": self.rng.choice(self.seen_posts)})
+
+    async def journey_comment(self) -> None:
+        if not self.seen_posts:
+            await self.feed()
+        if self.seen_posts:
+            post_id = self.rng.choice(self.seen_posts)
+            await self.call("POST /comments/", "POST", "/comments/", (201,),
+                            json={"post_id": post_id, "text": "Nice one!"})
+            await self.call("GET /comments/post/{post_id}", "GET", f"/comments/post/{post_id}")
+
+    async def journey_follow(self) -> None:
+        # 400 means already following
+        await self.call("POST /follows/", "POST", "/follows/", (201, 400),
+                        json={"followee_id": self.other_user()})
+
+    async def journey_dm(self) -> None:
+        partner = self.other_user()
+        if partner == self.user_id:
+            return
+        await self.call("POST /messages/", "POST", "/messages/", (201,),
+                        json={"receiver_id": partner, "content": "Hey, how are you?"})
+        await self.call("GET /messages/conversations", "GET", "/messages/conversations")
+        await self.call("GET /messages/conversation/{user_id}", "GET", f"/messages/conversation/{partner}")
+
+    async def journey_explore(self) -> None:
+        await self.call("GET /hashtags/", "GET", "/hashtags/")
+        tag = self.rng.choice(HASHTAGS[:8])
+        await self.call("GET /hashtags/{tag_name}/posts", "GET", f"/hashtags/{tag}/posts", (200, 404))
+        user_id = self.other_user()
+        await self.call("GET /users/{user_id}", "GET", f"/users/{user_id}")
+        await self.call("GET /posts/user/{user_id}", "GET", f"/posts/user/{user_id}")
+
+# Relative frequency of each journey
+JOURNEYS = {
+    "feed_scroll": 35,
+    "explore": 15,
+    "like": 15,
+    "dm": 10,
+    "comment": 8,
+    "follow": 7,
+    "login": 7,
+    "register": 3,
+}
+
+async def seed(client: httpx.AsyncClient, rng: random.Random, users: int, posts_per_user: int,
+               follows_per_user: int) -> List[dict]:
+    """Register users and give them posts with Zipf-weighted hashtags and random follows"""
+    semaphore = asyncio.Semaphore(16)
+    tag_weights = [1 / rank for rank in range(1, len(HASHTAGS) + 1)]
+    run_id = uuid.uuid4().hex[:6]
+
+    async def create_user(index: int) -> dict:
+        async with semaphore:
+            name = f"seed_{run_id}_{index}"
+            response = await client.post("/auth/register", json={
+                "username": name, "email": f"{name}@example.com", "password": PASSWORD
+            })
+            response.raise_for_status()
+            body = response.json()
+            headers = {"Authorization": f"Bearer {body['access_token']}"}
+            for i in range(posts_per_user):
+                tags = set(rng.choices(HASHTAGS, weights=tag_weights, k=rng.randint(0, 3)))
+                await client.post("/posts/", headers=headers, json={
+                    "text": f"Post {i} by {name}", "hashtags": sorted(tags)
+                })
+            return {"username": name, "user_id": body["user"]["user_id"], "token": body["access_token"]}
+
+    accounts = await asyncio.gather(*(create_user(i) for i in range(users)))
+    user_ids = [account["user_id"] for account in accounts]
+
+    async def follow(account: dict) -> None:
+        async with semaphore:
+            headers = {"Authorization": f"Bearer {account['token']}"}
+            for followee in rng.sample(user_ids, min(follows_per_user, len(user_ids))):
+                if followee != account["user_id"]:
+                    await client.post("/follows/", headers=headers, json={"followee_id": followee})
+
+    await asyncio.gather(*(follow(account) for account in accounts))
+    return accounts
+
+async def login_dataset_users(client: httpx.AsyncClient, rng: random.Random, dataset_users: int,
+                              accounts: int) -> List[dict]:
+    """Log in as users created by generate_dataset.py (user{id} / DATASET_PASSWORD)"""
+    semaphore = asyncio.Semaphore(16)
+
+    async def login(user_id: int) -> dict:
+        async with semaphore:
+            name = f"user{user_id}"
+            response = await client.post("/auth/login", json={"username": name, "password": DATASET_PASSWORD})
+            response.raise_for_status()
+            return {"username": name, "user_id": user_id, "token": response.json()["access_token"]}
+
+    picked = rng.sample(range(1, dataset_users + 1), min(accounts, dataset_users))
+    logged_in = await asyncio.gather(*(login(user_id) for user_id in picked))
+    # Journeys still target every generated user
+    for account in logged_in:
+        account["user_ids"] = list(range(1, dataset_users + 1))
+    return logged_in
+
+async def drive(client: httpx.AsyncClient, accounts: List[dict], args) -> dict:
+    recorder = Recorder()
+    user_ids = accounts[0].get("user_ids") or [account["user_id"] for account in accounts]
+    names, weights = zip(*JOURNEYS.items())
+    deadline = time.perf_counter() + args.duration
+
+    async def virtual_user(index: int) -> None:
+        rng = random.Random(args.seed * 1000 + index)
+        account = accounts[index % len(accounts)]
+        user = VirtualUser(client, recorder, rng, account["username"], account["user_id"], account["token"], user_ids)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights=weights)[0]
+            await getattr(user, f"journey_{name}")()
+            recorder.journeys[name] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(virtual_user(i) for i in range(args.concurrency)))
+    return recorder.summary(time.perf_counter() - start)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(database_url: str, workers: int) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "LOG_LEVEL": "WARNING",
+        "SLOW_QUERY_LOG_FILE": "",
+        "N_PLUS_ONE_THRESHOLD": "0",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            if httpx.get(f"{url}/health").status_code == 200:
+                return server, url
+        except httpx.HTTPError:
+            pass
+        if server.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Server did not start within 30 seconds")
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main_async(args, url: str) -> dict:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency + 16, max_keepalive_connections=args.concurrency + 16)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        seed_start = time.perf_counter()
+        if args.dataset_users:
+            accounts = await login_dataset_users(client, rng, args.dataset_users, args.concurrency)
+            print(f"Logged in {len(accounts)} dataset users in {time.perf_counter() - seed_start:.1f}s", file=sys.stderr)
+        else:
+            accounts = await seed(client, rng, args.users, args.posts_per_user, args.follows_per_user)
+            print(f"Seeded {len(accounts)} users in {time.perf_counter() - seed_start:.1f}s", file=sys.stderr)
+        return await drive(client, accounts, args)
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load test with scripted user journeys")
+    parser.add_argument("--url", help="Target a running server instead of starting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the started server")
+    parser.add_argument("--concurrency", type=int, default=50, help="Virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--users", type=int, default=50, help="Users to seed")
+    parser.add_argument("--posts-per-user", type=int, default=5)
+    parser.add_argument("--follows-per-user", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dataset-users", type=int, default=0,
+                        help="Use a generate_dataset.py dataset of this many users instead of seeding over HTTP")
+    parser.add_argument("--output", help="Also write the JSON result to this file")
+    args = parser.parse_args()
+
+    server = None
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url
+        if url is None:
+            database_url = f"sqlite:///{os.path.join(tmp, 'load.db')}"
+            if args.dataset_users:
+                subprocess.run(
+                    [sys.executable, "generate_dataset.py", "--users", str(args.dataset_users), "--seed", str(args.seed)],
+                    cwd=BACKEND_DIR, env={**os.environ, "DATABASE_URL": database_url}, check=True
+                )
+            server, url = start_server(database_url, args.workers)
+        try:
+            summary = asyncio.run(main_async(args, url))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    result = {
+        "benchmark": "http_load",
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "url": args.url or "local",
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "users": args.users,
+            "posts_per_user": args.posts_per_user,
+            "follows_per_user": args.follows_per_user,
+            "seed": args.seed,
+            "dataset_users": args.dataset_users,
+        },
+        **summary,
+    }
+    for label, stats in result["endpoints"].items():
+        print(f"{label:<40} {stats['requests']:>6} req {stats['requests_per_second']:>8.1f}/s "
+              f"p50 {stats['p50_ms']:>8} p95 {stats['p95_ms']:>8} p99 {stats['p99_ms']:>8} ms  errors {stats['errors']}",
+              file=sys.stderr)
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
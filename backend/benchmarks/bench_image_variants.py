@@ -0,0 +1,56 @@
+"""
+Benchmark image variant generation throughput with 1..N worker processes.
+
+Usage:
+    python -m benchmarks.bench_image_variants [--images 32] [--max-workers N]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from app.utils.images import generate_variants
+
+def make_images(directory: str, count: int) -> list:
+    """Write noisy 2400x1600 JPEGs, roughly the size of phone photos"""
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"bench_{i}.jpg")
+        Image.effect_noise((2400, 1600), 64).convert("RGB").save(path, "JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+def run(paths: list, output_dir: str, workers: int) -> float:
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(generate_variants, paths, [output_dir] * len(paths)))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Image variant throughput benchmark")
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_images(directory, args.images)
+        output_dir = os.path.join(directory, "variants")
+        workers = 1
+        while workers <= args.max_workers:
+            elapsed = run(paths, output_dir, workers)
+            results.append({
+                "workers": workers,
+                "images": args.images,
+                "seconds": round(elapsed, 3),
+                "images_per_second": round(args.images / elapsed, 2)
+            })
+            print(f"{workers:>3} workers: {args.images / elapsed:7.2f} images/s")
+            workers *= 2
+
+    print(json.dumps({"benchmark": "image_variants", "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
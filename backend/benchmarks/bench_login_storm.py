@@ -0,0 +1,90 @@
+"""
+Benchmark how a login storm affects other endpoints.
+
+While `--logins` concurrent clients log in repeatedly, a probe client
+calls the sync `/health` endpoint and records its latency. With the
+`shared` mode bcrypt runs in the anyio threadpool, as before hashing had
+its own pool; `dedicated` uses the app's PasswordHasher.
+
+Usage:
+    python -m benchmarks.bench_login_storm [--logins 64] [--probes 200]
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.concurrency import run_in_threadpool
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import auth as auth_router
+from app.utils.auth import PasswordHasher, password_hasher
+
+class ThreadpoolHasher(PasswordHasher):
+    """Hashes in the shared anyio threadpool, like a sync endpoint would"""
+
+    async def _run(self, fn, *args):
+        return await run_in_threadpool(fn, *args)
+
+def percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+def run(client: TestClient, credentials: dict, logins: int, probes: int) -> dict:
+    stop = threading.Event()
+    login_count = 0
+    lock = threading.Lock()
+
+    def storm():
+        nonlocal login_count
+        while not stop.is_set():
+            client.post("/auth/login", json=credentials)
+            with lock:
+                login_count += 1
+
+    latencies = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=logins) as executor:
+        for _ in range(logins):
+            executor.submit(storm)
+        time.sleep(0.5)
+        for _ in range(probes):
+            probe_start = time.perf_counter()
+            client.get("/health").raise_for_status()
+            latencies.append((time.perf_counter() - probe_start) * 1000)
+        stop.set()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "logins_per_second": round(login_count / elapsed, 1),
+        "health_p50_ms": round(statistics.median(latencies), 2),
+        "health_p99_ms": round(percentile(latencies, 0.99), 2),
+        "health_max_ms": round(max(latencies), 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Login storm benchmark")
+    parser.add_argument("--logins", type=int, default=64, help="Concurrent login clients")
+    parser.add_argument("--probes", type=int, default=200, help="Sequential /health calls to time")
+    args = parser.parse_args()
+
+    results = []
+    with TestClient(app) as client:
+        name = f"bench_{uuid.uuid4().hex[:12]}"
+        credentials = {"username": name, "password": "benchmark"}
+        client.post("/auth/register", json={**credentials, "email": f"{name}@example.com"}).raise_for_status()
+
+        for mode, hasher in (("shared", ThreadpoolHasher()), ("dedicated", password_hasher)):
+            auth_router.password_hasher = hasher
+            result = {"mode": mode, "logins": args.logins, **run(client, credentials, args.logins, args.probes)}
+            results.append(result)
+            print(f"{mode:>10}: {result['logins_per_second']:7.1f} logins/s, "
+                  f"/health p50 {result['health_p50_ms']} ms, p99 {result['health_p99_ms']} ms")
+        auth_router.password_hasher = password_hasher
+
+    print(json.dumps({"benchmark": "login_storm", "results": results, "hasher": password_hasher.stats()}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Micro-benchmarks of the response builders and the response serialization path.
+
+For pages of 20, 100 and 1000 objects, `build` runs build_post_response,
+build_user_response, build_message_response or build_comment_response over
+the page in a fresh Session, the way list endpoints do. `serialize` takes
+the built dicts through what FastAPI does with an endpoint's return value:
+validation against the route's response_model, serialization, and
+rendering by the route's response class. `fast` takes them through
+json_response() with the endpoint's response type instead, the path list
+endpoints use with FAST_JSON_RESPONSES on. Each stage is timed over --rounds
+rounds after a warm-up round, then run once more under tracemalloc for
+peak and retained memory.
+
+Fixtures are seeded into a throwaway SQLite database unless --database-url
+is given. With --compare, exits with status 1 if any stage's median time
+or peak memory grew by more than --max-regression against an earlier
+--output file.
+
+Usage:
+    python -m benchmarks.bench_serialization [--sizes 20,100,1000] [--rounds 5] [--output serialization.json]
+    python -m benchmarks.bench_serialization --compare serialization.json [--max-regression 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+from .bench_http_load import git_commit
+
+def configure(database_url: Optional[str]) -> None:
+    """Settings are read when app.config is imported, so this runs first"""
+    if database_url is None:
+        database_url = f"sqlite:///{tempfile.mkdtemp(prefix='pulse-bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "bench-secret-key")
+    os.environ["LOG_LEVEL"] = "WARNING"
+    os.environ["SLOW_QUERY_MS"] = "0"
+    os.environ["SLOW_QUERY_LOG_FILE"] = ""
+
+def seed(count: int) -> Dict[str, int]:
+    """
+    A viewer and an author with `count` followers, posts (with hashtags,
+    media, likes, saves and a comment each), comments on one post and
+    messages between the two. Returns the ids the pages are read with.
+    """
+    from app.database import Base, SessionLocal, engine
+    from app.models import Comment, Follow, Hashtag, Like, Message, Post, PostHashtag, SavedPost, User
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        viewer = User(username="bench_viewer", email="bench_viewer@example.com", hashed_password="!")
+        author = User(username="bench_author", email="bench_author@example.com", hashed_password="!",
+                      profile_info="Benchmark author", profile_picture="/uploads/avatar.jpg")
+        fans = [User(username=f"bench_fan{i}", email=f"bench_fan{i}@example.com", hashed_password="!",
+                     profile_picture=f"/uploads/fan{i}.jpg") for i in range(count)]
+        tags = [Hashtag(tag_name=f"bench{i}") for i in range(5)]
+        db.add_all([viewer, author, *fans, *tags])
+        db.flush()
+
+        posts = [
+            Post(user_id=author.user_id, text=f"Benchmark post {i} #bench{i % 5}",
+                 media=f"/uploads/post{i}.jpg" if i % 2 == 0 else None)
+            for i in range(count)
+        ]
+        db.add_all(posts)
+        db.flush()
+
+        rows = []
+        for i, (post, fan) in enumerate(zip(posts, fans)):
+            rows.append(PostHashtag(post_id=post.post_id, tag_id=tags[i % 5].tag_id))
+            rows.append(Like(post_id=post.post_id, user_id=fan.user_id))
+            rows.append(Comment(post_id=post.post_id, user_id=fan.user_id, text=f"Comment {i}"))
+            rows.append(Comment(post_id=posts[0].post_id, user_id=fan.user_id, text=f"Reply {i}"))
+            rows.append(Follow(follower_id=fan.user_id, followee_id=author.user_id))
+            rows.append(Message(
+                sender_id=viewer.user_id if i % 2 else author.user_id,
+                receiver_id=author.user_id if i % 2 else viewer.user_id,
+                content=f"Benchmark message {i}"
+            ))
+            if i % 3 == 0:
+                rows.append(Like(post_id=post.post_id, user_id=viewer.user_id))
+                rows.append(Follow(follower_id=viewer.user_id, followee_id=fan.user_id))
+            if i % 5 == 0:
+                rows.append(SavedPost(user_id=viewer.user_id, post_id=post.post_id))
+        db.add_all(rows)
+        db.commit()
+        return {"viewer_id": viewer.user_id, "author_id": author.user_id, "post_id": posts[0].post_id}
+    finally:
+        db.close()
+
+def cases(ids: Dict[str, int]) -> List[dict]:
+    """Per model: the page query, the builder and the route whose serialization path is used"""
+    from sqlalchemy import and_, or_
+    from app.models import Comment, Message, Post, User
+    from app.routers.comments import build_comment_response
+    from app.routers.messages import build_message_response
+    from app.routers.posts import build_post_response
+    from app.routers.users import build_user_response
+    from app.schemas import CommentResponse, MessageResponse, PostResponse, UserResponse
+
+    viewer_id, author_id = ids["viewer_id"], ids["author_id"]
+    return [
+        {
+            "model": "post",
+            "response_type": List[PostResponse],
+            "route": ("GET", "/posts/user/{user_id}"),
+            "page": lambda db, n: db.query(Post).filter(Post.user_id == author_id).order_by(Post.post_id).limit(n).all(),
+            "build": lambda obj, db: build_post_response(obj, viewer_id, db),
+        },
+        {
+            "model": "user",
+            "response_type": List[UserResponse],
+            "route": ("GET", "/users/"),
+            "page": lambda db, n: db.query(User).filter(User.username.like("bench_fan%")).order_by(User.user_id).limit(n).all(),
+            "build": lambda obj, db: build_user_response(obj, viewer_id, db),
+        },
+        {
+            "model": "message",
+            "response_type": List[MessageResponse],
+            "route": ("GET", "/messages/conversation/{user_id}"),
+            "page": lambda db, n: db.query(Message).filter(or_(
+                and_(Message.sender_id == viewer_id, Message.receiver_id == author_id),
+                and_(Message.sender_id == author_id, Message.receiver_id == viewer_id)
+            )).order_by(Message.message_id).limit(n).all(),
+            "build": lambda obj, db: build_message_response(obj, db),
+        },
+        {
+            "model": "comment",
+            "response_type": List[CommentResponse],
+            "route": ("GET", "/comments/post/{post_id}"),
+            "page": lambda db, n: db.query(Comment).filter(Comment.post_id == ids["post_id"]).order_by(Comment.comment_id).limit(n).all(),
+            "build": lambda obj, db: build_comment_response(obj, db),
+        },
+    ]
+
+def route_serializer(method: str, path: str) -> Callable[[list], bytes]:
+    """What FastAPI's request handler does with an endpoint's return value for this route"""
+    from fastapi.datastructures import DefaultPlaceholder
+    from fastapi.routing import APIRoute, serialize_response
+    from app.main import app
+
+    route = next(
+        r for r in app.routes
+        if isinstance(r, APIRoute) and r.path == path and method in r.methods
+    )
+    response_class = route.response_class
+    if isinstance(response_class, DefaultPlaceholder):
+        response_class = response_class.value
+    loop = asyncio.new_event_loop()
+
+    def serialize(content: list) -> bytes:
+        content = loop.run_until_complete(serialize_response(
+            field=route.response_field,
+            response_content=content,
+            include=route.response_model_include,
+            exclude=route.response_model_exclude,
+            by_alias=route.response_model_by_alias,
+            exclude_unset=route.response_model_exclude_unset,
+            exclude_defaults=route.response_model_exclude_defaults,
+            exclude_none=route.response_model_exclude_none,
+        ))
+        return response_class(content).body
+    return serialize
+
+def timed(stage: Callable[[], object], rounds: int) -> dict:
+    stage()
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        stage()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "min_ms": round(min(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "mean_ms": round(statistics.mean(times), 3),
+        "stddev_ms": round(statistics.stdev(times), 3) if len(times) > 1 else 0.0,
+    }
+
+def traced(stage: Callable[[], object]) -> dict:
+    """Peak memory while the stage runs and memory still held by its result"""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = stage()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {"peak_kb": round((peak - before) / 1024, 1), "retained_kb": round((current - before) / 1024, 1)}
+
+def bench_case(case: dict, size: int, rounds: int) -> List[dict]:
+    from app.database import SessionLocal
+
+    from app.utils.responses import json_response
+
+    serialize = route_serializer(*case["route"])
+
+    def fast(content: list) -> bytes:
+        return json_response(case["response_type"], content).body
+
+    def build() -> list:
+        # A fresh Session per round, as each request gets one
+        db = SessionLocal()
+        try:
+            return [case["build"](obj, db) for obj in case["page"](db, size)]
+        finally:
+            db.close()
+
+    built = build()
+    assert len(built) == size, f"Seeded {len(built)} {case['model']} rows, need {size}"
+    body_bytes = len(serialize(built))
+
+    results = []
+    stages = (
+        ("build", build),
+        ("serialize", lambda: serialize(built)),
+        ("fast", lambda: fast(built)),
+        ("total", lambda: serialize(build())),
+    )
+    for stage, run in stages:
+        result = {"model": case["model"], "size": size, "stage": stage, **timed(run, rounds), **traced(run)}
+        result["per_object_us"] = round(result["median_ms"] * 1000 / size, 2)
+        if stage != "build":
+            result["body_bytes"] = body_bytes
+        results.append(result)
+        print(f"{case['model']:>8} {size:>5} {stage:>9}: median {result['median_ms']:9.3f} ms "
+              f"({result['per_object_us']:8.2f} us/object), peak {result['peak_kb']:9.1f} KiB", file=sys.stderr)
+    return results
+
+def regressions(results: List[dict], baseline: List[dict], max_regression: float) -> List[str]:
+    base = {(r["model"], r["size"], r["stage"]): r for r in baseline}
+    found = []
+    for result in results:
+        previous = base.get((result["model"], result["size"], result["stage"]))
+        if previous is None:
+            continue
+        for key in ("median_ms", "peak_kb"):
+            if previous[key] > 0 and result[key] > previous[key] * (1 + max_regression):
+                found.append(
+                    f"{result['model']} size {result['size']} {result['stage']}: "
+                    f"{key} {previous[key]} -> {result[key]} (+{result[key] / previous[key] - 1:.0%})"
+                )
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Response builder and serialization micro-benchmarks")
+    parser.add_argument("--sizes", default="20,100,1000", help="Comma-separated page sizes")
+    parser.add_argument("--rounds", type=int, default=5, help="Timed rounds per stage")
+    parser.add_argument("--models", default="post,user,message,comment")
+    parser.add_argument("--database-url", default=None, help="Defaults to a throwaway SQLite database")
+    parser.add_argument("--output", default=None, help="Also write the JSON results to this file")
+    parser.add_argument("--compare", default=None, help="Earlier --output file to check for regressions")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed growth, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    configure(args.database_url)
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    models = args.models.split(",")
+    ids = seed(sizes[-1])
+
+    results = []
+    for case in cases(ids):
+        if case["model"] in models:
+            for size in sizes:
+                results.extend(bench_case(case, size, args.rounds))
+
+    report = {
+        "benchmark": "serialization",
+        "commit": git_commit(),
+        "rounds": args.rounds,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline["results"], args.max_regression)
+        for line in found:
+            print(f"❌ {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+        print(f"✅ No regressions against {baseline.get('commit') or args.compare}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Delete uploaded files that were never attached to a post, story or profile.
+
+Usage:
+    python reclaim_media.py [--older-than-hours 1]
+"""
+import argparse
+from datetime import timedelta
+from app.database import SessionLocal
+from app.utils.media_store import reclaim_orphans
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--older-than-hours", type=float, default=1, help="Keep newer uploads")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        reclaimed = reclaim_orphans(db, timedelta(hours=args.older_than_hours))
+        print(f"✅ Reclaimed {reclaimed} unused files")
+    except Exception as e:
+        print(f"❌ Error reclaiming files: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
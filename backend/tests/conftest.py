@@ -0,0 +1,148 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List
+
+# Settings are read when app.config is imported, so configure the test
+# environment first. A file database rather than :memory: because the sync
+# and async engines would each get their own empty in-memory database.
+_TEST_DIR = tempfile.mkdtemp(prefix="pulse-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_TEST_DIR}/test.db",
+    "DATABASE_REPLICA_URLS": "",
+    "SECRET_KEY": "test-secret-key",
+    "ENVIRONMENT": "development",
+    "DEBUG": "false",
+    "LOG_LEVEL": "WARNING",
+    "SLOW_QUERY_LOG_FILE": "",
+    "N_PLUS_ONE_THRESHOLD": "0",
+    "BCRYPT_ROUNDS": "4",
+    # Caches would make statement counts depend on test order
+    "AUTH_USER_CACHE_TTL_SECONDS": "0",
+    "STORY_TRAY_CACHE_TTL_SECONDS": "0",
+    "STORY_EXPIRY_ENABLED": "false",
+    "IMAGE_VARIANTS_ENABLED": "false",
+    "PROFILING_ADMIN_TOKEN": "test-profiling-token",
+    "PROFILING_DIR": os.path.join(_TEST_DIR, "profiles"),
+})
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.main import app
+from app.database import SessionLocal
+from app.models import (
+    User, Post, Comment, Like, Follow, Message, Notification,
+    Story, Hashtag, PostHashtag, SavedPost
+)
+from app.utils.auth import create_access_token, get_password_hash
+from app.utils.query_stats import statement_shape
+
+# Rows behind every list endpoint; more than the largest page size tested
+ROWS = 60
+PASSWORD = "test-password"
+
+class StatementRecorder:
+    """SQL statements executed by any engine while `record()` is active"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+        self._active = False
+        self._lock = threading.Lock()
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._active:
+            with self._lock:
+                self.statements.append(statement_shape(statement))
+
+    @contextmanager
+    def record(self):
+        self.statements = []
+        self._active = True
+        try:
+            yield self.statements
+        finally:
+            self._active = False
+
+    def close(self) -> None:
+        event.remove(Engine, "before_cursor_execute", self._before_cursor_execute)
+
+@pytest.fixture(scope="session")
+def client():
+    # Not used as a context manager, so the lifespan's background workers stay off
+    return TestClient(app)
+
+@pytest.fixture(scope="session")
+def recorder():
+    recorder = StatementRecorder()
+    yield recorder
+    recorder.close()
+
+def make_user(db, name: str) -> User:
+    user = User(username=name, email=f"{name}@example.com", hashed_password=get_password_hash(PASSWORD))
+    db.add(user)
+    db.flush()
+    return user
+
+def auth_headers(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+@pytest.fixture(scope="session")
+def seed():
+    """
+    A viewer and an author with ROWS of everything the list endpoints
+    return: posts (tagged, liked, commented, saved), followers, followees,
+    conversations, messages, notifications and stories.
+    """
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        viewer = make_user(db, "viewer")
+        author = make_user(db, "author")
+        fans = [make_user(db, f"fan{i}") for i in range(ROWS)]
+
+        tag = Hashtag(tag_name="pulse")
+        tags = [Hashtag(tag_name=f"pulse{i}") for i in range(ROWS)]
+        posts = [Post(user_id=author.user_id, text=f"Post {i} #pulse #pulse{i}") for i in range(ROWS)]
+        db.add_all([tag, *tags, *posts])
+        db.flush()
+
+        for i, post in enumerate(posts):
+            db.add(PostHashtag(post_id=post.post_id, tag_id=tag.tag_id))
+            db.add(PostHashtag(post_id=post.post_id, tag_id=tags[i].tag_id))
+            db.add(Like(post_id=post.post_id, user_id=viewer.user_id))
+            db.add(Like(post_id=post.post_id, user_id=fans[i].user_id))
+            db.add(Comment(post_id=post.post_id, user_id=fans[i].user_id, text=f"Comment {i}"))
+            db.add(SavedPost(user_id=viewer.user_id, post_id=post.post_id))
+        comments_post = posts[0]
+        comments = [Comment(post_id=comments_post.post_id, user_id=fan.user_id, text="Nice") for fan in fans]
+        db.add_all(comments)
+
+        db.add(Follow(follower_id=viewer.user_id, followee_id=author.user_id))
+        for fan in fans:
+            db.add(Follow(follower_id=fan.user_id, followee_id=author.user_id))
+            db.add(Follow(follower_id=author.user_id, followee_id=fan.user_id))
+            db.add(Follow(follower_id=viewer.user_id, followee_id=fan.user_id))
+            db.add(Message(sender_id=fan.user_id, receiver_id=viewer.user_id, content="Hello"))
+            db.add(Story(user_id=fan.user_id, media="/uploads/story.jpg", expiration_time=now + timedelta(hours=12)))
+
+        for i in range(ROWS):
+            sender, receiver = (viewer, author) if i % 2 else (author, viewer)
+            db.add(Message(sender_id=sender.user_id, receiver_id=receiver.user_id, content=f"Message {i}"))
+            db.add(Notification(user_id=viewer.user_id, type="like", content=f"Notification {i}"))
+            db.add(Story(user_id=author.user_id, media="/uploads/story.jpg", expiration_time=now + timedelta(hours=12)))
+
+        db.commit()
+        return {
+            "viewer_id": viewer.user_id,
+            "author_id": author.user_id,
+            "post_id": comments_post.post_id,
+            "comment_id": comments[0].comment_id,
+            "story_id": db.query(Story.story_id).filter(Story.user_id == author.user_id).first()[0],
+        }
+    finally:
+        db.close()
@@ -0,0 +1,136 @@
+"""
+Response compression and conditional GET.
+
+Mutations here use their own users and posts and never create hashtags,
+so the seeded rows other tests count statements against stay the same.
+"""
+import itertools
+import pytest
+from app.database import SessionLocal
+from app.models import Hashtag, Post, PostHashtag
+from app.utils.metrics import not_modified_bytes
+from conftest import auth_headers, make_user
+
+_stranger_ids = itertools.count()
+
+@pytest.fixture
+def stranger(seed):
+    db = SessionLocal()
+    try:
+        user = make_user(db, f"stranger{next(_stranger_ids)}")
+        db.commit()
+        return user.user_id
+    finally:
+        db.close()
+
+def revalidate(client, path: str, headers: dict):
+    first = client.get(path, headers=headers)
+    assert first.status_code == 200, first.text
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    assert first.headers["cache-control"] == "private, no-cache"
+    second = client.get(path, headers={**headers, "If-None-Match": etag})
+    return first, second
+
+def test_large_json_is_gzipped(client, seed):
+    response = client.get(
+        f"/posts/user/{seed['author_id']}", params={"limit": 50},
+        headers={**auth_headers(seed["viewer_id"]), "Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert len(response.json()) == 50
+
+def test_identity_and_small_bodies_are_not_compressed(client, seed):
+    response = client.get(
+        f"/posts/user/{seed['author_id']}", params={"limit": 50},
+        headers={**auth_headers(seed["viewer_id"]), "Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in response.headers
+    assert "content-encoding" not in client.get("/health", headers={"Accept-Encoding": "gzip"}).headers
+
+@pytest.mark.parametrize("path", ["/users/{author_id}", "/posts/{post_id}", "/hashtags/"])
+def test_matching_etag_gets_304(client, seed, path):
+    path = path.format(**seed)
+    before = not_modified_bytes.totals()
+    first, second = revalidate(client, path, auth_headers(seed["viewer_id"]))
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == first.headers["etag"]
+    saved = sum(not_modified_bytes.totals().values()) - sum(before.values())
+    assert saved == int(first.headers["content-length"])
+
+def test_etag_depends_on_viewer(client, seed, stranger):
+    path = f"/posts/{seed['post_id']}"
+    viewer = client.get(path, headers=auth_headers(seed["viewer_id"]))
+    other = client.get(path, headers={**auth_headers(stranger), "If-None-Match": viewer.headers["etag"]})
+    assert other.status_code == 200
+    assert other.headers["etag"] != viewer.headers["etag"]
+
+def test_etags_change_with_the_data(client, seed, stranger):
+    headers = auth_headers(stranger)
+    paths = [f"/users/{seed['author_id']}", f"/posts/{seed['post_id']}", "/hashtags/"]
+    etags = {path: client.get(path, headers=headers).headers["etag"] for path in paths}
+
+    client.post("/follows/", json={"followee_id": seed["author_id"]}, headers=headers)
+    client.post("/likes/", json={"post_id": seed["post_id"]}, headers=headers)
+    db = SessionLocal()
+    try:
+        post = Post(user_id=stranger, text="Tagged")
+        db.add(post)
+        db.flush()
+        tag = db.query(Hashtag).filter(Hashtag.tag_name == "pulse0").one()
+        db.add(PostHashtag(post_id=post.post_id, tag_id=tag.tag_id))
+        db.commit()
+    finally:
+        db.close()
+
+    for path, etag in etags.items():
+        response = client.get(path, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200, path
+        assert response.headers["etag"] != etag
+
+def test_replacing_hashtags_changes_the_post_etag(client, seed, stranger):
+    headers = auth_headers(stranger)
+    post_id = client.post("/posts/", json={"text": "Mine #pulse1"}, headers=headers).json()["post_id"]
+    etag = client.get(f"/posts/{post_id}", headers=headers).headers["etag"]
+    client.put(f"/posts/{post_id}", json={"hashtags": ["pulse2"]}, headers=headers)
+    response = client.get(f"/posts/{post_id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["hashtags"] == ["pulse2"]
+
+def test_hashtag_links_are_part_of_the_post_etag(client, seed, stranger):
+    headers = auth_headers(stranger)
+    post_id = client.post("/posts/", json={"text": "Mine", "hashtags": ["pulse3"]}, headers=headers).json()["post_id"]
+    etag = client.get(f"/posts/{post_id}", headers=headers).headers["etag"]
+    db = SessionLocal()
+    try:
+        # Linked without touching the post's updated_at
+        other_tag_id = db.query(Hashtag.tag_id).filter(Hashtag.tag_name != "pulse3").first()[0]
+        db.add(PostHashtag(post_id=post_id, tag_id=other_tag_id))
+        db.commit()
+    finally:
+        db.close()
+    response = client.get(f"/posts/{post_id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()["hashtags"]) == 2
+
+def test_moving_a_hashtag_link_changes_the_trending_etag(client, seed, stranger):
+    headers = auth_headers(stranger)
+    post_id = client.post("/posts/", json={"text": "Mine", "hashtags": ["pulse4"]}, headers=headers).json()["post_id"]
+    client.post("/posts/", json={"text": "Mine", "hashtags": ["pulse5"]}, headers=headers)
+    etag = client.get("/hashtags/", params={"limit": 100}).headers["etag"]
+    db = SessionLocal()
+    try:
+        # Same link count, max post id and updated_at; only the per-tag counts move
+        tag_id = db.query(Hashtag.tag_id).filter(Hashtag.tag_name == "pulse5").scalar()
+        db.query(PostHashtag).filter(PostHashtag.post_id == post_id).update({PostHashtag.tag_id: tag_id})
+        db.commit()
+    finally:
+        db.close()
+    response = client.get("/hashtags/", params={"limit": 100}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    # Sorted by post count, so pulse5 now comes first
+    names = [tag["tag_name"] for tag in response.json()]
+    assert names.index("pulse5") < names.index("pulse4")
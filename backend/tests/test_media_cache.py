@@ -0,0 +1,29 @@
+"""
+MediaCache revalidation against files changed or deleted elsewhere.
+"""
+import os
+from app.utils.media_serving import MediaCache
+
+def cache_file(cache: MediaCache, path, content: bytes) -> None:
+    path.write_bytes(content)
+    cache.put("a.jpg", content, {}, str(path), os.stat(path).st_mtime_ns)
+
+def test_deleted_file_is_dropped_on_revalidation(tmp_path):
+    cache = MediaCache(revalidate_seconds=0)
+    cache_file(cache, tmp_path / "a.jpg", b"avatar")
+    assert cache.get("a.jpg").content == b"avatar"
+    os.remove(tmp_path / "a.jpg")
+    assert cache.get("a.jpg") is None
+    assert cache.size == 0
+
+def test_replaced_file_is_dropped_on_revalidation(tmp_path):
+    cache = MediaCache(revalidate_seconds=0)
+    cache_file(cache, tmp_path / "a.jpg", b"avatar")
+    (tmp_path / "a.jpg").write_bytes(b"new avatar")
+    assert cache.get("a.jpg") is None
+
+def test_hits_within_the_interval_skip_the_stat(tmp_path):
+    cache = MediaCache(revalidate_seconds=60)
+    cache_file(cache, tmp_path / "a.jpg", b"avatar")
+    os.remove(tmp_path / "a.jpg")
+    assert cache.get("a.jpg").content == b"avatar"
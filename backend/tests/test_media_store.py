@@ -0,0 +1,63 @@
+"""
+Content-addressed storage under concurrent uploads and releases.
+"""
+import hashlib
+import os
+import pytest
+from sqlalchemy import event
+from app.database import SessionLocal
+from app.models import MediaFile
+from app.utils import media_store
+from app.utils.media_store import content_name, content_path, store_upload
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_store, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+def write(path, content: bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+def test_concurrent_identical_upload_is_deduplicated(seed, upload_dir):
+    content = b"uploaded twice at once"
+    digest = hashlib.sha256(content).hexdigest()
+    db = SessionLocal()
+
+    @event.listens_for(db, "before_flush", once=True)
+    def other_upload_commits_first(session, flush_context, instances):
+        other = SessionLocal()
+        other.add(MediaFile(digest=digest, extension=".jpg", size=len(content), ref_count=0))
+        other.commit()
+        other.close()
+        write(content_path(digest, ".jpg"), content)
+
+    try:
+        tmp = write(upload_dir / "tmp", content)
+        media, created = store_upload(db, tmp, digest, ".jpg", len(content), None)
+        assert not created
+        assert media.digest == digest
+        assert not os.path.exists(tmp)
+    finally:
+        db.close()
+
+def test_released_file_is_kept_if_uploaded_again(seed, upload_dir):
+    content = b"released and uploaded again"
+    digest = hashlib.sha256(content).hexdigest()
+    path = write(content_path(digest, ".jpg"), content)
+    db = SessionLocal()
+    try:
+        db.add(MediaFile(digest=digest, extension=".jpg", size=len(content), ref_count=0))
+        db.commit()
+        media_store._remove_files(db, content_name(digest, ".jpg"))
+        assert open(path, "rb").read() == content
+
+        db.query(MediaFile).filter(MediaFile.digest == digest).delete()
+        db.commit()
+        media_store._remove_files(db, content_name(digest, ".jpg"))
+        assert not os.path.exists(path)
+        assert not os.path.exists(path + ".removing")
+    finally:
+        db.close()
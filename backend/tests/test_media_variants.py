@@ -0,0 +1,43 @@
+"""
+Variant URLs are only advertised once the variants are generated.
+"""
+import hashlib
+from app.config import settings
+from app.database import SessionLocal
+from app.models import MediaFile
+from app.utils.images import media_variants
+from app.utils.media_store import content_url, mark_variants_ready
+from conftest import auth_headers, make_user
+
+def test_disabled_or_pending_variants_are_not_advertised(monkeypatch):
+    url = "/uploads/1_photo.jpg"
+    assert media_variants(url, False) is None
+    monkeypatch.setattr(settings, "IMAGE_VARIANTS_ENABLED", False)
+    assert media_variants(url, True) is None
+    monkeypatch.setattr(settings, "IMAGE_VARIANTS_ENABLED", True)
+    assert media_variants(url, True)["thumb"]["webp"] == "/uploads/variants/1_photo_thumb.webp"
+
+def test_posts_advertise_variants_once_ready(client, seed, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_VARIANTS_ENABLED", True)
+    digest = hashlib.sha256(b"variants test").hexdigest()
+    url = content_url(digest, ".jpg")
+    db = SessionLocal()
+    try:
+        user_id = make_user(db, "variants").user_id
+        db.add(MediaFile(digest=digest, extension=".jpg", size=1, ref_count=0, uploader_id=user_id))
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.post("/posts/", json={"text": "pending", "media": url}, headers=auth_headers(user_id))
+    assert response.status_code == 201, response.text
+    post_id = response.json()["post_id"]
+    assert response.json()["media_variants"] is None
+
+    db = SessionLocal()
+    try:
+        mark_variants_ready(db, url)
+    finally:
+        db.close()
+    variants = client.get(f"/posts/{post_id}", headers=auth_headers(user_id)).json()["media_variants"]
+    assert variants["medium"]["jpg"].endswith(f"{digest}_medium.jpg")
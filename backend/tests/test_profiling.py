@@ -0,0 +1,29 @@
+"""
+ProfileStore keeps its index on disk, shared by every worker process.
+"""
+from collections import Counter
+from app.utils.profiling import ProfileStore
+
+def save(store: ProfileStore, n: int) -> dict:
+    entry = {"profile_id": f"2030010100000{n}-0000000{n}", "method": "GET", "route": "/posts/"}
+    return store.save(entry, Counter({("main", "handler"): 3}), 0.001)
+
+def test_profiles_are_listed_and_capped_across_processes(tmp_path):
+    # Two stores on one directory stand in for two worker processes
+    first = ProfileStore(str(tmp_path), max_profiles=2)
+    second = ProfileStore(str(tmp_path), max_profiles=2)
+    save(first, 1)
+    save(second, 2)
+    assert [e["profile_id"] for e in first.list()] == ["20300101000002-00000002", "20300101000001-00000001"]
+
+    save(first, 3)
+    assert [e["profile_id"] for e in second.list()] == ["20300101000003-00000003", "20300101000002-00000002"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "20300101000002-00000002.meta.json",
+        "20300101000002-00000002.speedscope.json",
+        "20300101000003-00000003.meta.json",
+        "20300101000003-00000003.speedscope.json",
+    ]
+    assert second.path("20300101000003-00000003").endswith("20300101000003-00000003.speedscope.json")
+    assert second.path("20300101000001-00000001") is None
+    assert second.path("../20300101000003-00000003") is None
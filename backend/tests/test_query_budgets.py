@@ -0,0 +1,297 @@
+"""
+Query budgets: the most SQL statements each route may run.
+
+Every route in app/routers is called against the seeded database and its
+statements are counted. List endpoints are called with page sizes 1 and 50
+and must run the same statements for both, so a new N+1 shows up as a
+diff instead of as a slow page in production. Routes that still run
+statements per row declare `per_row`; their page-size check is an expected
+failure until they are fixed, and their budget grows with the page size.
+
+When a route changes on purpose, update its budget here in the same commit.
+"""
+import difflib
+import itertools
+from collections import Counter
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+import pytest
+from fastapi.routing import APIRoute
+from app.main import app
+from app.database import SessionLocal
+from app.models import Post, Comment, Like, Follow, Message, Notification, Story, SavedPost
+from conftest import PASSWORD, ROWS, auth_headers, make_user
+
+PAGE_SIZES = (1, 50)
+PROFILING_HEADERS = {"X-Profile-Token": "test-profiling-token"}
+
+@dataclass
+class Case:
+    method: str
+    path: str  # Route template, formatted with the seeded and set-up ids
+    budget: int  # Statements allowed, plus per_row for each row returned
+    per_row: int = 0  # Known N+1: extra statements allowed per row returned
+    page_param: Optional[str] = None  # Set for list endpoints
+    rows_key: Optional[str] = None  # Key of the rows when a list endpoint returns an object
+    params: Dict[str, str] = field(default_factory=dict)
+    json: Optional[Callable[[dict], dict]] = None
+    # Creates the rows a mutation needs, owned by ids["actor_id"]; returns extra ids
+    setup: Optional[Callable[..., dict]] = None
+    user: Optional[str] = "viewer"  # viewer, actor or None for anonymous
+    headers: Dict[str, str] = field(default_factory=dict)
+    status: Optional[int] = None  # Expected status, default any success
+
+    @property
+    def route(self) -> str:
+        return f"{self.method} {self.path}"
+
+def own_post(db, ids):
+    post = Post(user_id=ids["actor_id"], text="Mine")
+    db.add(post)
+    db.flush()
+    return {"post_id": post.post_id}
+
+def own_comment(db, ids):
+    comment = Comment(post_id=ids["post_id"], user_id=ids["actor_id"], text="Mine")
+    db.add(comment)
+    db.flush()
+    return {"comment_id": comment.comment_id}
+
+def own_like(db, ids):
+    db.add(Like(post_id=ids["post_id"], user_id=ids["actor_id"]))
+    return {}
+
+def own_follow(db, ids):
+    db.add(Follow(follower_id=ids["actor_id"], followee_id=ids["author_id"]))
+    return {"followee_id": ids["author_id"]}
+
+def own_message(db, ids):
+    message = Message(sender_id=ids["actor_id"], receiver_id=ids["viewer_id"], content="Mine")
+    db.add(message)
+    db.flush()
+    return {"message_id": message.message_id}
+
+def own_conversation(db, ids):
+    # Unread messages, so every call also marks them read
+    for i in range(ROWS):
+        sender, receiver = (ids["actor_id"], ids["user_id"]) if i % 2 else (ids["user_id"], ids["actor_id"])
+        db.add(Message(sender_id=sender, receiver_id=receiver, content="Hi"))
+    return {}
+
+def own_notifications(db, ids):
+    notifications = [Notification(user_id=ids["actor_id"], type="like", content="Liked") for _ in range(5)]
+    db.add_all(notifications)
+    db.flush()
+    return {"notification_id": notifications[0].notification_id}
+
+def own_story(db, ids):
+    story = Story(user_id=ids["actor_id"], media="/uploads/story.jpg", expiration_time=ids["expires_at"])
+    db.add(story)
+    db.flush()
+    return {"story_id": story.story_id}
+
+def own_saved_post(db, ids):
+    db.add(SavedPost(user_id=ids["actor_id"], post_id=ids["post_id"]))
+    return {}
+
+LIST_CASES = [
+    Case("GET", "/users/", 2, per_row=4, page_param="limit", params={"query": "fan"}),
+    Case("GET", "/posts/", 8, page_param="limit"),
+    Case("GET", "/posts/user/{user_id}", 8, page_param="limit"),
+    Case("GET", "/comments/post/{post_id}", 2, per_row=1, page_param="limit"),
+    Case("GET", "/follows/followers/{user_id}", 2, page_param="limit"),
+    Case("GET", "/follows/following/{user_id}", 2, page_param="limit"),
+    # Marks the conversation read: one UPDATE and one executemany sync-change INSERT
+    Case("GET", "/messages/conversation/{user_id}", 8, page_param="limit", user="actor", setup=own_conversation),
+    Case("GET", "/messages/sync", 4, page_param="limit", rows_key="messages"),
+    Case("GET", "/notifications/", 2, page_param="limit"),
+    Case("GET", "/notifications/sync", 3, page_param="limit", rows_key="notifications"),
+    Case("GET", "/stories/", 3, per_row=1, page_param="limit"),
+    # One count per hashtag in the table, whatever the page size
+    Case("GET", "/hashtags/", ROWS + 4, page_param="limit"),
+    Case("GET", "/hashtags/{tag_name}/posts", 3, per_row=5, page_param="limit"),
+    Case("GET", "/hashtags/search/{query}", 1, per_row=1, page_param="limit"),
+    Case("GET", "/saved/", 3, per_row=5, page_param="limit"),
+]
+
+CASES = [
+    # Auth
+    Case("POST", "/auth/register", 4, user=None,
+         json=lambda ids: {"username": "newcomer", "email": "newcomer@example.com", "password": PASSWORD}),
+    Case("POST", "/auth/login", 1, user=None,
+         json=lambda ids: {"username": ids["actor_name"], "password": PASSWORD}),
+    Case("POST", "/auth/debug-token", 0, user=None, json=lambda ids: {"token": "not-a-token"}),
+    # Users
+    Case("GET", "/users/me", 1),
+    Case("GET", "/users/username/{username}", 1),
+    Case("PUT", "/users/me", 4, user="actor", json=lambda ids: {"profile_info": "Updated"}),
+    Case("DELETE", "/users/me", 17, user="actor"),
+    Case("GET", "/users/{user_id}/stats", 4),
+    Case("GET", "/users/{user_id}", 7),
+    # Posts
+    Case("POST", "/posts/", 16, user="actor", json=lambda ids: {"text": "New #budget", "hashtags": ["budget"]}),
+    Case("GET", "/posts/{post_id}", 9),
+    Case("PUT", "/posts/{post_id}", 11, user="actor", setup=own_post, json=lambda ids: {"text": "Edited #budget"}),
+    Case("DELETE", "/posts/{post_id}", 7, user="actor", setup=own_post),
+    # Comments
+    Case("POST", "/comments/", 9, user="actor", json=lambda ids: {"post_id": ids["post_id"], "text": "Hi"}),
+    Case("GET", "/comments/{comment_id}", 2),
+    Case("PUT", "/comments/{comment_id}", 5, user="actor", setup=own_comment, json=lambda ids: {"text": "Edited"}),
+    Case("DELETE", "/comments/{comment_id}", 3, user="actor", setup=own_comment),
+    # Likes
+    Case("POST", "/likes/", 9, user="actor", json=lambda ids: {"post_id": ids["post_id"]}),
+    Case("DELETE", "/likes/{post_id}", 3, user="actor", setup=own_like),
+    Case("GET", "/likes/post/{post_id}/count", 2),
+    Case("GET", "/likes/post/{post_id}/check", 2),
+    # Follows
+    Case("POST", "/follows/", 9, user="actor", json=lambda ids: {"followee_id": ids["author_id"]}),
+    Case("DELETE", "/follows/{followee_id}", 4, user="actor", setup=own_follow),
+    Case("GET", "/follows/check/{followee_id}", 2),
+    # Messages
+    Case("POST", "/messages/", 5, user="actor", json=lambda ids: {"receiver_id": ids["viewer_id"], "content": "Hi"}),
+    Case("GET", "/messages/conversations", 5),
+    Case("DELETE", "/messages/{message_id}", 4, user="actor", setup=own_message),
+    Case("GET", "/messages/unread/count", 2),
+    # Notifications
+    Case("GET", "/notifications/unread/count", 2),
+    Case("PUT", "/notifications/{notification_id}", 5, user="actor", setup=own_notifications,
+         json=lambda ids: {"is_read": 1}),
+    Case("PUT", "/notifications/mark-all-read", 4, user="actor", setup=own_notifications),
+    Case("DELETE", "/notifications/{notification_id}", 4, user="actor", setup=own_notifications),
+    Case("DELETE", "/notifications/clear-all", 4, user="actor", setup=own_notifications),
+    # Stories
+    Case("POST", "/stories/", 5, user="actor", json=lambda ids: {"media": "/uploads/story.jpg"}),
+    Case("GET", "/stories/tray", 4),
+    Case("GET", "/stories/user/{user_id}", ROWS + 2),  # Known N+1: not paginated, one query per story,
+    Case("GET", "/stories/{story_id}", 2),
+    Case("POST", "/stories/{story_id}/seen", 3, user="actor"),
+    Case("POST", "/stories/{story_id}/view", 2, user="actor"),
+    Case("GET", "/stories/{story_id}/views", 3, user="actor", setup=own_story),
+    Case("DELETE", "/stories/{story_id}", 4, user="actor", setup=own_story),
+    Case("DELETE", "/stories/cleanup/expired", 2, user=None),
+    # Hashtags
+    Case("GET", "/hashtags/{tag_name}", 2, user=None),
+    # Saved posts
+    Case("POST", "/saved/{post_id}", 5, user="actor"),
+    Case("DELETE", "/saved/{post_id}", 3, user="actor", setup=own_saved_post),
+    Case("GET", "/saved/check/{post_id}", 2),
+    Case("POST", "/saved/toggle/{post_id}", 4, user="actor"),
+    # Debug
+    Case("GET", "/debug/profiles/", 0, user=None, headers=PROFILING_HEADERS),
+    Case("GET", "/debug/profiles/{profile_id}", 0, user=None, headers=PROFILING_HEADERS, status=404),
+    Case("GET", "/debug/slow-queries/", 0, user=None, headers=PROFILING_HEADERS),
+    Case("DELETE", "/debug/slow-queries/", 0, user=None, headers=PROFILING_HEADERS),
+]
+
+# Routes without a budget, and why
+EXEMPT = {
+    "POST /upload/image": "writes into backend/uploads; body streaming is covered by tests/test_uploads.py",
+    "DELETE /upload/image/{filename}": "removes files from the upload directory",
+}
+
+def statement_summary(statements: List[str]) -> str:
+    lines = [f"  {count}x {shape}" for shape, count in Counter(statements).most_common()]
+    return "\n".join(lines)
+
+def call(client, recorder, case: Case, ids: dict, params: Optional[dict] = None):
+    headers = dict(case.headers)
+    if case.user is not None:
+        headers.update(auth_headers(ids[f"{case.user}_id"]))
+    json = case.json(ids) if case.json is not None else None
+    with recorder.record() as statements:
+        response = client.request(
+            case.method, case.path.format(**ids), params={**case.params, **(params or {})},
+            json=json, headers=headers
+        )
+    if case.status is not None:
+        assert response.status_code == case.status, response.text
+    else:
+        assert response.status_code < 400, f"{case.route}: {response.status_code} {response.text}"
+    return response, list(statements)
+
+def check_budget(case: Case, statements: List[str], rows: int = 0) -> None:
+    allowed = case.budget + case.per_row * rows
+    assert len(statements) <= allowed, (
+        f"{case.route} ran {len(statements)} statements, budget is {allowed}:\n"
+        + statement_summary(statements)
+    )
+
+_actor_ids = itertools.count()
+
+@pytest.fixture
+def ids(seed):
+    """Seeded ids plus a fresh actor for mutations, so tests do not depend on order"""
+    ids = {
+        **seed,
+        # Path parameters of the read endpoints
+        "user_id": seed["author_id"],
+        "username": "author",
+        "followee_id": seed["author_id"],
+        "tag_name": "pulse",
+        "query": "pulse",
+        "profile_id": "missing",
+        "expires_at": datetime.utcnow() + timedelta(hours=12),
+    }
+    db = SessionLocal()
+    try:
+        actor = make_user(db, f"actor{next(_actor_ids)}")
+        ids.update(actor_id=actor.user_id, actor_name=actor.username)
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+def with_setup(case: Case, ids: dict) -> dict:
+    if case.setup is None:
+        return ids
+    db = SessionLocal()
+    try:
+        ids = {**ids, **case.setup(db, ids)}
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.route)
+def test_query_budget(client, recorder, ids, case):
+    response, statements = call(client, recorder, case, with_setup(case, ids))
+    check_budget(case, statements)
+
+@pytest.mark.parametrize("page_size", PAGE_SIZES)
+@pytest.mark.parametrize("case", LIST_CASES, ids=lambda case: case.route)
+def test_list_query_budget(client, recorder, ids, case, page_size):
+    response, statements = call(client, recorder, case, with_setup(case, ids), {case.page_param: page_size})
+    rows = response.json()
+    if case.rows_key is not None:
+        rows = rows[case.rows_key]
+    assert len(rows) == page_size, f"{case.route} returned {len(rows)} rows, seed more data"
+    check_budget(case, statements, page_size)
+
+@pytest.mark.parametrize("case", [
+    pytest.param(case, marks=pytest.mark.xfail(
+        reason=f"known N+1: {case.per_row} statements per row", strict=True
+    )) if case.per_row else case
+    for case in LIST_CASES
+], ids=lambda case: case.route)
+def test_list_statements_independent_of_page_size(client, recorder, ids, case):
+    small, large = (
+        sorted(call(client, recorder, case, with_setup(case, ids), {case.page_param: size})[1])
+        for size in PAGE_SIZES
+    )
+    diff = "\n".join(difflib.unified_diff(
+        small, large, f"limit={PAGE_SIZES[0]}", f"limit={PAGE_SIZES[1]}", lineterm=""
+    ))
+    assert small == large, f"{case.route} runs more statements for larger pages:\n{diff}"
+
+def test_every_route_has_a_budget():
+    covered = {case.route for case in CASES + LIST_CASES} | set(EXEMPT)
+    missing = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or not route.endpoint.__module__.startswith("app.routers."):
+            continue
+        path = route.path.replace(":path}", "}")
+        for method in route.methods:
+            if f"{method} {path}" not in covered:
+                missing.append(f"{method} {path}")
+    assert not missing, "Routes without a query budget: " + ", ".join(sorted(missing))
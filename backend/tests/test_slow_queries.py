@@ -0,0 +1,40 @@
+"""
+Plan capture must not break the transaction of the request it explains.
+"""
+from types import SimpleNamespace
+from app.database import engine
+from app.utils.slow_queries import explain
+
+class Cursor:
+    """DB-API cursor recording statements; EXPLAIN fails like a bad plan would"""
+
+    def __init__(self, executed):
+        self.executed = executed
+
+    def execute(self, statement, parameters=None):
+        self.executed.append(statement.split(" ", 1)[0] if statement.startswith("EXPLAIN") else statement)
+        if statement.startswith("EXPLAIN"):
+            raise RuntimeError("permission denied")
+
+    def close(self):
+        pass
+
+def postgresql_connection(executed, autocommit=False):
+    raw = SimpleNamespace(dbapi_connection=SimpleNamespace(autocommit=autocommit), cursor=lambda: Cursor(executed))
+    return SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), connection=raw)
+
+def test_failed_explain_is_rolled_back_to_a_savepoint():
+    executed = []
+    plan = explain(postgresql_connection(executed), "SELECT 1", {})
+    assert plan == ["EXPLAIN failed: permission denied"]
+    assert executed == ["SAVEPOINT slow_query_explain", "EXPLAIN", "ROLLBACK TO SAVEPOINT slow_query_explain"]
+
+def test_autocommit_connections_need_no_savepoint():
+    executed = []
+    explain(postgresql_connection(executed, autocommit=True), "SELECT 1", {})
+    assert executed == ["EXPLAIN"]
+
+def test_sqlite_plan_uses_the_same_connection(seed):
+    with engine.connect() as conn:
+        plan = explain(conn, "SELECT * FROM users WHERE user_id = ?", (1,))
+    assert plan and "users" in plan[0]
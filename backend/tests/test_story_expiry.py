@@ -0,0 +1,27 @@
+"""
+Story expiry rescans after downtime.
+"""
+from datetime import datetime, timedelta
+from app.database import SessionLocal
+from app.models import Story
+from app.utils.story_expiry import StoryExpiryScheduler
+from conftest import make_user
+
+def test_rescan_deletes_overdue_stories_in_batches_and_schedules_only_future_ones(seed):
+    now = datetime.utcnow()
+    scheduler = StoryExpiryScheduler(batch_size=2, rescan_seconds=60, partitioned=False)
+    db = SessionLocal()
+    try:
+        user_id = make_user(db, "expiry").user_id
+        overdue = [Story(user_id=user_id, media="/uploads/e.jpg", expiration_time=now - timedelta(hours=i + 1)) for i in range(5)]
+        soon = Story(user_id=user_id, media="/uploads/e.jpg", expiration_time=now + timedelta(seconds=30))
+        later = Story(user_id=user_id, media="/uploads/e.jpg", expiration_time=now + timedelta(hours=1))
+        db.add_all([*overdue, soon, later])
+        db.commit()
+
+        scheduler._rescan(db, now)
+        remaining = {story_id for (story_id,) in db.query(Story.story_id).filter(Story.user_id == user_id)}
+        assert remaining == {soon.story_id, later.story_id}
+        assert [story_id for _, story_id in scheduler._heap] == [soon.story_id]
+    finally:
+        db.close()
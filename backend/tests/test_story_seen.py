@@ -0,0 +1,31 @@
+"""
+Story seen watermarks: one row per viewer and author that only moves forward.
+"""
+from datetime import datetime, timedelta
+from app.database import SessionLocal
+from app.models import Story, StorySeen
+from conftest import auth_headers, make_user
+
+def test_seen_watermark_is_upserted_and_only_moves_forward(client, seed):
+    db = SessionLocal()
+    try:
+        author, viewer = make_user(db, "seen_author"), make_user(db, "seen_viewer")
+        expires = datetime.utcnow() + timedelta(hours=1)
+        stories = [Story(user_id=author.user_id, media="/uploads/s.jpg", expiration_time=expires) for _ in range(2)]
+        db.add_all(stories)
+        db.commit()
+        older, newer = (story.story_id for story in stories)
+        author_id, viewer_id = author.user_id, viewer.user_id
+    finally:
+        db.close()
+
+    for story_id in (newer, older, newer):
+        response = client.post(f"/stories/{story_id}/seen", headers=auth_headers(viewer_id))
+        assert response.status_code == 204
+
+    db = SessionLocal()
+    try:
+        rows = db.query(StorySeen).filter(StorySeen.viewer_id == viewer_id, StorySeen.author_id == author_id).all()
+        assert [row.last_seen_story_id for row in rows] == [newer]
+    finally:
+        db.close()
@@ -0,0 +1,37 @@
+"""
+StoryTrayCache invalidation, independent of the database.
+"""
+from datetime import datetime
+from app.utils.story_tray import StoryTrayCache
+
+NOW = datetime(2030, 1, 1)
+
+def test_change_during_build_is_not_cached_over():
+    cache = StoryTrayCache(ttl_seconds=60)
+    snapshot = cache.snapshot()
+    # Author 2 posts while the tray is being built
+    cache.author_changed(2)
+    cache.put(1, [], [1, 2], snapshot)
+    assert cache.get(1, NOW) is None
+
+def test_follow_during_build_is_not_cached_over():
+    cache = StoryTrayCache(ttl_seconds=60)
+    snapshot = cache.snapshot()
+    cache.invalidate_viewer(1)
+    cache.put(1, [], [1], snapshot)
+    assert cache.get(1, NOW) is None
+
+def test_unrelated_changes_keep_the_entry():
+    cache = StoryTrayCache(ttl_seconds=60)
+    cache.put(1, [], [1, 2], cache.snapshot())
+    cache.author_changed(3)
+    cache.invalidate_viewer(4)
+    assert cache.get(1, NOW) == []
+    cache.author_changed(2)
+    assert cache.get(1, NOW) is None
+
+def test_changes_are_pruned_after_the_ttl():
+    cache = StoryTrayCache(ttl_seconds=0)
+    for author_id in range(1000):
+        cache.author_changed(author_id)
+    assert len(cache._changes) <= 1
@@ -0,0 +1,78 @@
+"""
+Delta sync tokens: settling, expiry, cascade deletes and pruning.
+"""
+import itertools
+from datetime import datetime, timedelta
+import pytest
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Message, SyncChange
+from app.utils.sync import sync_change_pruner
+from conftest import auth_headers, make_user
+
+_pair_ids = itertools.count()
+
+@pytest.fixture
+def pair(seed):
+    """Two fresh users with three messages between them"""
+    db = SessionLocal()
+    try:
+        n = next(_pair_ids)
+        alice, bob = make_user(db, f"alice{n}"), make_user(db, f"bob{n}")
+        db.add_all([Message(sender_id=alice.user_id, receiver_id=bob.user_id, content=f"Hi {i}") for i in range(3)])
+        db.commit()
+        return alice.user_id, bob.user_id
+    finally:
+        db.close()
+
+@pytest.fixture
+def settled(monkeypatch):
+    monkeypatch.setattr(settings, "SYNC_SETTLE_SECONDS", 0)
+
+def sync(client, user_id: int, since: str = ""):
+    response = client.get("/messages/sync", params={"since": since}, headers=auth_headers(user_id))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_token_stops_short_of_unsettled_rows(client, pair):
+    alice, bob = pair
+    first = sync(client, bob)
+    # Just written, so still within SYNC_SETTLE_SECONDS: returned again next time
+    again = sync(client, bob, first["next_token"])
+    assert [m["message_id"] for m in again["messages"]] == [m["message_id"] for m in first["messages"]]
+    assert not again["has_more"]
+
+def test_settled_rows_are_not_repeated(client, pair, settled):
+    alice, bob = pair
+    first = sync(client, bob)
+    assert len(first["messages"]) == 3
+    assert sync(client, bob, first["next_token"])["messages"] == []
+
+def test_expired_token_gets_a_reset_snapshot(client, pair, settled):
+    alice, bob = pair
+    # Two-part tokens predate issue times and may have missed pruned changes
+    response = sync(client, bob, "0.0")
+    assert response["reset"]
+    assert len(response["messages"]) == 3
+    assert not sync(client, bob, response["next_token"])["reset"]
+
+def test_cascade_deletes_reach_the_other_participant(client, pair, settled):
+    alice, bob = pair
+    token = sync(client, bob)["next_token"]
+    assert client.delete("/users/me", headers=auth_headers(alice)).status_code == 204
+    changes = sync(client, bob, token)["changes"]
+    assert {change["action"] for change in changes} == {"delete"}
+    assert len(changes) == 3
+
+def test_pruner_removes_changes_past_retention(pair):
+    alice, bob = pair
+    db = SessionLocal()
+    try:
+        old = datetime.utcnow() - timedelta(days=settings.SYNC_CHANGE_RETENTION_DAYS + 1)
+        db.add(SyncChange(user_id=bob, entity="message", entity_id=1, action="read", created_at=old))
+        db.add(SyncChange(user_id=bob, entity="message", entity_id=2, action="read"))
+        db.commit()
+        assert sync_change_pruner.prune() >= 1
+        assert [c.entity_id for c in db.query(SyncChange).filter(SyncChange.user_id == bob)] == [2]
+    finally:
+        db.close()
@@ -0,0 +1,71 @@
+"""
+Multipart upload streaming, against a temporary directory.
+"""
+import asyncio
+import hashlib
+import os
+import pytest
+from fastapi import HTTPException
+from app.routers import uploads
+from app.routers.uploads import save_multipart_upload
+
+BOUNDARY = "pulse-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+def multipart_body(content: bytes, filename: str = "photo.jpg", field: str = "file") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="caption"\r\n\r\nhello\r\n'
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+class Stream:
+    """Request body in small chunks, counting how many were read"""
+
+    def __init__(self, body: bytes, chunk_size: int = 7):
+        self.chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        self.read = 0
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+def save(body: bytes, directory, **kwargs):
+    stream = Stream(body)
+    result = asyncio.run(save_multipart_upload(kwargs.pop("content_type", CONTENT_TYPE), stream, str(directory)))
+    return result, stream
+
+def test_file_part_is_written_and_hashed(tmp_path):
+    content = os.urandom(5000) + b"\r\n--not-the-boundary"
+    upload, _ = save(multipart_body(content), tmp_path)
+    assert upload.filename == "photo.jpg"
+    assert upload.size == len(content)
+    assert upload.digest == hashlib.sha256(content).hexdigest()
+    with open(upload.path, "rb") as f:
+        assert f.read() == content
+
+def test_oversized_file_is_rejected_while_receiving(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_FILE_SIZE", 1000)
+    stream = Stream(multipart_body(b"x" * 100_000))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(save_multipart_upload(CONTENT_TYPE, stream, str(tmp_path)))
+    assert "too large" in error.value.detail
+    # Stopped shortly after the limit, not at the end of the body
+    assert stream.read < len(stream.chunks) // 10
+    assert os.listdir(tmp_path) == []
+
+@pytest.mark.parametrize("body, content_type, detail", [
+    (multipart_body(b"x", filename="notes.txt"), CONTENT_TYPE, "not allowed"),
+    (multipart_body(b"x", field="avatar"), CONTENT_TYPE, "Missing 'file'"),
+    (b"x" * 100, CONTENT_TYPE, "Malformed"),
+    (b"{}", "application/json", "Expected a multipart"),
+])
+def test_bad_uploads_are_rejected(tmp_path, body, content_type, detail):
+    with pytest.raises(HTTPException) as error:
+        save(body, tmp_path, content_type=content_type)
+    assert error.value.status_code == 400
+    assert detail in error.value.detail
+    assert os.listdir(tmp_path) == []
@@ -139,7 +139,12 @@ const PostCard = ({ post, onLike, onComment, onDelete, onSave, currentUser }) =>
             <img
               src={post.media.startsWith('http') ? post.media : `${API_BASE_URL}${post.media}`}
               alt="Post content"
-              className="w-full h-auto block"
+              className="w-full h-auto block bg-cover bg-center"
+              width={post.media_width || undefined}
+              height={post.media_height || undefined}
+              style={post.media_placeholder ? { backgroundImage: `url(${post.media_placeholder})` } : undefined}
+              loading="lazy"
+              decoding="async"
             />
           </div>
         )}
@@ -1,6 +1,10 @@
 import React from 'react';
 import { Plus } from 'lucide-react';
 
+const API_BASE_URL = 'http://localhost:8000';
+
+const mediaUrl = (path) => (path.startsWith('http') ? path : `${API_BASE_URL}${path}`);
+
 const StoryViewer = ({ stories, currentUser, onAddStory }) => {
   return (
     <div className="flex gap-3 p-4 bg-dark-card border border-dark-border rounded-xl overflow-x-auto mb-4 scrollbar-custom">
@@ -23,8 +27,21 @@ const StoryViewer = ({ stories, currentUser, onAddStory }) => {
           key={story.story_id}
           className="flex flex-col items-center gap-2 cursor-pointer hover:scale-105 transition-transform flex-shrink-0"
         >
-          <div className="w-[60px] h-[60px] rounded-full bg-neutral-700 flex items-center justify-center text-neutral-50 font-semibold text-xl border-[3px] border-neutral-500 p-0.5">
-            {story.username?.charAt(0).toUpperCase()}
+          <div className="w-[60px] h-[60px] rounded-full bg-neutral-700 flex items-center justify-center text-neutral-50 font-semibold text-xl border-[3px] border-neutral-500 p-0.5 overflow-hidden">
+            {story.media ? (
+              <img
+                src={mediaUrl(story.media_variants?.thumb?.webp || story.media)}
+                alt={`${story.username}'s story`}
+                className="w-full h-full rounded-full object-cover bg-cover bg-center"
+                width={48}
+                height={48}
+                style={story.media_placeholder ? { backgroundImage: `url(${story.media_placeholder})` } : undefined}
+                loading="lazy"
+                decoding="async"
+              />
+            ) : (
+              story.username?.charAt(0).toUpperCase()
+            )}
           </div>
           <span className="text-[11px] text-neutral-300 max-w-[70px] text-center truncate">
             {story.username}